@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hair_salon.settings')
+# Serwer aplikacji domyślnie używa profilu produkcyjnego (manage.py - deweloperskiego)
+os.environ.setdefault('DJANGO_ENV', 'prod')
 
 application = get_asgi_application()
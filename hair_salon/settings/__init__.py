@@ -0,0 +1,26 @@
+"""
+Wybór profilu ustawień na podstawie zmiennej DJANGO_ENV (dev lub prod).
+
+manage.py domyślnie używa profilu dev, a wsgi.py i asgi.py - prod. Plik .env
+jest wczytywany tylko w profilu dev (przed importem ustawień) - proces
+produkcyjny bierze konfigurację wyłącznie ze środowiska, więc przypadkowy
+.env w katalogu roboczym jej nie zmieni. DJANGO_ENV nie może pochodzić z .env.
+"""
+
+import os
+
+ENVIRONMENT = os.environ.get('DJANGO_ENV', 'dev')
+
+if ENVIRONMENT == 'dev':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+if ENVIRONMENT == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif ENVIRONMENT == 'dev':
+    from .dev import *  # noqa: F401,F403
+else:
+    from django.core.exceptions import ImproperlyConfigured
+
+    raise ImproperlyConfigured(f"Nieznany profil ustawień DJANGO_ENV={ENVIRONMENT!r} (dozwolone: dev, prod).")
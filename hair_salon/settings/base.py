@@ -0,0 +1,212 @@
+"""
+Django settings for hair_salon project - ustawienia wspólne dla wszystkich środowisk.
+
+Generated by 'django-admin startproject' using Django 4.2.6.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.2/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('SECRET_KEY')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+# Poziom logowania ustawiają profile dev/prod
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        '': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+    },
+}
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'reservations',
+    'myapp',
+]
+
+MIDDLEWARE = [
+    'reservations.instrumentation.RequestMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'django.middleware.locale.LocaleMiddleware',
+]
+
+# Ułamek żądań, dla których zapisywane są metryki SQL i czasu (0 wyłącza pomiar)
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.1'))
+
+# Klucze widżetu rezerwacji na zewnętrznych stronach (rozdzielone przecinkami) -
+# POST /api/reservations/book/ wymaga nagłówka Authorization: Bearer <klucz>
+RESERVATION_WIDGET_TOKENS = [
+    token.strip() for token in os.environ.get('RESERVATION_WIDGET_TOKENS', '').split(',') if token.strip()
+]
+
+ROOT_URLCONF = 'hair_salon.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'hair_salon.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+
+# DB_ENGINE=sqlite3 pozwala uruchomić projekt (np. benchmarki) bez serwera PostgreSQL
+if os.environ.get('DB_ENGINE') == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME'),
+            'USER': os.environ.get('DB_USER'),
+            'PASSWORD': os.environ.get('DB_PASSWORD'),
+            'HOST': os.environ.get('DB_HOST'),
+            'PORT': os.environ.get('DB_PORT'),
+        }
+    }
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    return default if value is None else value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Trwałe połączenia - DB_CONN_MAX_AGE to czas życia połączenia w sekundach
+# (0 otwiera nowe połączenie dla każdego żądania, pusta wartość - bez limitu).
+# Domyślnie 0: pod ASGI widoki synchroniczne działają w wątkach puli i każdy wątek
+# trzymałby własne trwałe połączenie, którego Django nie zamyka. Wartość dodatnią
+# ustawiaj tylko dla WSGI. DB_CONN_HEALTH_CHECKS sprawdza połączenie przed
+# ponownym użyciem w kolejnym żądaniu.
+conn_max_age = os.environ.get('DB_CONN_MAX_AGE', '0').strip()
+DATABASES['default']['CONN_MAX_AGE'] = int(conn_max_age) if conn_max_age else None
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env_flag('DB_CONN_HEALTH_CHECKS', True)
+
+# Pula połączeń psycopg (DB_POOL=1) jest obsługiwana przez Django od wersji 5.1
+# i wyklucza trwałe połączenia
+if env_flag('DB_POOL') and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    import django
+    from django.core.exceptions import ImproperlyConfigured
+
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured("DB_POOL wymaga Django 5.1 lub nowszego i psycopg 3 z pakietem psycopg-pool.")
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    }
+
+# Cache grafików dni, skompilowanych tygodni godzin pracy i macierzy specjalizacji.
+# LocMemCache jest osobny w każdym procesie - unieważnienie z jednego procesu nie
+# dociera do pozostałych, które widzą zmianę dopiero po wygaśnięciu wpisu. Przy kilku
+# procesach serwera ustaw współdzielony cache, np. CACHE_BACKEND=django.core.cache.
+# backends.redis.RedisCache i CACHE_LOCATION=redis://127.0.0.1:6379/1.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    # Domyślny limit 300 wpisów nie mieści grafiku kilkudziesięciu fryzjerów na dwa tygodnie
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '20000'))}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'Europe/Warsaw'
+
+# USE_I18N = False
+USE_I10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.2/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '172.17.74.106', '192.168.2.9']
@@ -0,0 +1,16 @@
+"""
+Ustawienia deweloperskie - DEBUG, debug_toolbar i szczegółowe logowanie.
+"""
+
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, LOGGING, MIDDLEWARE
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+MIDDLEWARE = MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware']
+INTERNAL_IPS = ['127.0.0.1', 'localhost']
+
+# Logowanie na poziomie DEBUG obejmuje każde zapytanie SQL
+LOGGING['handlers']['console']['level'] = 'DEBUG'
+LOGGING['loggers']['']['level'] = 'DEBUG'
@@ -0,0 +1,20 @@
+"""
+Ustawienia produkcyjne - bez narzędzi deweloperskich, logowanie od poziomu WARNING
+(logi aplikacji reservations od INFO).
+"""
+
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import ALLOWED_HOSTS, LOGGING
+
+DEBUG = False
+
+if os.environ.get('ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = [host.strip() for host in os.environ['ALLOWED_HOSTS'].split(',') if host.strip()]
+
+LOGGING['loggers']['']['level'] = 'WARNING'
+# Logi aplikacji zostają na poziomie INFO - metryki żądań (reservations.metrics)
+# i przypomnienia wysyłane przez domyślny LogTransport zapisywane są jako INFO
+LOGGING['loggers']['reservations'] = {'level': 'INFO'}
+LOGGING['loggers']['reservations.metrics'] = {'level': 'INFO'}
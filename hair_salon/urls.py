@@ -14,12 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-import debug_toolbar
+from reservations.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    #path('', include('reservations.urls')),
-    path('__debug__/', include(debug_toolbar.urls)),
-]
\ No newline at end of file
+    path('metrics/', metrics_view, name='metrics'),
+    path('', include('reservations.urls')),
+]
+
+# debug_toolbar jest instalowany tylko w profilu dev
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    import debug_toolbar
+
+    urlpatterns.append(path('__debug__/', include(debug_toolbar.urls)))
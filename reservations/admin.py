@@ -1,15 +1,37 @@
 from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.http import HttpResponseBadRequest
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
 import datetime
-from .models import Hairdresser, Service, Reservation, SpecializationChoice
-from .forms import ServiceAdminForm, HairdresserAdminForm, ReservationForm
+from .models import (
+    Absence, Hairdresser, Job, Service, Reservation, RecurrenceRule, SpecializationChoice, WaitlistEntry, WorkingHours,
+)
+from .forms import (
+    ServiceAdminForm, HairdresserAdminForm, ReservationForm,
+    ShiftReservationsForm, ReassignReservationsForm, CancelReservationsForm,
+)
+from . import analytics
+from .instrumentation import traced
+from .paginator import EstimatedCountPaginator
+from .services import book_recurring, book_reservation, cancel_reservations, move_reservations
 import logging
 
 logger = logging.getLogger(__name__)
 
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
+
+class AbsenceInline(admin.TabularInline):
+    model = Absence
+    extra = 0
+
 class HairdresserAdmin(admin.ModelAdmin):
     form = HairdresserAdminForm
+    inlines = [WorkingHoursInline, AbsenceInline]
     list_display = ['name', 'list_specializations']
     search_fields = ['name']
 
@@ -19,6 +41,9 @@ class HairdresserAdmin(admin.ModelAdmin):
         }
         js = ('/admin/jsi18n',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('specialization')
+
     def list_specializations(self, obj):
         return ", ".join([s.get_specialization_display() for s in obj.specialization.all()])
     list_specializations.short_description = 'Specializations'
@@ -30,13 +55,25 @@ class ServiceAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('specializations')
+
     def list_specializations(self, obj):
         return ", ".join([spec.get_specialization_display() for spec in obj.specializations.all()])
     list_specializations.short_description = "Specializations"
 
 class ReservationAdmin(admin.ModelAdmin):
     form = ReservationForm
-    list_display = ('hairdresser', 'service', 'start_date', 'start_time', 'end_time')
+    list_display = ('hairdresser', 'service', 'day_column', 'time_column')
+    list_select_related = ('hairdresser', 'service')
+    list_filter = ('hairdresser',)
+    date_hierarchy = 'start_date'
+    # Kolejność zgodna z indeksami reservation_day_idx i reservation_hd_day_idx
+    ordering = ('start_date', 'start_time', 'pk')
+    # Przy setkach tysięcy rezerwacji liczba wierszy jest szacowana, a nie liczona
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['shift_reservations', 'reassign_reservations', 'cancel_selected_reservations']
 
     def day_column(self, obj):
         return obj.start_date.strftime('%d-%m-%Y')
@@ -52,26 +89,140 @@ class ReservationAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).filter(start_date__gte=datetime.date.today())
 
+    def run_bulk_action(self, request, queryset, form_class, title, apply, success="Zmieniono rezerwacji: {count}."):
+        # Akcja z formularzem pośrednim - po zatwierdzeniu wraca do listy rezerwacji
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_bound and form.is_valid():
+            try:
+                count = apply(form.cleaned_data)
+            except ValidationError as error:
+                self.message_user(request, " ".join(error.messages), messages.ERROR)
+            else:
+                self.message_user(request, success.format(count=count), messages.SUCCESS)
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': title,
+            'form': form,
+            'queryset': queryset,
+            'action': request.POST['action'],
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/reservations/reservation/bulk_action.html', context)
+
+    @admin.action(description="Przesuń wybrane rezerwacje", permissions=['change'])
+    def shift_reservations(self, request, queryset):
+        return self.run_bulk_action(
+            request, queryset, ShiftReservationsForm, "Przesuń rezerwacje",
+            lambda data: len(move_reservations(queryset.select_related('service'), shift=data['shift'])),
+        )
+
+    @admin.action(description="Przepisz wybrane rezerwacje do innego fryzjera", permissions=['change'])
+    def reassign_reservations(self, request, queryset):
+        return self.run_bulk_action(
+            request, queryset, ReassignReservationsForm, "Przepisz rezerwacje",
+            lambda data: len(move_reservations(queryset.select_related('service'), hairdresser=data['hairdresser'])),
+        )
+
+    @admin.action(description="Odwołaj wybrane rezerwacje", permissions=['delete'])
+    def cancel_selected_reservations(self, request, queryset):
+        return self.run_bulk_action(
+            request, queryset, CancelReservationsForm, "Odwołaj rezerwacje",
+            lambda data: cancel_reservations(queryset),
+            success="Odwołano rezerwacji: {count}.",
+        )
+
+    def get_urls(self):
+        urls = [
+            path('report/', self.admin_site.admin_view(self.report_view), name='reservations_reservation_report'),
+        ]
+        return urls + super().get_urls()
+
+    def report_view(self, request):
+        # Zajętość, przychód i obciążenie godzin - domyślnie za ostatni rok, w tygodniach;
+        # admin_view sprawdza tylko is_staff, raport wymaga prawa podglądu rezerwacji
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        today = datetime.date.today()
+        try:
+            date_to = datetime.date.fromisoformat(request.GET['date_to']) if request.GET.get('date_to') else today
+            date_from = (
+                datetime.date.fromisoformat(request.GET['date_from']) if request.GET.get('date_from')
+                else date_to - datetime.timedelta(days=364)
+            )
+        except ValueError:
+            return HttpResponseBadRequest("Niepoprawny zakres dat.")
+        period = request.GET.get('period')
+        if period not in analytics.PERIODS:
+            period = analytics.PERIOD_WEEK
+
+        report = analytics.report(date_from, date_to, period)
+        heatmap = None
+        if report['heatmap'] is not None:
+            peak = max(max(day) for day in report['heatmap']) or 1
+            hours = analytics.heatmap_hours(report['heatmap'])
+            heatmap = {
+                'hours': hours,
+                'rows': [
+                    (name, [(day[hour], f"{day[hour] / peak:.2f}") for hour in hours])
+                    for (_, name), day in zip(WorkingHours.WEEKDAYS, report['heatmap'])
+                ],
+            }
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Raport rezerwacji",
+            'report': report,
+            'heatmap': heatmap,
+        }
+        return TemplateResponse(request, 'admin/reservations/reservation/report.html', context)
+
+    @traced('reservation_admin.save_model')
     def save_model(self, request, obj, form, change):
-        # Obliczanie end_time tylko wtedy, gdy nie jest już ustalone
-        if not obj.end_time and obj.start_time and obj.service:
-            end_datetime = datetime.combine(obj.start_date, obj.start_time) + obj.service.duration
-            obj.end_time = end_datetime.time()
-
-        # Sprawdzenie konfliktów terminów
-        conflicting_reservations = Reservation.objects.filter(
-            hairdresser=obj.hairdresser,
-            start_date=obj.start_date,
-            start_time__lt=obj.end_time,
-            end_time__gt=obj.start_time,
-        ).exclude(pk=obj.pk)
-
-        if conflicting_reservations.exists():
-            messages.add_message(request, messages.ERROR, "Podany termin jest już zajęty, proszę wybrać inny termin.")
-        else:
-            super().save_model(request, obj, form, change)
+        # Sprawdzenie konfliktów terminów i zapis w jednej transakcji
+        try:
+            book_reservation(obj)
+        except ValidationError as error:
+            messages.add_message(request, messages.ERROR, " ".join(error.messages))
             
+class RecurrenceRuleAdmin(admin.ModelAdmin):
+    list_display = ('hairdresser', 'service', 'start_date', 'start_time', 'interval_weeks', 'until')
+    list_select_related = ('hairdresser', 'service')
+
+    @traced('recurrence_rule_admin.save_model')
+    def save_model(self, request, obj, form, change):
+        # Zmiana istniejącej reguły nie tworzy ponownie terminów
+        if change:
+            super().save_model(request, obj, form, change)
+            return
+        try:
+            result = book_recurring(obj)
+        except ValidationError as error:
+            messages.add_message(request, messages.ERROR, " ".join(error.messages))
+            return
+        messages.add_message(request, messages.SUCCESS, f"Utworzono rezerwacji: {len(result.created)}.")
+        if result.clashes:
+            days = ", ".join(item.start_date.strftime('%d-%m-%Y') for item in result.clashes)
+            messages.add_message(request, messages.WARNING, f"Pominięto zajęte terminy: {days}.")
+
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('client_name', 'service', 'window_start', 'window_end', 'status', 'offered_hairdresser', 'offered_start_at')
+    list_select_related = ('service', 'offered_hairdresser')
+    list_filter = ('status',)
+    filter_horizontal = ('hairdressers',)
+    readonly_fields = ('status', 'offered_hairdresser', 'offered_start_at', 'offered_at')
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    ordering = ('-run_at',)
+    readonly_fields = ('name', 'payload', 'attempts', 'locked_at', 'finished_at', 'last_error', 'created_at')
+
 admin.site.register(Hairdresser, HairdresserAdmin)
 admin.site.register(Service, ServiceAdmin)
 admin.site.register(Reservation, ReservationAdmin)
+admin.site.register(RecurrenceRule, RecurrenceRuleAdmin)
 admin.site.register(SpecializationChoice)
+admin.site.register(WaitlistEntry, WaitlistEntryAdmin)
+admin.site.register(Job, JobAdmin)
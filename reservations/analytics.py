@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute, TruncWeek
+
+from .availability import BITMAP_RESOLUTION
+from .models import Hairdresser, Reservation
+from .working_hours import get_working_days, week_start
+
+PERIOD_DAY = 'day'
+PERIOD_WEEK = 'week'
+PERIODS = (PERIOD_DAY, PERIOD_WEEK)
+
+BIN_MINUTES = int(BITMAP_RESOLUTION / timedelta(minutes=1))
+BINS_PER_HOUR = 60 // BIN_MINUTES
+HEATMAP_CHUNK_SIZE = 5000
+
+
+def period_start(day, period):
+    return day if period == PERIOD_DAY else week_start(day)
+
+
+def occupancy(date_from, date_to, period=PERIOD_DAY):
+    """Zajętość fryzjerów w kolejnych dniach lub tygodniach.
+
+    Minuty rezerwacji sumowane są w SQL; minuty pracy pochodzą z bitmap
+    godzin pracy (liczba ustawionych bitów razy rozdzielczość).
+    """
+    if period not in PERIODS:
+        raise ValueError(f"unknown period: {period}")
+    group = F('start_date') if period == PERIOD_DAY else TruncWeek('start_date')
+    rows = Reservation.objects.filter(
+        start_date__range=(date_from, date_to),
+    ).values('hairdresser_id', period=group).annotate(
+        busy=Sum(ExpressionWrapper(F('end_at') - F('start_at'), output_field=DurationField())),
+    ).order_by()
+    busy = {(row['hairdresser_id'], row['period']): row['busy'] or timedelta() for row in rows}
+
+    hairdressers = list(Hairdresser.objects.order_by('name').values_list('pk', 'name'))
+    available = defaultdict(int)
+    working_days = get_working_days([pk for pk, _ in hairdressers], date_from, date_to)
+    for (hairdresser_id, day), bits in working_days.items():
+        available[(hairdresser_id, period_start(day, period))] += bin(bits).count('1') * BIN_MINUTES
+
+    result = []
+    for hairdresser_id, name in hairdressers:
+        periods = sorted({key[1] for key in chain(busy, available) if key[0] == hairdresser_id})
+        for start in periods:
+            busy_minutes = int(busy.get((hairdresser_id, start), timedelta()) / timedelta(minutes=1))
+            available_minutes = available.get((hairdresser_id, start), 0)
+            result.append({
+                'hairdresser_id': hairdresser_id,
+                'hairdresser': name,
+                'period': start,
+                'busy_minutes': busy_minutes,
+                'available_minutes': available_minutes,
+                'utilization': round(100 * busy_minutes / available_minutes, 1) if available_minutes else None,
+            })
+    return result
+
+
+def revenue_by_service(date_from, date_to):
+    """Liczba rezerwacji i przychód (według bieżącej ceny usługi) dla każdej usługi."""
+    return list(
+        Reservation.objects.filter(start_date__range=(date_from, date_to))
+        .values('service_id', 'service__name')
+        .annotate(reservations=Count('id'), revenue=Sum('service__cost'))
+        .order_by('-revenue', 'service__name')
+    )
+
+
+def peak_heatmap(date_from, date_to):
+    """Minuty rezerwacji w każdej godzinie tygodnia jako tablica 7 x 24 (od poniedziałku).
+
+    Dzień tygodnia i godziny są wyliczane w SQL i wczytywane jednym kursorem
+    do tablicy NumPy; każda rezerwacja jest rozkładana na pola 5-minutowe
+    bez pętli w Pythonie. Bez pakietu numpy zwraca None.
+    """
+    # numpy importowany dopiero przy pierwszym użyciu - nie spowalnia startu procesu
+    try:
+        import numpy as np
+    except ImportError:  # pragma: no cover - mapa obciążenia jest wtedy niedostępna
+        return None
+    rows = Reservation.objects.filter(
+        start_date__range=(date_from, date_to),
+        end_time__isnull=False,
+    ).annotate(
+        weekday=ExtractIsoWeekDay('start_date'),
+        start_hour=ExtractHour('start_time'),
+        start_minute=ExtractMinute('start_time'),
+        end_hour=ExtractHour('end_time'),
+        end_minute=ExtractMinute('end_time'),
+    ).values_list(
+        'weekday', 'start_hour', 'start_minute', 'end_hour', 'end_minute',
+    ).order_by().iterator(chunk_size=HEATMAP_CHUNK_SIZE)
+    columns = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 5)
+
+    day_offset = (columns[:, 0] - 1) * 24 * 60
+    first = (day_offset + columns[:, 1] * 60 + columns[:, 2]) // BIN_MINUTES
+    last = -(-(day_offset + columns[:, 3] * 60 + columns[:, 4]) // BIN_MINUTES)
+    lengths = np.maximum(last - first, 0)
+    # Indeksy wszystkich pól zajętych przez rezerwacje: początek + 0, 1, ..., długość - 1
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    bins = np.repeat(first, lengths) + offsets
+    counts = np.bincount(bins, minlength=7 * 24 * BINS_PER_HOUR)
+    return counts.reshape(7, 24, BINS_PER_HOUR).sum(axis=2) * BIN_MINUTES
+
+
+def heatmap_hours(heatmap):
+    # Godziny, w których była choć jedna rezerwacja
+    return [hour for hour in range(24) if any(day[hour] for day in heatmap)]
+
+
+def report(date_from, date_to, period=PERIOD_WEEK):
+    heatmap = peak_heatmap(date_from, date_to)
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'period': period,
+        'occupancy': occupancy(date_from, date_to, period),
+        'revenue': revenue_by_service(date_from, date_to),
+        'heatmap': heatmap.tolist() if heatmap is not None else None,
+    }
@@ -0,0 +1,310 @@
+import hashlib
+import hmac
+from datetime import date, time, timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .availability import (
+    RANK_EARLIEST, RANKINGS, SLOT_STEP, best_slots, date_range, find_free_slots,
+)
+from .models import Hairdresser, Reservation, ScheduleVersion, Service, local_datetime
+from .schedule_cache import get_day_schedules
+from .services import abook_reservation
+from .specialization_cache import specialization_matrix
+from . import working_hours
+
+# Czas, przez jaki przeglądarka i CDN mogą używać odpowiedzi bez ponownej walidacji
+CACHE_MAX_AGE = 30
+MAX_RANGE_DAYS = 31
+DEFAULT_SLOT_RESULTS = 10
+MAX_SLOT_RESULTS = 50
+
+
+class ScheduleState:
+    """Parametry zapytania API oraz wersje grafików, od których zależy odpowiedź."""
+
+    def __init__(self, service, hairdresser_ids, date_from, date_to, versions, params=None, hours=None):
+        self.service = service
+        self.hairdresser_ids = sorted(hairdresser_ids)
+        self.date_from = date_from
+        self.date_to = date_to
+        self.versions = versions
+        # Dodatkowe parametry zapytania wpływające na treść odpowiedzi
+        self.params = params or {}
+        # Znaczniki godzin pracy fryzjerów - zmieniają się po edycji grafiku pracy
+        self.hours = hours or {}
+
+    @property
+    def etag(self):
+        digest = hashlib.sha1()
+        digest.update(repr((
+            self.service.pk if self.service else None,
+            self.service.duration if self.service else None,
+            self.hairdresser_ids,
+            self.date_from,
+            self.date_to,
+            sorted(self.params.items()),
+            sorted(self.hours.items()),
+        )).encode())
+        for hairdresser_id, day, version, _ in self.versions:
+            digest.update(f"{hairdresser_id}:{day}:{version};".encode())
+        return digest.hexdigest()
+
+    @property
+    def last_modified(self):
+        # Wolne terminy zależą też od godzin pracy i specjalizacji, które nie mają daty
+        # zmiany - takie odpowiedzi walidowane są tylko przez ETag, inaczej klient
+        # wysyłający samo If-Modified-Since dostałby nieaktualne 304
+        if self.service is not None:
+            return None
+        return max((modified_at for *_, modified_at in self.versions), default=None)
+
+
+async def load_versions(hairdresser_ids, date_from, date_to):
+    versions = ScheduleVersion.objects.filter(
+        hairdresser_id__in=hairdresser_ids,
+        date__range=(date_from, date_to),
+    ).order_by('hairdresser_id', 'date').values_list('hairdresser_id', 'date', 'version', 'modified_at')
+    return [row async for row in versions]
+
+
+def parse_date_range(request):
+    date_from = date.fromisoformat(request.GET['date_from'])
+    date_to = date.fromisoformat(request.GET.get('date_to') or request.GET['date_from'])
+    if date_to < date_from or (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise ValueError("invalid date range")
+    return date_from, date_to
+
+
+def parse_time(value):
+    return time.fromisoformat(value) if value else None
+
+
+async def availability_state(request):
+    try:
+        service_id = int(request.GET['service'])
+        date_from, date_to = parse_date_range(request)
+        service = await Service.objects.aget(pk=service_id)
+    except (KeyError, ValueError, Service.DoesNotExist):
+        return None
+    # Kolejne zapytania wykonują się po kolei we wspólnym wątku synchronicznym ORM
+    hairdresser_ids = await sync_to_async(specialization_matrix.qualified_hairdresser_ids)(service_id)
+    requested = request.GET.getlist('hairdresser')
+    if requested:
+        hairdresser_ids &= {int(pk) for pk in requested if pk.isdigit()}
+    versions = await load_versions(hairdresser_ids, date_from, date_to)
+    hours = await sync_to_async(working_hours.tokens)(hairdresser_ids)
+    return ScheduleState(service, hairdresser_ids, date_from, date_to, versions, hours=hours)
+
+
+async def reservations_state(request):
+    try:
+        hairdresser_ids = {int(pk) for pk in request.GET.getlist('hairdresser')}
+        date_from, date_to = parse_date_range(request)
+    except (KeyError, ValueError):
+        return None
+    versions = await load_versions(hairdresser_ids, date_from, date_to)
+    return ScheduleState(None, hairdresser_ids, date_from, date_to, versions)
+
+
+async def slot_search_state(request):
+    state = await availability_state(request)
+    if state is None:
+        return None
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SLOT_RESULTS))
+        rank = request.GET.get('rank', RANK_EARLIEST)
+        # Zawężają godziny pracy fryzjerów; bez nich obowiązują całe zmiany
+        opening = parse_time(request.GET.get('time_from'))
+        closing = parse_time(request.GET.get('time_to'))
+    except ValueError:
+        return None
+    if not 1 <= limit <= MAX_SLOT_RESULTS or rank not in RANKINGS:
+        return None
+    # Bez terminów z przeszłości; zaokrąglenie do kroku siatki, żeby ETag zmieniał się co krok
+    now = timezone.localtime()
+    step_minutes = int(SLOT_STEP / timedelta(minutes=1))
+    not_before = now.replace(minute=now.minute - now.minute % step_minutes, second=0, microsecond=0)
+    state.params = {
+        'limit': limit,
+        'rank': rank,
+        'opening': opening,
+        'closing': closing,
+        'not_before': not_before,
+    }
+    return state
+
+
+def schedule_view(state_func):
+    """Odpowiednik require_GET, cache_control i condition dla widoków asynchronicznych.
+
+    Dekoratory Django 4.2 obsługują tylko widoki synchroniczne; stan grafiku jest
+    tu wyliczany raz i służy zarówno do ETag/Last-Modified, jak i do odpowiedzi.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET', 'HEAD'])
+
+            state = await state_func(request)
+            etag = quote_etag(state.etag) if state else None
+            last_modified = int(state.last_modified.timestamp()) if state and state.last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, state)
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+            patch_cache_control(response, public=True, max_age=CACHE_MAX_AGE)
+            return response
+        return wrapper
+    return decorator
+
+
+@schedule_view(availability_state)
+async def availability(request, state):
+    if state is None:
+        return HttpResponseBadRequest("Wymagane parametry: service, date_from (opcjonalnie date_to, hairdresser).")
+
+    hairdressers = [
+        hairdresser async for hairdresser in
+        Hairdresser.objects.filter(pk__in=state.hairdresser_ids).order_by('name')
+    ]
+    slots = await sync_to_async(find_free_slots)(state.service, state.date_from, state.date_to, hairdressers=hairdressers)
+    return JsonResponse({
+        'service': state.service.pk,
+        'duration': int(state.service.duration / timedelta(minutes=1)),
+        'hairdressers': [
+            {
+                'id': hairdresser.pk,
+                'name': hairdresser.name,
+                'days': [
+                    {'date': day.isoformat(), 'slots': [slot.strftime('%H:%M') for slot in day_slots]}
+                    for day, day_slots in days.items()
+                ],
+            }
+            for hairdresser, days in slots.items()
+        ],
+    })
+
+
+@schedule_view(slot_search_state)
+async def slots(request, state):
+    if state is None:
+        return HttpResponseBadRequest(
+            "Wymagane parametry: service, date_from (opcjonalnie date_to, hairdresser, "
+            "limit, rank, time_from, time_to)."
+        )
+
+    options = await sync_to_async(best_slots)(
+        state.service, state.date_from, state.date_to, hairdresser_ids=state.hairdresser_ids, **state.params,
+    )
+    names = {
+        pk: name async for pk, name in
+        Hairdresser.objects.filter(pk__in={option.hairdresser_id for option in options}).values_list('pk', 'name')
+    }
+    return JsonResponse({
+        'service': state.service.pk,
+        'rank': state.params['rank'],
+        'options': [
+            {
+                'hairdresser': option.hairdresser_id,
+                'name': names.get(option.hairdresser_id),
+                'date': option.day.isoformat(),
+                'start': option.start.strftime('%H:%M'),
+                'end': option.end.strftime('%H:%M'),
+            }
+            for option in options
+        ],
+    })
+
+
+@schedule_view(reservations_state)
+async def reservations(request, state):
+    if state is None or not state.hairdresser_ids:
+        return HttpResponseBadRequest("Wymagane parametry: hairdresser, date_from (opcjonalnie date_to).")
+
+    schedules = await sync_to_async(get_day_schedules)(
+        (hairdresser_id, day)
+        for hairdresser_id in state.hairdresser_ids
+        for day in date_range(state.date_from, state.date_to)
+    )
+    return JsonResponse({
+        'reservations': [
+            {
+                'hairdresser': hairdresser_id,
+                'service': service_id,
+                'date': day.isoformat(),
+                'start': start.strftime('%H:%M'),
+                'end': end.strftime('%H:%M'),
+            }
+            for (hairdresser_id, day), entries in sorted(schedules.items())
+            for start, end, service_id in entries
+        ],
+    })
+
+
+def widget_authorized(request):
+    # Widżet rezerwacji na zewnętrznej stronie przesyła klucz w nagłówku
+    # Authorization: Bearer <klucz>; klucze podaje ustawienie RESERVATION_WIDGET_TOKENS
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(
+        hmac.compare_digest(token.encode(), allowed.encode())
+        for allowed in getattr(settings, 'RESERVATION_WIDGET_TOKENS', [])
+    )
+
+
+async def book(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if not widget_authorized(request):
+        return JsonResponse({'errors': ["Brak lub nieprawidłowy klucz widżetu."]}, status=403)
+    try:
+        reservation = Reservation(
+            hairdresser_id=int(request.POST['hairdresser']),
+            service_id=int(request.POST['service']),
+            start_date=date.fromisoformat(request.POST['start_date']),
+            start_time=time.fromisoformat(request.POST['start_time']),
+            client_contact=request.POST['client_contact'].strip(),
+        )
+    except (KeyError, ValueError):
+        reservation = None
+    max_contact = Reservation._meta.get_field('client_contact').max_length
+    if reservation is None or not 0 < len(reservation.client_contact) <= max_contact:
+        return HttpResponseBadRequest(
+            "Wymagane parametry: hairdresser, service, start_date, start_time, client_contact.",
+        )
+    if local_datetime(reservation.start_date, reservation.start_time) < timezone.now():
+        return JsonResponse({'errors': ["Nie można zarezerwować terminu w przeszłości."]}, status=400)
+
+    try:
+        await abook_reservation(reservation)
+    except ValidationError as error:
+        status = 409 if any(item.code == 'slot_taken' for item in error.error_list) else 400
+        return JsonResponse({'errors': error.messages}, status=status)
+
+    return JsonResponse({
+        'id': reservation.pk,
+        'hairdresser': reservation.hairdresser_id,
+        'service': reservation.service_id,
+        'date': reservation.start_date.isoformat(),
+        'start': reservation.start_time.strftime('%H:%M'),
+        'end': reservation.end_time.strftime('%H:%M'),
+    }, status=201)
+
+
+# Widżet nie ma sesji ani ciasteczka CSRF - żądania uwierzytelnia klucz widżetu.
+# Dekorator csrf_exempt obsługuje widoki asynchroniczne dopiero od Django 5.0.
+book.csrf_exempt = True
@@ -0,0 +1,284 @@
+import heapq
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from itertools import chain, islice
+
+from .models import Hairdresser
+from .schedule_cache import get_day_schedules
+from .specialization_cache import specialization_matrix
+from .working_hours import get_working_days
+
+# Domyślne godziny pracy salonu i krok, co jaki proponowane są terminy
+OPENING_TIME = time(9, 0)
+CLOSING_TIME = time(18, 0)
+SLOT_STEP = timedelta(minutes=15)
+
+# Kolejność propozycji w wyszukiwaniu najlepszych terminów
+RANK_EARLIEST = 'earliest'
+RANK_FRAGMENTATION = 'fragmentation'
+RANK_BALANCE = 'balance'
+RANKINGS = (RANK_EARLIEST, RANK_FRAGMENTATION, RANK_BALANCE)
+
+# Rozdzielczość bitmap dnia: bit n oznacza przedział [n * 5 min, (n + 1) * 5 min)
+BITMAP_RESOLUTION = timedelta(minutes=5)
+BITMAP_SLOTS = timedelta(days=1) // BITMAP_RESOLUTION
+
+SlotOption = namedtuple('SlotOption', ['hairdresser_id', 'day', 'start', 'end'])
+
+
+def time_to_delta(value):
+    return timedelta(
+        hours=value.hour,
+        minutes=value.minute,
+        seconds=value.second,
+        microseconds=value.microsecond,
+    )
+
+
+def delta_to_time(value):
+    return (datetime.min + value).time()
+
+
+def add_duration(value, duration):
+    # Zwraca None, jeżeli wynik wychodzi poza bieżący dzień
+    end = time_to_delta(value) + duration
+    if end >= timedelta(days=1):
+        return None
+    return delta_to_time(end)
+
+
+def interval_bits(start, end, cover=True):
+    """Bitmapa przedziału [start, end) podanego jako timedelta od północy.
+
+    Przy `cover=True` zaznaczane są wszystkie pola, które przedział choć częściowo
+    zajmuje (rezerwacje, nieobecności); przy `cover=False` tylko pola zawarte
+    w nim w całości (godziny pracy).
+    """
+    if cover:
+        first, last = start // BITMAP_RESOLUTION, -(-end // BITMAP_RESOLUTION)
+    else:
+        first, last = -(-start // BITMAP_RESOLUTION), end // BITMAP_RESOLUTION
+    last = min(last, BITMAP_SLOTS)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+@lru_cache(maxsize=4096)
+def time_bits(start, end, cover=True):
+    # Te same godziny powtarzają się w grafikach wszystkich dni, więc bitmapy są zapamiętywane
+    return interval_bits(time_to_delta(start), time_to_delta(end), cover)
+
+
+def bit_runs(bits):
+    """Zamienia bitmapę na listę przedziałów (start, end) jako timedelta od północy."""
+    runs = []
+    while bits:
+        first = (bits & -bits).bit_length() - 1
+        shifted = bits >> first
+        # Liczba kolejnych jedynek od najniższego ustawionego bitu
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        runs.append((first * BITMAP_RESOLUTION, (first + length) * BITMAP_RESOLUTION))
+        bits &= ~(((1 << length) - 1) << first)
+    return runs
+
+
+def day_window(opening=None, closing=None, available=None):
+    """Bitmapa godzin, w których można przyjmować klientów w danym dniu.
+
+    `available` to bitmapa godzin pracy fryzjera (working_hours) - wyznacza okno
+    sama, a `opening` i `closing` mogą je tylko zawęzić. Bez niej obowiązują
+    godziny otwarcia salonu.
+    """
+    if available is None:
+        return time_bits(opening or OPENING_TIME, closing or CLOSING_TIME, cover=False)
+    if opening is None and closing is None:
+        return available
+    start = time_to_delta(opening) if opening else timedelta()
+    end = time_to_delta(closing) if closing else timedelta(days=1)
+    return available & interval_bits(start, end, cover=False)
+
+
+def window_origin(window, opening=None):
+    # Siatka terminów liczona od podanego otwarcia, a bez niego od początku pracy w tym dniu
+    if opening is not None or not window:
+        return opening or OPENING_TIME
+    return delta_to_time(((window & -window).bit_length() - 1) * BITMAP_RESOLUTION)
+
+
+class DaySchedule:
+    """Posortowane, scalone przedziały zajętości jednego fryzjera w jednym dniu."""
+
+    def __init__(self, intervals=()):
+        self._merge(intervals)
+
+    def _merge(self, intervals):
+        self.intervals = []
+        for start, end in sorted(intervals):
+            if self.intervals and start <= self.intervals[-1][1]:
+                if end > self.intervals[-1][1]:
+                    self.intervals[-1] = (self.intervals[-1][0], end)
+            else:
+                self.intervals.append((start, end))
+        self._starts = [start for start, _ in self.intervals]
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def is_free(self, start, end):
+        # Przedziały są rozłączne, więc końce również są posortowane -
+        # wystarczy sprawdzić ostatni przedział zaczynający się przed `end`
+        index = bisect_left(self._starts, end)
+        return index == 0 or self.intervals[index - 1][1] <= start
+
+    def add(self, start, end):
+        self._merge(self.intervals + [(start, end)])
+
+    def busy_time(self):
+        return sum((time_to_delta(end) - time_to_delta(start) for start, end in self.intervals), timedelta())
+
+    def busy_bits(self):
+        bits = 0
+        for start, end in self.intervals:
+            bits |= time_bits(start, end)
+        return bits
+
+    def free_gaps(self, opening=None, closing=None, available=None):
+        """Zwraca wolne przedziały w godzinach pracy jako pary timedelta od północy.
+
+        Okno dnia wyznacza day_window().
+        """
+        return bit_runs(day_window(opening, closing, available) & ~self.busy_bits())
+
+    def free_slots(self, duration, opening=None, closing=None, step=SLOT_STEP, available=None):
+        """Zwraca listę godzin, o których można rozpocząć usługę trwającą `duration`."""
+        window = day_window(opening, closing, available)
+        origin = window_origin(window, opening)
+        return [
+            delta_to_time(start)
+            for gap_start, gap_end in bit_runs(window & ~self.busy_bits())
+            for start in gap_slots(gap_start, gap_end, duration, step, origin=origin)
+        ]
+
+
+def qualified_hairdressers(service):
+    return Hairdresser.objects.filter(
+        specialization__services=service,
+    ).distinct().order_by('name')
+
+
+def load_day_schedules(hairdresser_ids, date_from, date_to):
+    """Zwraca słownik {(hairdresser_id, dzień): DaySchedule} dla zakresu dat.
+
+    Grafiki pobierane są z cache dni; brakujące dni wczytywane są z bazy
+    jednym zapytaniem.
+    """
+    keys = [(hairdresser_id, day) for hairdresser_id in hairdresser_ids for day in date_range(date_from, date_to)]
+    schedules = defaultdict(DaySchedule)
+    for key, entries in get_day_schedules(keys).items():
+        if entries:
+            schedules[key] = DaySchedule((start, end) for start, end, _ in entries)
+    return schedules
+
+
+def date_range(date_from, date_to):
+    return [date_from + timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+
+
+def find_free_slots(service, date_from, date_to, hairdressers=None, step=SLOT_STEP):
+    """Zwraca {fryzjer: {dzień: [godziny rozpoczęcia]}} dla usługi w zakresie dat."""
+    if hairdressers is None:
+        hairdressers = qualified_hairdressers(service)
+    hairdressers = list(hairdressers)
+    hairdresser_ids = [h.pk for h in hairdressers]
+    schedules = load_day_schedules(hairdresser_ids, date_from, date_to)
+    working_days = get_working_days(hairdresser_ids, date_from, date_to)
+    days = date_range(date_from, date_to)
+
+    return {
+        hairdresser: {
+            day: schedules[(hairdresser.pk, day)].free_slots(
+                service.duration, step=step, available=working_days[(hairdresser.pk, day)],
+            )
+            for day in days
+        }
+        for hairdresser in hairdressers
+    }
+
+
+def gap_slots(gap_start, gap_end, duration, step=SLOT_STEP, origin=OPENING_TIME):
+    # Godziny rozpoczęcia w wolnym przedziale, wyrównane do siatki kroku od `origin`
+    origin = time_to_delta(origin)
+    candidate = origin - ((origin - gap_start) // step) * step
+    while candidate + duration <= gap_end:
+        yield candidate
+        candidate += step
+
+
+def _hairdresser_options(hairdresser_id, days, schedules, working_days, duration, rank, opening, closing,
+                         not_before, step):
+    """Strumień (klucz, SlotOption) jednego fryzjera, uporządkowany po dniu i godzinie."""
+    for day in days:
+        if not_before and day < not_before.date():
+            continue
+        schedule = schedules[(hairdresser_id, day)]
+        load = schedule.busy_time() if rank == RANK_BALANCE else None
+        earliest = time_to_delta(not_before.time()) if not_before and day == not_before.date() else None
+        window = day_window(opening, closing, working_days[(hairdresser_id, day)])
+        # Ta sama siatka co w free_slots - oba API proponują te same godziny
+        origin = window_origin(window, opening)
+        for gap_start, gap_end in bit_runs(window & ~schedule.busy_bits()):
+            for start in gap_slots(gap_start, gap_end, duration, step, origin=origin):
+                if earliest is not None and start < earliest:
+                    continue
+                end = start + duration
+                option = SlotOption(hairdresser_id, day, delta_to_time(start), delta_to_time(end))
+                if rank == RANK_EARLIEST:
+                    key = (day, start, hairdresser_id)
+                elif rank == RANK_BALANCE:
+                    key = (day, load, start, hairdresser_id)
+                else:
+                    # Wolny czas pocięty na kawałki zbyt krótkie na kolejną taką usługę;
+                    # przy równym odpadzie wygrywa najmniejsza pasująca luka (best fit)
+                    waste = sum(
+                        (piece for piece in (start - gap_start, gap_end - end) if timedelta() < piece < duration),
+                        timedelta(),
+                    )
+                    key = (waste, gap_end - gap_start, day, start, hairdresser_id)
+                yield key, option
+
+
+def best_slots(service, date_from, date_to, hairdresser_ids=None, limit=10, rank=RANK_EARLIEST,
+               opening=None, closing=None, not_before=None, step=SLOT_STEP):
+    """Zwraca `limit` najlepszych propozycji (fryzjer, dzień, godzina) dla usługi.
+
+    Wolne przedziały wszystkich fryzjerów z właściwą specjalizacją są scalane
+    kolejką priorytetową; dla kolejności `earliest` i `balance` strumienie
+    fryzjerów są już posortowane, więc generowanie kończy się po `limit`
+    propozycjach.
+    """
+    if rank not in RANKINGS:
+        raise ValueError(f"unknown ranking: {rank}")
+    if hairdresser_ids is None:
+        hairdresser_ids = specialization_matrix.qualified_hairdresser_ids(service.pk)
+    hairdresser_ids = sorted(hairdresser_ids)
+    days = date_range(date_from, date_to)
+    schedules = load_day_schedules(hairdresser_ids, date_from, date_to)
+    working_days = get_working_days(hairdresser_ids, date_from, date_to)
+
+    streams = [
+        _hairdresser_options(
+            hairdresser_id, days, schedules, working_days, service.duration, rank, opening, closing, not_before, step,
+        )
+        for hairdresser_id in hairdresser_ids
+    ]
+    if rank == RANK_FRAGMENTATION:
+        ranked = heapq.nsmallest(limit, chain.from_iterable(streams), key=lambda item: item[0])
+    else:
+        ranked = islice(heapq.merge(*streams, key=lambda item: item[0]), limit)
+    return [option for _, option in ranked]
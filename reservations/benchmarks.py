@@ -0,0 +1,358 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time as time_module
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from .availability import RANK_EARLIEST, RANK_FRAGMENTATION, best_slots, find_free_slots
+from .forms import ReservationForm
+from .models import Hairdresser, Reservation, ScheduleVersion, Service, SpecializationChoice
+
+SERVICE_DURATIONS = [timedelta(minutes=minutes) for minutes in (30, 45, 60, 90)]
+FIRST_DAY = date(2030, 1, 7)
+DAY_START = datetime.combine(FIRST_DAY, time(9, 0))
+DAY_END = datetime.combine(FIRST_DAY, time(18, 0))
+
+
+@contextmanager
+def temporary_database(keepdb=False):
+    """Tworzy bazę testową na czas pomiaru i usuwa ją po nim (chyba że `keepdb`).
+
+    Przy SQLite również baza wskazana w ustawieniach trafia do katalogu
+    tymczasowego - żadne połączenie nie utworzy db.sqlite3 w katalogu projektu.
+    """
+    setup_test_environment()
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as directory:
+        if connection.vendor == 'sqlite':
+            connection.close()
+            connection.settings_dict['NAME'] = os.path.join(directory, 'db.sqlite3')
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+
+
+def write_report(report, path=None, stdout=None):
+    """Zapisuje wynik pomiaru jako JSON do pliku `path` lub na `stdout` polecenia."""
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(output + '\n')
+    else:
+        stdout.write(output)
+
+
+def percentile(values, fraction):
+    # Percentyl metodą najbliższej rangi
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, queries):
+    return {
+        'iterations': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'queries_per_op': round(sum(queries) / len(queries), 2),
+    }
+
+
+def measure(operation, iterations, setup=None):
+    """Mierzy czas i liczbę zapytań kolejnych wywołań `operation(i)`."""
+    latencies = []
+    queries = []
+    for iteration in range(iterations):
+        if setup:
+            setup(iteration)
+        with CaptureQueriesContext(connection) as context:
+            started = time_module.perf_counter()
+            operation(iteration)
+            latencies.append(time_module.perf_counter() - started)
+        queries.append(len(context.captured_queries))
+    return summarize(latencies, queries)
+
+
+def seed(hairdresser_count, service_count, day_count, seed_value=0):
+    """Tworzy fryzjerów, usługi i grafiki wypełnione rezerwacjami na `day_count` dni."""
+    generator = random.Random(seed_value)
+    specializations = [
+        SpecializationChoice.objects.get_or_create(specialization=code)[0]
+        for code, _ in Hairdresser.SPECIALIZATIONS
+    ]
+
+    services = []
+    for number in range(service_count):
+        service = Service.objects.create(
+            name=f"Usługa {number}",
+            duration=SERVICE_DURATIONS[number % len(SERVICE_DURATIONS)],
+            cost=50 + 10 * number,
+        )
+        service.specializations.add(specializations[number % len(specializations)])
+        services.append(service)
+
+    hairdressers = []
+    for number in range(hairdresser_count):
+        hairdresser = Hairdresser.objects.create(name=f"Fryzjer {number}")
+        hairdresser.specialization.add(*generator.sample(specializations, generator.randint(1, len(specializations))))
+        hairdressers.append(hairdresser)
+
+    reservations = []
+    for hairdresser in hairdressers:
+        for offset in range(day_count):
+            day = FIRST_DAY + timedelta(days=offset)
+            current = DAY_START
+            while True:
+                current += timedelta(minutes=generator.choice((0, 15, 30)))
+                service = generator.choice(services)
+                end = current + service.duration
+                if end > DAY_END:
+                    break
+                reservation = Reservation(
+                    hairdresser=hairdresser,
+                    service=service,
+                    start_date=day,
+                    start_time=current.time(),
+                    end_time=end.time(),
+                )
+                reservation.sync_range()
+                reservations.append(reservation)
+                current = end
+    Reservation.objects.bulk_create(reservations, batch_size=1000)
+    ScheduleVersion.objects.bump({(r.hairdresser_id, r.start_date) for r in reservations})
+    return hairdressers, services, reservations
+
+
+def run(hairdresser_count=10, service_count=5, day_count=14, iterations=50):
+    """Zasila bazę danymi testowymi i mierzy gorące ścieżki rezerwacji."""
+    hairdressers, services, reservations = seed(hairdresser_count, service_count, day_count)
+    cache.clear()
+    booked = reservations[0]
+    hairdresser = booked.hairdresser
+    service = services[0]
+    hairdresser.specialization.add(*service.specializations.all())
+
+    def free_day(iteration):
+        # Każda iteracja zapisu dostaje własny, pusty dzień po zasilonym zakresie
+        return FIRST_DAY + timedelta(days=day_count + iteration)
+
+    def form_is_valid_and_save(iteration):
+        form = ReservationForm(data={
+            'hairdresser': hairdresser.pk,
+            'service': service.pk,
+            'start_date': free_day(iteration).isoformat(),
+            'start_time': '09:00',
+        })
+        if not form.is_valid():
+            raise RuntimeError(form.errors)
+        form.save()
+
+    def reservation_clean(iteration):
+        Reservation(
+            hairdresser=hairdresser,
+            service=service,
+            start_date=booked.start_date,
+            start_time=booked.start_time,
+        ).clean()
+
+    factory = RequestFactory()
+    model_admin = site._registry[Reservation]
+
+    def admin_conflict_check(iteration):
+        request = factory.post('/')
+        request._messages = CookieStorage(request)
+        conflicting = Reservation(
+            hairdresser=booked.hairdresser,
+            service=booked.service,
+            start_date=booked.start_date,
+            start_time=booked.start_time,
+        )
+        model_admin.save_model(request, conflicting, None, False)
+
+    user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    client = Client()
+    client.force_login(user)
+    changelist_url = reverse('admin:reservations_reservation_changelist')
+
+    def admin_changelist(iteration):
+        response = client.get(changelist_url)
+        if response.status_code != 200:
+            raise RuntimeError(f"Changelist returned {response.status_code}")
+
+    week_end = FIRST_DAY + timedelta(days=min(day_count, 7) - 1)
+
+    def availability_week(iteration):
+        find_free_slots(service, FIRST_DAY, week_end)
+
+    last_day = FIRST_DAY + timedelta(days=day_count - 1)
+
+    def best_slots_earliest(iteration):
+        best_slots(service, FIRST_DAY, last_day, limit=10, rank=RANK_EARLIEST)
+
+    def best_slots_fragmentation(iteration):
+        best_slots(service, FIRST_DAY, last_day, limit=10, rank=RANK_FRAGMENTATION)
+
+    return {
+        'meta': {
+            'vendor': connection.vendor,
+            'hairdressers': hairdresser_count,
+            'services': service_count,
+            'days': day_count,
+            'reservations': len(reservations),
+            'iterations': iterations,
+        },
+        'operations': {
+            'reservation_form_is_valid_save': measure(form_is_valid_and_save, iterations),
+            'reservation_clean': measure(reservation_clean, iterations),
+            'admin_save_model_conflict_check': measure(admin_conflict_check, iterations),
+            'admin_changelist': measure(admin_changelist, iterations),
+            'availability_week_cold': measure(availability_week, iterations, setup=lambda iteration: cache.clear()),
+            'availability_week_warm': measure(availability_week, iterations),
+            'best_slots_earliest_warm': measure(best_slots_earliest, iterations),
+            'best_slots_fragmentation_warm': measure(best_slots_fragmentation, iterations),
+        },
+    }
+
+
+# Tryby połączeń porównywane w run_connections: (CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+CONNECTION_MODES = {
+    'new_connection_per_request': (0, False),
+    'persistent': (600, False),
+    'persistent_health_checks': (600, True),
+}
+
+
+def run_connections(iterations=200, hairdresser_count=5, day_count=7):
+    """Mierzy opóźnienie żądań API dla nowych i trwałych połączeń z bazą danych.
+
+    Każde żądanie jest otoczone wywołaniami close_old_connections, tak jak robią to
+    sygnały request_started/request_finished pod serwerem WSGI (klient testowy je pomija).
+    """
+    _, services, _ = seed(hairdresser_count, 3, day_count)
+    url = reverse('reservations:api_availability') + (
+        f"?service={services[0].pk}&date_from={FIRST_DAY.isoformat()}"
+        f"&date_to={(FIRST_DAY + timedelta(days=day_count - 1)).isoformat()}"
+    )
+    # Adres spoza INTERNAL_IPS - pasek debug_toolbar nie zaburza pomiaru
+    client = Client(REMOTE_ADDR='192.0.2.1')
+    opened = []
+    executed = []
+
+    def on_connection_created(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    def count_queries(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    saved = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+    operations = {}
+    connection_created.connect(on_connection_created)
+    try:
+        with connection.execute_wrapper(count_queries):
+            for name, (max_age, health_checks) in CONNECTION_MODES.items():
+                connection.close()
+                connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+                client.get(url)
+                opened.clear()
+                latencies, queries = [], []
+                for iteration in range(iterations):
+                    executed.clear()
+                    started = time_module.perf_counter()
+                    close_old_connections()
+                    response = client.get(url)
+                    close_old_connections()
+                    latencies.append(time_module.perf_counter() - started)
+                    queries.append(len(executed))
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Availability returned {response.status_code}")
+                operations[name] = {**summarize(latencies, queries), 'connections_opened': len(opened)}
+    finally:
+        connection_created.disconnect(on_connection_created)
+        connection.close()
+        connection.settings_dict.update(saved)
+
+    return {
+        'meta': {
+            'vendor': connection.vendor,
+            'hairdressers': hairdresser_count,
+            'days': day_count,
+            'iterations': iterations,
+        },
+        'operations': operations,
+    }
+
+
+# Polecenie mierzone przez run_startup - import aplikacji WSGI wykonuje django.setup()
+STARTUP_COMMAND = 'import hair_salon.wsgi'
+STARTUP_PROFILES = ('dev', 'prod')
+
+
+def parse_importtime(output):
+    """Zwraca listę (moduł, czas własny us, czas łączny us, zagłębienie) z wyjścia `python -X importtime`."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_time), int(cumulative), depth))
+    return modules
+
+
+def run_startup(runs=5, top=10, command=STARTUP_COMMAND, profiles=STARTUP_PROFILES):
+    """Mierzy czas startu procesu (import aplikacji WSGI) dla profili ustawień DJANGO_ENV.
+
+    Każdy pomiar to osobny proces `python -X importtime`; raportowany jest czas
+    całego procesu, łączny czas importów i pakiety z najdłuższym czasem importu.
+    """
+    report = {'meta': {'command': command, 'runs': runs, 'python': sys.version.split()[0]}, 'profiles': {}}
+    for profile in profiles:
+        environment = {**os.environ, 'DJANGO_ENV': profile}
+        wall_times, import_times = [], []
+        packages = defaultdict(int)
+        for _ in range(runs):
+            started = time_module.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', command],
+                env=environment, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            )
+            wall_times.append(time_module.perf_counter() - started)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip().splitlines()[-1])
+            modules = parse_importtime(result.stderr)
+            import_times.append(sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1e6)
+            for name, self_time, _, _ in modules:
+                packages[name.split('.')[0]] += self_time
+        report['profiles'][profile] = {
+            'wall_p50_ms': round(percentile(wall_times, 0.50) * 1000, 1),
+            'import_p50_ms': round(percentile(import_times, 0.50) * 1000, 1),
+            'modules': len(modules),
+            'top_packages_ms': {
+                name: round(total / runs / 1000, 1)
+                for name, total in sorted(packages.items(), key=lambda item: -item[1])[:top]
+            },
+        }
+    return report
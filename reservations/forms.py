@@ -2,10 +2,9 @@ from django import forms
 from .models import Reservation, Service
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from datetime import datetime
-from django.utils import timezone
 from django.contrib.admin.widgets import FilteredSelectMultiple
-from .models import Service, SpecializationChoice, Hairdresser, Reservation
+from .models import STALE_RESERVATION_MESSAGE, Service, SpecializationChoice, Hairdresser, Reservation, local_datetime
+from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,13 +12,20 @@ logger = logging.getLogger(__name__)
 class ReservationForm(forms.ModelForm):
     class Meta:
         model = Reservation
-        fields = ['hairdresser', 'service', 'start_date', 'start_time', 'end_time']
+        fields = ['hairdresser', 'service', 'start_date', 'start_time', 'end_time', 'client_contact', 'version']
         widgets = {
+            # Wersja rezerwacji z chwili otwarcia formularza - wykrywa równoległą edycję
+            'version': forms.HiddenInput(),
             'start_date': forms.DateInput(attrs={'type': 'date'}),
             'start_time': forms.TimeInput(attrs={'type': 'time'}),
             'end_time': forms.TimeInput(attrs={'type': 'time', 'required': False}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Nowa rezerwacja nie ma jeszcze wersji - dla istniejącej clean() jej wymaga
+        self.fields['version'].required = False
+
     def clean(self):        
         cleaned_data = super().clean()
         start_date = cleaned_data.get('start_date')
@@ -28,6 +34,13 @@ class ReservationForm(forms.ModelForm):
         service = cleaned_data.get('service')
         hairdresser = cleaned_data.get('hairdresser')
 
+        version = cleaned_data.get('version')
+        if self.instance.pk and version is None:
+            # Bez wersji nie da się wykryć równoległej edycji - zapis nadpisałby cudze zmiany
+            raise ValidationError(_('Brak wersji rezerwacji - odśwież stronę i wprowadź zmiany ponownie.'), code='stale')
+        if self.instance.pk and version != self.initial.get('version'):
+            raise ValidationError(STALE_RESERVATION_MESSAGE, code='stale')
+
         errors = {}
         if not hairdresser:
             errors['hairdresser'] = ValidationError(_('Należy wskazać fryzjera do wykonania usługi'))
@@ -41,31 +54,21 @@ class ReservationForm(forms.ModelForm):
         if errors:
             raise ValidationError(errors)
 
-        start_datetime = timezone.make_aware(datetime.combine(start_date, start_time))
-
         if end_time:
-            end_datetime = timezone.make_aware(datetime.combine(start_date, end_time))
-            if end_datetime < start_datetime:
+            if end_time < start_time:
                 raise ValidationError(_('Czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia.'))
         else:
-            # Obliczenie domyślnego czasu zakończenia na podstawie czasu trwania usługi"                        
-            end_datetime = start_datetime + service.duration
-            cleaned_data['end_time'] = end_datetime.time()
+            # Obliczenie domyślnego czasu zakończenia na podstawie czasu trwania usługi
+            cleaned_data['end_time'] = (local_datetime(start_date, start_time) + service.duration).time()
 
         return cleaned_data
 
     def save(self, commit=True):
         instance = super(ReservationForm, self).save(commit=False)
-        if instance.start_date and instance.start_time and instance.service:
-            start_datetime = timezone.make_aware(datetime.combine(instance.start_date, instance.start_time))
-            
-            # Użyj end_time z cleaned_data
-            end_time = self.cleaned_data.get('end_time')
-            if end_time:
-                instance.end_time = end_time                
-            else:
-                # Ustawienie czasu zakończenia tylko, gdy nie został podany ręcznie
-                instance.end_time = (start_datetime + instance.service.duration).time()                
+        # Reservation.clean wylicza end_time z czasu trwania usługi - przywrócenie
+        # wartości z formularza (podanej ręcznie lub wyliczonej w clean)
+        if self.cleaned_data.get('end_time'):
+            instance.end_time = self.cleaned_data['end_time']
 
         if commit:
             instance.save()
@@ -122,3 +125,21 @@ class HairdresserAdminForm(forms.ModelForm):
             hairdresser.specialization.set(self.cleaned_data['specialization'])
             self.save_m2m()
         return hairdresser
+
+class ShiftReservationsForm(forms.Form):
+    days = forms.IntegerField(label="Dni", initial=0)
+    minutes = forms.IntegerField(label="Minuty", initial=0)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        shift = timedelta(days=cleaned_data.get('days') or 0, minutes=cleaned_data.get('minutes') or 0)
+        if not shift:
+            raise ValidationError(_('Podaj przesunięcie rezerwacji.'))
+        cleaned_data['shift'] = shift
+        return cleaned_data
+
+class ReassignReservationsForm(forms.Form):
+    hairdresser = forms.ModelChoiceField(queryset=Hairdresser.objects.all(), label="Fryzjer")
+
+class CancelReservationsForm(forms.Form):
+    pass
@@ -0,0 +1,217 @@
+import contextvars
+import json
+import logging
+import random
+import threading
+import time as time_module
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('reservations.metrics')
+
+SLOWEST_SQL_LENGTH = 200
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Pomiary jednego żądania: zapytania SQL, czas bazy danych i sekcje kodu."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_sql = None
+        self.slowest_seconds = 0.0
+        self.spans = defaultdict(float)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time_module.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time_module.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if elapsed >= self.slowest_seconds:
+                self.slowest_seconds = elapsed
+                self.slowest_sql = sql
+
+
+class MetricsRegistry:
+    """Zagregowane metryki procesu udostępniane w formacie tekstowym Prometheusa."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.views = defaultdict(lambda: {'requests': 0, 'seconds': 0.0, 'db_seconds': 0.0, 'queries': 0})
+            self.spans = defaultdict(lambda: {'calls': 0, 'seconds': 0.0})
+
+    def observe_request(self, view, metrics, seconds):
+        with self._lock:
+            totals = self.views[view]
+            totals['requests'] += 1
+            totals['seconds'] += seconds
+            totals['db_seconds'] += metrics.db_seconds
+            totals['queries'] += metrics.queries
+
+    def observe_span(self, name, seconds):
+        with self._lock:
+            totals = self.spans[name]
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+
+    def render(self):
+        from .schedule_cache import stats as schedule_cache_stats
+
+        with self._lock:
+            views = {view: dict(totals) for view, totals in self.views.items()}
+            spans = {name: dict(totals) for name, totals in self.spans.items()}
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        def labelled(label, values, key):
+            return [(f'{{{label}="{name}"}}', totals[key]) for name, totals in sorted(values.items())]
+
+        metric('hair_salon_requests_total', 'counter', "Sampled requests.", labelled('view', views, 'requests'))
+        metric('hair_salon_request_seconds_total', 'counter', "Wall time of sampled requests.", labelled('view', views, 'seconds'))
+        metric('hair_salon_request_db_seconds_total', 'counter', "Database time of sampled requests.", labelled('view', views, 'db_seconds'))
+        metric('hair_salon_request_queries_total', 'counter', "SQL queries of sampled requests.", labelled('view', views, 'queries'))
+        metric('hair_salon_span_calls_total', 'counter', "Calls of instrumented code sections.", labelled('span', spans, 'calls'))
+        metric('hair_salon_span_seconds_total', 'counter', "Time spent in instrumented code sections.", labelled('span', spans, 'seconds'))
+        cache_stats = schedule_cache_stats.snapshot()
+        metric('hair_salon_schedule_cache_hits_total', 'counter', "Day schedule cache hits.", [('', cache_stats['hits'])])
+        metric('hair_salon_schedule_cache_misses_total', 'counter', "Day schedule cache misses.", [('', cache_stats['misses'])])
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name):
+    """Mierzy czas sekcji kodu, jeżeli bieżące żądanie zostało wylosowane do pomiaru."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time_module.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time_module.perf_counter() - started
+        metrics.spans[name] += elapsed
+        registry.observe_span(name, elapsed)
+
+
+def traced(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """Zapisuje liczbę zapytań, czas bazy danych, najwolniejsze zapytanie i czas
+    całego żądania dla części żądań (REQUEST_METRICS_SAMPLE_RATE).
+
+    Obsługuje łańcuch synchroniczny i asynchroniczny, żeby pod ASGI nie wymuszać
+    uruchamiania widoków asynchronicznych w wątku.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time_module.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        self.record(request, response, metrics, time_module.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time_module.perf_counter()
+        # Połączenia są lokalne dla wątku - zapytania widoków asynchronicznych
+        # wykonuje wątek synchroniczny żądania, więc tam instalowane są wrappery
+        stack = ExitStack()
+        try:
+            await sync_to_async(self.wrap_connections)(stack, metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current_metrics.reset(token)
+        self.record(request, response, metrics, time_module.perf_counter() - started)
+        return response
+
+    def sampled(self):
+        sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.0)
+        return sample_rate > 0 and random.random() < sample_rate
+
+    def wrap_connections(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+
+    def record(self, request, response, metrics, seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        registry.observe_request(view, metrics, seconds)
+        logger.info(json.dumps({
+            'event': 'request',
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': round(seconds * 1000, 3),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_seconds * 1000, 3),
+            'slowest_sql': metrics.slowest_sql[:SLOWEST_SQL_LENGTH] if metrics.slowest_sql else None,
+            'slowest_sql_ms': round(metrics.slowest_seconds * 1000, 3),
+            'spans_ms': {name: round(value * 1000, 3) for name, value in metrics.spans.items()},
+        }))
+
+
+def metrics_view(request):
+    # Metryki dostępne tylko z adresów wewnętrznych lub dla personelu
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,58 @@
+import json
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from reservations import analytics
+from reservations.models import WorkingHours
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Niepoprawna data: {value}")
+
+
+class Command(BaseCommand):
+    help = "Wypisuje zajętość fryzjerów, przychód z usług i mapę obciążenia godzin w zakresie dat."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=parse_date, help="Początek zakresu (domyślnie rok wstecz).")
+        parser.add_argument('--date-to', type=parse_date, help="Koniec zakresu (domyślnie dzisiaj).")
+        parser.add_argument('--period', choices=analytics.PERIODS, default=analytics.PERIOD_WEEK)
+        parser.add_argument('--json', action='store_true', help="Wynik w formacie JSON.")
+
+    def handle(self, *args, **options):
+        date_to = options['date_to'] or timezone.localdate()
+        date_from = options['date_from'] or date_to - timedelta(days=364)
+        if date_to < date_from:
+            raise CommandError("Data końcowa nie może być wcześniejsza niż początkowa.")
+
+        report = analytics.report(date_from, date_to, options['period'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
+            return
+
+        self.stdout.write(f"Zajętość fryzjerów ({date_from} - {date_to}):")
+        for row in report['occupancy']:
+            utilization = f"{row['utilization']:.1f}%" if row['utilization'] is not None else "-"
+            self.stdout.write(
+                f"  {row['period']}  {row['hairdresser']:<20} {row['busy_minutes']:>6} / "
+                f"{row['available_minutes']:>6} min  {utilization:>7}"
+            )
+
+        self.stdout.write("Przychód z usług:")
+        for row in report['revenue']:
+            self.stdout.write(f"  {row['service__name'] or '-':<20} {row['reservations']:>6}  {row['revenue']:>10}")
+
+        if report['heatmap'] is None:
+            self.stdout.write("Mapa obciążenia wymaga pakietu numpy.")
+            return
+        self.stdout.write("Minuty rezerwacji w godzinach tygodnia:")
+        hours = analytics.heatmap_hours(report['heatmap'])
+        self.stdout.write(" " * 15 + "".join(f"{hour:>6}" for hour in hours))
+        for (_, name), day in zip(WorkingHours.WEEKDAYS, report['heatmap']):
+            self.stdout.write(f"  {name:<13}" + "".join(f"{day[hour]:>6}" for hour in hours))
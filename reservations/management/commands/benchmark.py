@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from reservations import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mierzy opóźnienia (p50/p95) i liczbę zapytań gorących ścieżek rezerwacji "
+        "na osobnej, tymczasowej bazie testowej i wypisuje wynik jako JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hairdressers', type=int, default=10)
+        parser.add_argument('--services', type=int, default=5)
+        parser.add_argument('--days', type=int, default=14)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--output', help="Plik, do którego zostanie zapisany wynik JSON.")
+        parser.add_argument('--keepdb', action='store_true', help="Nie usuwa bazy testowej po pomiarze.")
+
+    def handle(self, *args, **options):
+        with benchmarks.temporary_database(keepdb=options['keepdb']):
+            report = benchmarks.run(
+                hairdresser_count=options['hairdressers'],
+                service_count=options['services'],
+                day_count=options['days'],
+                iterations=options['iterations'],
+            )
+        benchmarks.write_report(report, options['output'], self.stdout)
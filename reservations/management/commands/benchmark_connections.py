@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from reservations import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Porównuje opóźnienia (p50/p95) żądań API przy nowym połączeniu dla każdego żądania "
+        "i przy trwałych połączeniach (z kontrolą stanu i bez) na tymczasowej bazie testowej."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hairdressers', type=int, default=5)
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--output', help="Plik, do którego zostanie zapisany wynik JSON.")
+        parser.add_argument('--keepdb', action='store_true', help="Nie usuwa bazy testowej po pomiarze.")
+
+    def handle(self, *args, **options):
+        with benchmarks.temporary_database(keepdb=options['keepdb']):
+            report = benchmarks.run_connections(
+                iterations=options['iterations'],
+                hairdresser_count=options['hairdressers'],
+                day_count=options['days'],
+            )
+        benchmarks.write_report(report, options['output'], self.stdout)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from reservations import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mierzy czas startu procesu (python -X importtime, import aplikacji WSGI) "
+        "dla profili ustawień dev i prod i wypisuje wynik jako JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=10, help="Liczba pakietów z najdłuższym importem.")
+        parser.add_argument('--profile', action='append', choices=benchmarks.STARTUP_PROFILES,
+                            help="Profil DJANGO_ENV (domyślnie wszystkie).")
+        parser.add_argument('--output', help="Plik, do którego zostanie zapisany wynik JSON.")
+
+    def handle(self, *args, **options):
+        report = benchmarks.run_startup(
+            runs=options['runs'],
+            top=options['top'],
+            profiles=options['profile'] or benchmarks.STARTUP_PROFILES,
+        )
+        benchmarks.write_report(report, options['output'], self.stdout)
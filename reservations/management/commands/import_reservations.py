@@ -0,0 +1,236 @@
+import csv
+import json
+import sys
+from collections import defaultdict
+from datetime import date, time
+from itertools import groupby, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from reservations import schedule_cache
+from reservations.availability import add_duration, load_day_schedules
+from reservations.models import Hairdresser, Reservation, ScheduleVersion, Service
+from reservations.specialization_cache import specialization_matrix
+
+FORMATS = ('csv', 'json', 'jsonl')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+class RowError(Exception):
+    pass
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_json(stream, chunk_size=JSON_CHUNK_SIZE):
+    """Czyta tablicę JSON element po elemencie - w pamięci jest tylko bieżący fragment pliku."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def next_char():
+        # Pierwszy znak różny od białego lub '' na końcu danych
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return ''
+            read_more()
+
+    if next_char() != '[':
+        raise ValueError("dane JSON muszą być tablicą rezerwacji")
+    position += 1
+    if next_char() == ']':
+        return
+    number = 0
+    while True:
+        next_char()
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # Wartość kończąca się razem z buforem (np. liczba) może mieć ciąg dalszy
+                if end < len(buffer) or eof:
+                    break
+            read_more()
+        position = end
+        number += 1
+        yield number, record
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"oczekiwano ',' lub ']' po elemencie {number} tablicy JSON")
+        position += 1
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield number, json.loads(line)
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+
+
+class Command(BaseCommand):
+    help = "Importuje rezerwacje z pliku CSV, JSON lub JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Ścieżka do pliku lub '-' dla standardowego wejścia.")
+        parser.add_argument('--format', choices=FORMATS, help="Format danych (domyślnie według rozszerzenia).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Liczba wierszy w jednej partii.")
+        parser.add_argument('--dry-run', action='store_true', help="Sprawdza dane bez zapisu do bazy.")
+
+    def handle(self, *args, **options):
+        data_format = options['format'] or self.detect_format(options['path'])
+        if options['batch_size'] < 1:
+            raise CommandError("Rozmiar partii musi być dodatni.")
+
+        self.hairdresser_ids = set(Hairdresser.objects.values_list('pk', flat=True))
+        self.durations = dict(Service.objects.values_list('pk', 'duration'))
+        # Przy --dry-run przyjęte wiersze nie trafiają do bazy - kolejne partie
+        # porównywane są z nimi tutaj: {(fryzjer, dzień): [(start, koniec, wiersz)]}
+        self.dry_run = options['dry_run']
+        self.unsaved = defaultdict(list)
+        imported = rejected = 0
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            rows = READERS[data_format](stream)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                accepted, errors = self.process_batch(batch)
+                for number, reason in errors:
+                    self.stderr.write(f"Wiersz {number}: {reason}")
+                rejected += len(errors)
+                if accepted and not options['dry_run']:
+                    try:
+                        with transaction.atomic():
+                            Reservation.objects.bulk_create(accepted, batch_size=options['batch_size'])
+                            # bulk_create nie wysyła sygnałów - wersje grafików i cache dni
+                            # aktualizowane są tutaj
+                            keys = {(reservation.hairdresser_id, reservation.start_date) for reservation in accepted}
+                            ScheduleVersion.objects.bump(keys)
+                            schedule_cache.invalidate(keys)
+                    except IntegrityError as error:
+                        raise CommandError(f"Zapis partii nie powiódł się: {error}")
+                imported += len(accepted)
+        except (ValueError, csv.Error) as error:
+            raise CommandError(f"Nie można odczytać danych: {error}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        verb = "Poprawnych" if options['dry_run'] else "Zaimportowano"
+        self.stdout.write(f"{verb} rezerwacji: {imported}, odrzuconych: {rejected}.")
+
+    def detect_format(self, path):
+        extension = path.rsplit('.', 1)[-1].lower()
+        if extension not in FORMATS:
+            raise CommandError("Nie można rozpoznać formatu danych, użyj opcji --format.")
+        return extension
+
+    def parse(self, record):
+        try:
+            hairdresser_id = int(record['hairdresser'])
+            service_id = int(record['service'])
+            start_date = date.fromisoformat(record['start_date'])
+            start_time = time.fromisoformat(record['start_time'])
+            end_time = time.fromisoformat(record['end_time']) if record.get('end_time') else None
+        except KeyError as error:
+            raise RowError(f"brak pola {error}")
+        except (TypeError, ValueError) as error:
+            raise RowError(f"niepoprawna wartość ({error})")
+
+        if hairdresser_id not in self.hairdresser_ids:
+            raise RowError("nieznany fryzjer")
+        if service_id not in self.durations:
+            raise RowError("nieznana usługa")
+        if end_time is None:
+            end_time = add_duration(start_time, self.durations[service_id])
+            if end_time is None:
+                raise RowError("rezerwacja musi zakończyć się tego samego dnia")
+        if end_time < start_time:
+            raise RowError("czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia")
+        if not specialization_matrix.can_perform(hairdresser_id, service_id):
+            raise RowError("fryzjer nie ma specjalizacji do realizacji wskazanej usługi")
+
+        reservation = Reservation(
+            hairdresser_id=hairdresser_id,
+            service_id=service_id,
+            start_date=start_date,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        reservation.sync_range()
+        return reservation
+
+    def process_batch(self, batch):
+        candidates = []
+        errors = []
+        for number, record in batch:
+            try:
+                candidates.append((number, self.parse(record)))
+            except RowError as error:
+                errors.append((number, str(error)))
+        if not candidates:
+            return [], errors
+
+        days = [reservation.start_date for _, reservation in candidates]
+        schedules = load_day_schedules(
+            {reservation.hairdresser_id for _, reservation in candidates},
+            min(days),
+            max(days),
+        )
+
+        # Zamiatanie: kandydaci posortowani po fryzjerze, dniu i godzinie
+        # rozpoczęcia są porównywani z istniejącymi rezerwacjami oraz z końcem
+        # ostatniego przyjętego wiersza z tej samej partii
+        def day_key(candidate):
+            reservation = candidate[1]
+            return reservation.hairdresser_id, reservation.start_date
+
+        accepted = []
+        candidates.sort(key=lambda candidate: (*day_key(candidate), candidate[1].start_time))
+        for key, group in groupby(candidates, key=day_key):
+            schedule = schedules[key]
+            unsaved = self.unsaved[key]
+            last_number = last_end = None
+            for number, reservation in group:
+                earlier = next(
+                    (row for start, end, row in unsaved if start < reservation.end_time and reservation.start_time < end),
+                    None,
+                )
+                if not schedule.is_free(reservation.start_time, reservation.end_time):
+                    errors.append((number, "termin koliduje z istniejącą rezerwacją"))
+                elif earlier is not None:
+                    errors.append((number, f"termin koliduje z wierszem {earlier}"))
+                elif last_end is not None and reservation.start_time < last_end:
+                    errors.append((number, f"termin koliduje z wierszem {last_number}"))
+                else:
+                    accepted.append(reservation)
+                    last_number, last_end = number, reservation.end_time
+                    if self.dry_run:
+                        unsaved.append((reservation.start_time, reservation.end_time, number))
+
+        errors.sort()
+        return accepted, errors
@@ -0,0 +1,27 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from reservations.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = "Wykonuje zadania w tle z tabeli Job (z ponowieniami i rosnącym opóźnieniem) w puli wątków."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, help="Liczba zadań pobieranych naraz (domyślnie 5 na wątek).")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Przerwa w sekundach, gdy kolejka jest pusta.")
+        parser.add_argument('--once', action='store_true', help="Wykonuje zadania gotowe do uruchomienia i kończy pracę.")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            threads=options['threads'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
+        # SIGTERM/SIGINT kończą pracę po bieżącej partii zadań
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+        processed = worker.run(once=options['once'])
+        self.stdout.write(f"Wykonano zadań: {processed}")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from reservations import reminders
+
+
+class Command(BaseCommand):
+    help = "Wysyła przypomnienia o rezerwacjach 24 h i 2 h przed wizytą (do uruchamiania co minutę)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=reminders.BATCH_SIZE)
+        parser.add_argument('--senders', type=int, default=reminders.SENDERS, help="Liczba równoległych wysyłek.")
+
+    def handle(self, *args, **options):
+        result = reminders.send_reminders(batch_size=options['batch_size'], senders=options['senders'])
+        self.stdout.write(f"Wysłano przypomnień: {result.sent}, nieudanych: {result.failed}")
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:25
+
+from django.db import IntegrityError, migrations, models
+
+# Ograniczenie wykluczające nakładające się rezerwacje tego samego fryzjera.
+# Równość fryzjera wyrażona jest przez zakres int8range, dzięki czemu indeks
+# GiST nie wymaga rozszerzenia btree_gist.
+ADD_NO_OVERLAP_CONSTRAINT = """
+ALTER TABLE reservations_reservation
+ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    int8range(hairdresser_id, hairdresser_id, '[]') WITH =,
+    tsrange(start_date + start_time, start_date + end_time, '[)') WITH &&
+) WHERE (end_time IS NOT NULL)
+"""
+
+# Dotychczasowy zapis rezerwacji nie blokował nakładania się terminów - istniejące
+# kolizje trzeba usunąć lub przenieść ręcznie, zanim ograniczenie zostanie dodane
+FIND_OVERLAPS = """
+SELECT a.id, b.id, a.hairdresser_id, a.start_date, a.start_time
+FROM reservations_reservation a
+JOIN reservations_reservation b ON b.hairdresser_id = a.hairdresser_id AND b.start_date = a.start_date AND b.id > a.id
+WHERE a.end_time IS NOT NULL AND b.end_time IS NOT NULL
+  AND a.start_time < b.end_time AND b.start_time < a.end_time
+ORDER BY a.start_date, a.start_time
+LIMIT 20
+"""
+
+DROP_NO_OVERLAP_CONSTRAINT = """
+ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap
+"""
+
+
+def check_overlaps(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        overlaps = cursor.fetchall()
+    if overlaps:
+        pairs = "\n".join(
+            f"  rezerwacje {first} i {second} (fryzjer {hairdresser}, {day} {start})"
+            for first, second, hairdresser, day, start in overlaps
+        )
+        raise IntegrityError(
+            "Nie można dodać ograniczenia reservation_no_overlap - w bazie są nakładające się "
+            f"rezerwacje (najwyżej 20 pierwszych):\n{pairs}\n"
+            "Usuń lub przenieś je i uruchom migrację ponownie."
+        )
+
+
+def add_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        check_overlaps(schema_editor.connection)
+        schema_editor.execute(ADD_NO_OVERLAP_CONSTRAINT)
+
+
+def drop_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_NO_OVERLAP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_reservation_start_date_alter_reservation_end_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['hairdresser', 'start_date', 'start_time', 'end_time'], name='reservation_overlap_idx'),
+        ),
+        migrations.RunPython(add_no_overlap_constraint, drop_no_overlap_constraint),
+    ]
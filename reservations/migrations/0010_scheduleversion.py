@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0009_reservation_overlap_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reservations.hairdresser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleversion',
+            constraint=models.UniqueConstraint(fields=('hairdresser', 'date'), name='unique_schedule_version'),
+        ),
+    ]
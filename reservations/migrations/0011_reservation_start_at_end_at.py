@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:05
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def fill_start_at_end_at(apps, schema_editor):
+    Reservation = apps.get_model('reservations', 'Reservation')
+    batch = []
+    for reservation in Reservation.objects.select_related('service').iterator(chunk_size=BATCH_SIZE):
+        reservation.start_at = timezone.make_aware(datetime.combine(reservation.start_date, reservation.start_time))
+        if reservation.end_time:
+            reservation.end_at = timezone.make_aware(datetime.combine(reservation.start_date, reservation.end_time))
+        elif reservation.service:
+            reservation.end_at = reservation.start_at + reservation.service.duration
+        else:
+            reservation.end_at = reservation.start_at
+        batch.append(reservation)
+        if len(batch) == BATCH_SIZE:
+            Reservation.objects.bulk_update(batch, ['start_at', 'end_at'])
+            batch = []
+    Reservation.objects.bulk_update(batch, ['start_at', 'end_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0010_scheduleversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='start_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_start_at_end_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:05
+
+from django.db import IntegrityError, migrations, models
+
+# Ograniczenie wykluczające nakładające się rezerwacje porównuje teraz jeden
+# zakres tstzrange(start_at, end_at) zamiast daty i godzin
+ADD_RANGE_CONSTRAINT = """
+ALTER TABLE reservations_reservation
+ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    int8range(hairdresser_id, hairdresser_id, '[]') WITH =,
+    tstzrange(start_at, end_at, '[)') WITH &&
+)
+"""
+
+ADD_DATE_TIME_CONSTRAINT = """
+ALTER TABLE reservations_reservation
+ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    int8range(hairdresser_id, hairdresser_id, '[]') WITH =,
+    tsrange(start_date + start_time, start_date + end_time, '[)') WITH &&
+) WHERE (end_time IS NOT NULL)
+"""
+
+# Ograniczenie obejmuje teraz także rezerwacje bez end_time (koniec wyliczony
+# z czasu trwania usługi), więc ich kolizje trzeba wykryć przed jego dodaniem
+FIND_OVERLAPS = """
+SELECT a.id, b.id, a.hairdresser_id, a.start_at
+FROM reservations_reservation a
+JOIN reservations_reservation b ON b.hairdresser_id = a.hairdresser_id AND b.id > a.id
+WHERE a.start_at < a.end_at AND b.start_at < b.end_at
+  AND a.start_at < b.end_at AND b.start_at < a.end_at
+ORDER BY a.start_at
+LIMIT 20
+"""
+
+DROP_CONSTRAINT = """
+ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap
+"""
+
+
+def find_overlaps(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        return cursor.fetchall()
+
+
+def check_overlaps(connection):
+    overlaps = find_overlaps(connection)
+    if overlaps:
+        pairs = "\n".join(
+            f"  rezerwacje {first} i {second} (fryzjer {hairdresser}, {start_at})"
+            for first, second, hairdresser, start_at in overlaps
+        )
+        raise IntegrityError(
+            "Nie można dodać ograniczenia reservation_no_overlap - w bazie są nakładające się "
+            f"rezerwacje (najwyżej 20 pierwszych):\n{pairs}\n"
+            "Usuń lub przenieś je i uruchom migrację ponownie."
+        )
+
+
+def use_range_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        check_overlaps(schema_editor.connection)
+        schema_editor.execute(DROP_CONSTRAINT)
+        schema_editor.execute(ADD_RANGE_CONSTRAINT)
+
+
+def use_date_time_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+        schema_editor.execute(ADD_DATE_TIME_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0011_reservation_start_at_end_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='start_at',
+            field=models.DateTimeField(blank=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='end_at',
+            field=models.DateTimeField(blank=True, editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='reservation',
+            name='reservation_overlap_idx',
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['hairdresser', 'start_at', 'end_at'], name='reservation_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['start_at'], name='reservation_start_at_idx'),
+        ),
+        migrations.RunPython(use_range_constraint, use_date_time_constraint),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0012_reservation_range_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1)),
+                ('until', models.DateField()),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reservations.hairdresser')),
+                ('service', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='reservations.service')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='reservations.recurrencerule'),
+        ),
+    ]
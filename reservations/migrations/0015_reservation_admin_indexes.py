@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0014_workinghours_absence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['start_date', 'start_time', 'id'], name='reservation_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['hairdresser', 'start_date', 'start_time', 'id'], name='reservation_hd_day_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Ograniczenie wykluczające może być odroczone do końca transakcji - zbiorcze
+# przesunięcie rezerwacji (jeden UPDATE) przechodzi przez stany pośrednie, w których
+# przesuwane terminy na chwilę nachodzą na siebie. Warunek jest ten sam co w 0012,
+# więc dane spełniają go już przed odtworzeniem ograniczenia
+ADD_DEFERRABLE_CONSTRAINT = """
+ALTER TABLE reservations_reservation
+ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    int8range(hairdresser_id, hairdresser_id, '[]') WITH =,
+    tstzrange(start_at, end_at, '[)') WITH &&
+) DEFERRABLE INITIALLY IMMEDIATE
+"""
+
+ADD_IMMEDIATE_CONSTRAINT = """
+ALTER TABLE reservations_reservation
+ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    int8range(hairdresser_id, hairdresser_id, '[]') WITH =,
+    tstzrange(start_at, end_at, '[)') WITH &&
+)
+"""
+
+DROP_CONSTRAINT = """
+ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap
+"""
+
+
+def use_deferrable_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+        schema_editor.execute(ADD_DEFERRABLE_CONSTRAINT)
+
+
+def use_immediate_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+        schema_editor.execute(ADD_IMMEDIATE_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_reservation_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_deferrable_constraint, use_immediate_constraint),
+    ]
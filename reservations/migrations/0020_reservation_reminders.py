@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:08
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def skip_past_reservations(apps, schema_editor):
+    # Odbyte wizyty nie potrzebują przypomnień i nie powinny trafić do częściowego indeksu
+    Reservation = apps.get_model('reservations', 'Reservation')
+    Reservation.objects.filter(start_at__lte=timezone.now()).update(reminder_stage=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0019_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='client_contact',
+            field=models.CharField(blank=True, help_text='Telefon lub e-mail do przypomnień.', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='reminder_stage',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Brak'), (1, '24 h przed wizytą'), (2, '2 h przed wizytą')], default=0, editable=False),
+        ),
+        migrations.RunPython(skip_past_reservations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('reminder_stage__lt', 2)), fields=['start_at', 'id'], name='reservation_reminder_idx'),
+        ),
+    ]
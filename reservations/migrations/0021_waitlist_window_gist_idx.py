@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+# Indeks przedziałów oczekujących wpisów - dopasowanie zwolnionego terminu
+# (operator &&) czyta tylko wpisy, których okno na niego zachodzi
+ADD_GIST_INDEX = """
+CREATE INDEX waitlist_window_gist_idx ON reservations_waitlistentry
+USING gist (tstzrange(window_start, window_end, '[)'))
+WHERE status = 'waiting'
+"""
+
+DROP_GIST_INDEX = """
+DROP INDEX IF EXISTS waitlist_window_gist_idx
+"""
+
+
+def add_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_GIST_INDEX)
+
+
+def drop_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_GIST_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0020_reservation_reminders'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='waitlistentry',
+            name='waitlist_window_idx',
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(condition=models.Q(('status', 'waiting')), fields=['window_end'], name='waitlist_window_end_idx'),
+        ),
+        migrations.RunPython(add_gist_index, drop_gist_index),
+    ]
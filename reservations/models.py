@@ -1,8 +1,18 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from .instrumentation import traced
+from .specialization_cache import specialization_matrix
+
+def local_datetime(day, value):
+    # Łączy datę i godzinę w datę świadomą strefy czasowej salonu
+    return timezone.make_aware(datetime.combine(day, value))
+
+SLOT_TAKEN_MESSAGE = _('Podany termin jest już zajęty, proszę wybrać inny termin.')
+STALE_RESERVATION_MESSAGE = _('Rezerwacja została w międzyczasie zmieniona przez kogoś innego - odśwież stronę i wprowadź zmiany ponownie.')
 
 class Hairdresser(models.Model):
     SPECIALIZATIONS = [
@@ -48,45 +58,415 @@ class Service(models.Model):
     def get_specializations(self):
         return [spec.specialization for spec in self.specializations.all()]
 
+class WorkingHours(models.Model):
+    # Godziny pracy fryzjera w dniu tygodnia; kilka wpisów w jednym dniu oznacza przerwy.
+    # Fryzjer bez żadnych wpisów pracuje w godzinach otwarcia salonu.
+    WEEKDAYS = [
+        (0, "Poniedziałek"),
+        (1, "Wtorek"),
+        (2, "Środa"),
+        (3, "Czwartek"),
+        (4, "Piątek"),
+        (5, "Sobota"),
+        (6, "Niedziela"),
+    ]
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['hairdresser', 'weekday', 'start_time']
+
+    def __str__(self):
+        return f"{self.hairdresser.name}: {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+    def clean(self):
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError(_('Czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia.'))
+
+class Absence(models.Model):
+    # Nieobecność fryzjera: urlop, wolny dzień lub jednorazowa przerwa
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='absences')
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    reason = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hairdresser', 'start_at', 'end_at'], name='absence_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hairdresser.name}: {self.start_at} - {self.end_at}"
+
+    def clean(self):
+        if self.start_at and self.end_at and self.end_at <= self.start_at:
+            raise ValidationError(_('Czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia.'))
+
+class RecurrenceRule(models.Model):
+    # Rezerwacja cykliczna: co `interval_weeks` tygodni od `start_date` do `until` włącznie
+    MAX_OCCURRENCES = 104
+
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE)
+    service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True)
+    start_date = models.DateField()
+    start_time = models.TimeField()
+    interval_weeks = models.PositiveSmallIntegerField(default=1)
+    until = models.DateField()
+
+    def __str__(self):
+        return f"{self.hairdresser.name} co {self.interval_weeks} tyg. od {self.start_date} o godz. {self.start_time}"
+
+    def occurrence_dates(self):
+        step = timedelta(weeks=self.interval_weeks)
+        day = self.start_date
+        while day <= self.until:
+            yield day
+            day += step
+
+    def build_occurrences(self):
+        """Zwraca niezapisane rezerwacje dla kolejnych terminów reguły."""
+        occurrences = []
+        for day in self.occurrence_dates():
+            reservation = Reservation(
+                hairdresser=self.hairdresser,
+                service=self.service,
+                start_date=day,
+                start_time=self.start_time,
+                recurrence=self,
+            )
+            reservation.sync_range()
+            occurrences.append(reservation)
+        return occurrences
+
+    def clean(self):
+        if not (self.hairdresser_id and self.service_id and self.start_date and self.start_time and self.until):
+            raise ValidationError(_('Wypełnij wszystkie wymagane pola.'))
+        if self.interval_weeks < 1:
+            raise ValidationError(_('Odstęp między terminami musi wynosić co najmniej tydzień.'))
+        if self.until < self.start_date:
+            raise ValidationError(_('Data końcowa nie może być wcześniejsza niż data pierwszego terminu.'))
+        if (self.until - self.start_date).days // (7 * self.interval_weeks) + 1 > self.MAX_OCCURRENCES:
+            raise ValidationError(
+                _('Reguła może utworzyć najwyżej %(limit)s terminów.'),
+                params={'limit': self.MAX_OCCURRENCES},
+            )
+        end_at = local_datetime(self.start_date, self.start_time) + self.service.duration
+        if end_at.date() != self.start_date:
+            raise ValidationError(_('Rezerwacja musi zakończyć się tego samego dnia.'))
+        if not specialization_matrix.can_perform(self.hairdresser_id, self.service_id):
+            raise ValidationError(_("Wybrany fryzjer nie ma specjalizacji do realizacji wskazanej usługi"))
+
 class Reservation(models.Model):
     hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE)
     service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True)
     start_date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField(blank=True, null=True)    
+    # Początek i koniec jako timestamptz, wyliczane z pól daty i godziny przy
+    # zapisie - zapytania o nakładanie się i zakresy dat porównują tylko te pola
+    start_at = models.DateTimeField(blank=True, editable=False)
+    end_at = models.DateTimeField(blank=True, editable=False)
+    recurrence = models.ForeignKey(
+        RecurrenceRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservations',
+    )
+    # Numer wersji do optymistycznej kontroli współbieżności - zapis zmiany
+    # to UPDATE ... WHERE version = n, więc równoległa edycja nie nadpisze cudzej zmiany
+    version = models.PositiveIntegerField(default=0)
+    client_contact = models.CharField(max_length=100, blank=True, help_text="Telefon lub e-mail do przypomnień.")
+    # Ostatnie wysłane przypomnienie: brak, 24 h przed wizytą, 2 h przed wizytą
+    NOT_REMINDED = 0
+    REMINDED_DAY_BEFORE = 1
+    REMINDED = 2
+    REMINDER_STAGES = [
+        (NOT_REMINDED, "Brak"),
+        (REMINDED_DAY_BEFORE, "24 h przed wizytą"),
+        (REMINDED, "2 h przed wizytą"),
+    ]
+    reminder_stage = models.PositiveSmallIntegerField(choices=REMINDER_STAGES, default=NOT_REMINDED, editable=False)
+
+    # Pola, których zmiana wymaga ponownego sprawdzenia kolizji terminów
+    SCHEDULE_FIELDS = ('hairdresser_id', 'service_id', 'start_date', 'start_time', 'end_time')
+
+    class Meta:
+        indexes = [
+            # Indeks pod zapytanie o kolidujące rezerwacje fryzjera
+            models.Index(
+                fields=['hairdresser', 'start_at', 'end_at'],
+                name='reservation_range_idx',
+            ),
+            models.Index(fields=['start_at'], name='reservation_start_at_idx'),
+            # Indeksy pod listę rezerwacji w panelu administracyjnym (sortowanie po dniu i godzinie)
+            models.Index(fields=['start_date', 'start_time', 'id'], name='reservation_day_idx'),
+            models.Index(
+                fields=['hairdresser', 'start_date', 'start_time', 'id'],
+                name='reservation_hd_day_idx',
+            ),
+            # Częściowy indeks rezerwacji czekających na przypomnienie - send_reminders
+            # przegląda tylko ten indeks, więc puste uruchomienie to jedno krótkie zapytanie
+            models.Index(
+                fields=['start_at', 'id'],
+                name='reservation_reminder_idx',
+                condition=models.Q(reminder_stage__lt=2),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.hairdresser.name} rezerwacja na {self.start_date} o godz. {self.start_time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Wartości wczytane z bazy - pozwalają ustalić, z którego dnia przeniesiono rezerwację
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def schedule_keys(self):
+        # Pary (fryzjer, dzień), których grafik zmienia zapis lub usunięcie rezerwacji
+        keys = {(self.hairdresser_id, self.start_date)}
+        loaded = getattr(self, '_loaded_values', {})
+        if 'hairdresser_id' in loaded and 'start_date' in loaded:
+            keys.add((loaded['hairdresser_id'], loaded['start_date']))
+        return keys
+
+    def schedule_changed(self):
+        # Nowa rezerwacja lub zmiana fryzjera, usługi, dnia albo godzin względem wartości z bazy
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or not loaded:
+            return True
+        return any(loaded.get(name) != getattr(self, name) for name in self.SCHEDULE_FIELDS)
+
+    def sync_range(self):
+        """Uzupełnia end_time (gdy brak) i wylicza start_at/end_at z pól daty i godziny."""
+        self.start_at = local_datetime(self.start_date, self.start_time)
+        if not self.end_time and self.service:
+            self.end_time = (self.start_at + self.service.duration).time()
+        self.end_at = local_datetime(self.start_date, self.end_time) if self.end_time else self.start_at
+
+    def get_conflicts(self):
+        # Wymaga aktualnych start_at/end_at (sync_range)
+        return Reservation.objects.filter(
+            hairdresser_id=self.hairdresser_id,
+            start_at__lt=self.end_at,
+            end_at__gt=self.start_at,
+        ).exclude(pk=self.pk)
+
+    @traced('reservation.clean')
     def clean(self):
         if self.hairdresser_id and self.start_date and self.start_time and self.service:
-            start_datetime = timezone.make_aware(datetime.combine(self.start_date, self.start_time))
-            end_datetime = start_datetime + self.service.duration
+            start_at = local_datetime(self.start_date, self.start_time)
+            end_at = start_at + self.service.duration
 
-            if end_datetime.date() != self.start_date:
+            if end_at.date() != self.start_date:
                 raise ValidationError(_('Rezerwacja musi zakończyć się tego samego dnia.'))
 
-            self.end_time = end_datetime.time()
+            self.end_time = end_at.time()
+            self.start_at, self.end_at = start_at, end_at
         else:
             raise ValidationError(_('Wypełnij wszystkie wymagane pola.'))
         
-        service_specializations = self.service.get_specializations() if self.service else []
-        if not any(self.hairdresser.has_specialization(spec) for spec in service_specializations):
+        if not specialization_matrix.can_perform(self.hairdresser_id, self.service_id):
+            raise ValidationError(_("Wybrany fryzjer nie ma specjalizacji do realizacji wskazanej usługi"))
+
+    async def aclean(self):
+        """Asynchroniczna walidacja rezerwacji wraz ze sprawdzeniem kolizji.
+
+        Zapytania wykonują się po kolei - asynchroniczne API ORM w Django 4.2
+        uruchamia je we wspólnym wątku synchronicznym, więc asyncio.gather nie
+        dałby tu równoległości.
+        """
+        if not (self.hairdresser_id and self.service_id and self.start_date and self.start_time):
+            raise ValidationError(_('Wypełnij wszystkie wymagane pola.'))
+
+        day_start = local_datetime(self.start_date, time.min)
+        day_reservations = Reservation.objects.filter(
+            hairdresser_id=self.hairdresser_id,
+            start_at__gte=day_start,
+            start_at__lt=local_datetime(self.start_date + timedelta(days=1), time.min),
+        ).exclude(pk=self.pk).values_list('start_at', 'end_at')
+
+        try:
+            hairdresser = await Hairdresser.objects.aget(pk=self.hairdresser_id)
+            service = await Service.objects.aget(pk=self.service_id)
+        except (Hairdresser.DoesNotExist, Service.DoesNotExist):
+            raise ValidationError(_('Wybrany fryzjer lub usługa nie istnieje.'))
+        can_perform = await sync_to_async(specialization_matrix.can_perform)(self.hairdresser_id, self.service_id)
+        busy = [row async for row in day_reservations]
+
+        self.hairdresser, self.service = hairdresser, service
+        start_at = local_datetime(self.start_date, self.start_time)
+        end_at = start_at + service.duration
+        if end_at.date() != self.start_date:
+            raise ValidationError(_('Rezerwacja musi zakończyć się tego samego dnia.'))
+        if not can_perform:
             raise ValidationError(_("Wybrany fryzjer nie ma specjalizacji do realizacji wskazanej usługi"))
 
+        # Rezerwacje nie przechodzą przez północ, więc kolidować mogą tylko te z tego samego dnia
+        if any(other_start < end_at and other_end > start_at for other_start, other_end in busy):
+            raise ValidationError(SLOT_TAKEN_MESSAGE, code='slot_taken')
+
+        self.end_time = end_at.time()
+        self.start_at, self.end_at = start_at, end_at
+
+    @traced('reservation.save')
     def save(self, *args, **kwargs):
         if not (self.hairdresser and self.start_date and self.start_time and self.service):
             raise ValidationError(_('Fryzjer, data i godzina rozpoczęcia oraz usługa są wymagane.'))
 
-        start_datetime = timezone.make_aware(datetime.combine(self.start_date, self.start_time))
+        self.sync_range()
+        if self.end_at < self.start_at:
+            raise ValidationError(_('Czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia.'))
+
+        loaded = getattr(self, '_loaded_values', {})
+        if 'start_date' in loaded and (loaded['start_date'], loaded['start_time']) != (self.start_date, self.start_time):
+            # Przeniesiona rezerwacja dostanie przypomnienia o nowym terminie
+            self.reminder_stage = self.NOT_REMINDED
 
-        if not self.end_time:
-            end_datetime = start_datetime + self.service.duration
-            self.end_time = end_datetime.time()
+        if self._state.adding or kwargs.get('force_insert'):
+            super().save(*args, **kwargs)
+        else:
+            self.save_version(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
-        if self.end_time:
-            end_datetime = timezone.make_aware(datetime.combine(self.start_date, self.end_time))
-            if end_datetime < start_datetime:
-                raise ValidationError(_('Czas zakończenia nie może być wcześniejszy niż czas rozpoczęcia.'))
+    def save_version(self, *args, **kwargs):
+        # Compare-and-swap: wersja jest podbijana tylko, gdy nikt nie zapisał wiersza od
+        # odczytu. Przy konflikcie nic nie jest zapisywane i nie są wysyłane sygnały.
+        expected_version = self.version
+        if expected_version is None:
+            raise ValidationError(STALE_RESERVATION_MESSAGE, code='stale')
+        with transaction.atomic(using=kwargs.get('using')):
+            claimed = type(self)._base_manager.using(kwargs.get('using')).filter(
+                pk=self.pk, version=expected_version,
+            ).update(version=expected_version + 1)
+            if not claimed:
+                raise ValidationError(STALE_RESERVATION_MESSAGE, code='stale')
+            self.version = expected_version + 1
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version = expected_version
+                raise
+
+class WaitlistEntry(models.Model):
+    """Klient oczekujący na wolny termin usługi w podanym przedziale czasu."""
+    WAITING = 'waiting'
+    OFFERED = 'offered'
+    STATUSES = [
+        (WAITING, "Oczekuje"),
+        (OFFERED, "Zaproponowano termin"),
+    ]
 
-        super().save(*args, **kwargs)
\ No newline at end of file
+    client_name = models.CharField(max_length=100)
+    client_contact = models.CharField(max_length=100, help_text="Telefon lub adres e-mail")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='waitlist_entries')
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    # Brak wskazanych fryzjerów oznacza dowolnego z wymaganą specjalizacją
+    hairdressers = models.ManyToManyField(Hairdresser, blank=True, related_name='waitlist_entries')
+    status = models.CharField(max_length=10, choices=STATUSES, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    offered_hairdresser = models.ForeignKey(
+        Hairdresser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    offered_start_at = models.DateTimeField(null=True, blank=True)
+    offered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Oczekujące wpisy z oknem kończącym się po zwolnionym terminie. Indeks
+            # B-drzewa nie jest indeksem przedziałów - w PostgreSQL wpisy zachodzące
+            # na termin wybiera indeks GiST waitlist_window_gist_idx (migracja 0021)
+            models.Index(
+                fields=['window_end'],
+                name='waitlist_window_end_idx',
+                condition=models.Q(status='waiting'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name}: {self.service} ({self.window_start} - {self.window_end})"
+
+    def clean(self):
+        if self.window_start and self.window_end and self.window_end <= self.window_start:
+            raise ValidationError(_('Koniec przedziału musi być późniejszy niż jego początek.'))
+
+class Job(models.Model):
+    """Zadanie w tle zapisane w bazie danych, wykonywane przez polecenie run_worker."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, "W kolejce"),
+        (RUNNING, "W trakcie"),
+        (DONE, "Wykonane"),
+        (FAILED, "Nieudane"),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Pobieranie zadań do wykonania przegląda tylko zadania w kolejce
+            models.Index(fields=['run_at'], name='job_queued_idx', condition=models.Q(status='queued')),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+class ScheduleVersionManager(models.Manager):
+    # Ogranicza długość warunku OR w pojedynczym zapytaniu UPDATE
+    BUMP_CHUNK_SIZE = 200
+
+    def bump(self, keys):
+        """Podnosi wersję grafików dla par (hairdresser_id, dzień)."""
+        keys = set(keys)
+        if not keys:
+            return
+        now = timezone.now()
+        self.bulk_create(
+            [ScheduleVersion(hairdresser_id=hairdresser_id, date=day, modified_at=now) for hairdresser_id, day in keys],
+            ignore_conflicts=True,
+        )
+        keys = list(keys)
+        for offset in range(0, len(keys), self.BUMP_CHUNK_SIZE):
+            condition = models.Q()
+            for hairdresser_id, day in keys[offset:offset + self.BUMP_CHUNK_SIZE]:
+                condition |= models.Q(hairdresser_id=hairdresser_id, date=day)
+            self.filter(condition).update(version=models.F('version') + 1, modified_at=now)
+
+class ScheduleVersion(models.Model):
+    # Znacznik zmian grafiku fryzjera w danym dniu, używany do nagłówków ETag/Last-Modified
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE)
+    date = models.DateField()
+    version = models.PositiveIntegerField(default=0)
+    modified_at = models.DateTimeField(default=timezone.now)
+
+    objects = ScheduleVersionManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hairdresser', 'date'], name='unique_schedule_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.hairdresser_id} {self.date} v{self.version}"
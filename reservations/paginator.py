@@ -0,0 +1,41 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Powyżej tej liczby wierszy (według planera) zamiast COUNT(*) używane jest oszacowanie
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """Liczba wierszy zapytania oszacowana przez planer PostgreSQL lub None.
+
+    EXPLAIN nie wykonuje zapytania, więc koszt nie rośnie z rozmiarem tabeli.
+    Dla innych baz (SQLite) zwraca None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().select_related(None).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, który dla dużych wyników podaje liczbę wierszy z planu zapytania.
+
+    Dokładny COUNT(*) liczony jest tylko dla wyników mniejszych niż ESTIMATE_THRESHOLD.
+    """
+    threshold = ESTIMATE_THRESHOLD
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= self.threshold:
+            return estimate
+        return super().count
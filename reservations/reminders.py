@@ -0,0 +1,151 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .instrumentation import traced
+from .models import Reservation
+
+logger = logging.getLogger(__name__)
+
+# Przypomnienia wysyłane przed wizytą: etap zapisywany w rezerwacji i wyprzedzenie
+DAY_BEFORE = timedelta(hours=24)
+HOURS_BEFORE = timedelta(hours=2)
+
+BATCH_SIZE = 500
+SENDERS = 8
+DEFAULT_TRANSPORT = 'reservations.reminders.LogTransport'
+
+Reminder = namedtuple('Reminder', ['reservation', 'stage', 'contact', 'message'])
+SentReminders = namedtuple('SentReminders', ['sent', 'failed'])
+
+
+class LogTransport:
+    """Zapisuje przypomnienia w logu - domyślny transport bez bramki SMS/e-mail."""
+
+    def send(self, reminder):
+        logger.info("Przypomnienie do %s: %s", reminder.contact, reminder.message)
+
+
+class MemoryTransport:
+    """Zbiera przypomnienia w `outbox` zamiast je wysyłać (testy, uruchomienia lokalne)."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, reminder):
+        self.outbox.append(reminder)
+
+
+def get_transport():
+    # Transport wskazuje ustawienie RESERVATION_REMINDER_TRANSPORT (ścieżka do klasy z metodą send)
+    return import_string(getattr(settings, 'RESERVATION_REMINDER_TRANSPORT', DEFAULT_TRANSPORT))()
+
+
+def due_reservations(now):
+    """Rezerwacje, dla których przypada przypomnienie - zapytanie korzysta z reservation_reminder_idx."""
+    return Reservation.objects.filter(
+        reminder_stage__lt=Reservation.REMINDED,
+        start_at__gt=now,
+        start_at__lte=now + DAY_BEFORE,
+    ).filter(
+        Q(reminder_stage=Reservation.NOT_REMINDED) | Q(start_at__lte=now + HOURS_BEFORE),
+    )
+
+
+def build_reminder(reservation, now):
+    # Rezerwacja bliżej niż 2 h przed wizytą dostaje tylko ostatnie przypomnienie
+    stage = Reservation.REMINDED if reservation.start_at <= now + HOURS_BEFORE else Reservation.REMINDED_DAY_BEFORE
+    service = reservation.service.name if reservation.service else "wizyta"
+    message = (
+        f"Przypomnienie: {service} u {reservation.hairdresser.name} "
+        f"{reservation.start_date.strftime('%d-%m-%Y')} o godz. {reservation.start_time.strftime('%H:%M')}."
+    )
+    return Reminder(reservation, stage, reservation.client_contact, message)
+
+
+def deliver(transport, reminder):
+    # Rezerwacja bez kontaktu jest tylko oznaczana - nie ma dokąd wysłać przypomnienia
+    if not reminder.contact:
+        return True
+    try:
+        transport.send(reminder)
+    except Exception:
+        logger.exception("Nie udało się wysłać przypomnienia o rezerwacji %s", reminder.reservation.pk)
+        return False
+    return True
+
+
+def restore_stages(reservations, previous):
+    # Jedno zapytanie dla wszystkich nieudanych wysyłek; rezerwacje zmienione od
+    # zajęcia partii (inna wersja) zostają bez zmian
+    if not reservations:
+        return
+    Reservation.objects.filter(
+        reduce(or_, (Q(pk=reservation.pk, version=reservation.version) for reservation in reservations)),
+    ).update(
+        reminder_stage=Case(*(When(pk=reservation.pk, then=Value(previous[reservation.pk])) for reservation in reservations)),
+        version=F('version') + 1,
+    )
+
+
+@traced('reminders.send_reminders')
+def send_reminders(now=None, transport=None, batch_size=BATCH_SIZE, senders=SENDERS):
+    """Wysyła należne przypomnienia 24 h i 2 h przed wizytą.
+
+    Rezerwacje pobierane są partiami po (start_at, id) bez OFFSET. Partia jest
+    najpierw zajmowana: pobrana z SELECT ... FOR UPDATE SKIP LOCKED i od razu
+    oznaczona jako przypomniana jednym bulk_update w krótkiej transakcji, więc
+    nakładające się uruchomienia nie wysyłają tych samych przypomnień, a blokady
+    nie czekają na bramkę SMS. Przypomnienia wysyłane są potem równolegle w puli
+    `senders` wątków; nieudanym przywracany jest poprzedni etap (jeżeli rezerwacji
+    nikt w międzyczasie nie zmienił) i zostają do następnego uruchomienia.
+    Przerwanie procesu między zajęciem a wysyłką gubi przypomnienia tej partii -
+    pomijane są raczej niż wysyłane podwójnie. Gdy nic nie przypada, koszt to
+    jedno zapytanie po indeksie częściowym.
+    """
+    now = now or timezone.now()
+    transport = transport or get_transport()
+    queryset = due_reservations(now).select_related('hairdresser', 'service').order_by('start_at', 'pk')
+    sent = failed = 0
+    last = None
+    # Wątki puli powstają dopiero przy pierwszej wysyłce
+    with ThreadPoolExecutor(max_workers=senders, thread_name_prefix='reminders') as executor:
+        while True:
+            batch = queryset
+            if last is not None:
+                batch = batch.filter(Q(start_at__gt=last.start_at) | Q(start_at=last.start_at, pk__gt=last.pk))
+            with transaction.atomic():
+                # Rezerwacje zablokowane przez inne uruchomienie są pomijane; usługa
+                # łączona jest LEFT JOIN, więc blokowana jest tylko tabela rezerwacji
+                batch = list(batch.select_for_update(skip_locked=True, of=('self',))[:batch_size])
+                if not batch:
+                    break
+                last = batch[-1]
+                previous = {reservation.pk: reservation.reminder_stage for reservation in batch}
+                reminders = [build_reminder(reservation, now) for reservation in batch]
+                for reminder in reminders:
+                    reminder.reservation.reminder_stage = reminder.stage
+                    # Otwarty w panelu formularz nie nadpisze zapisanego etapu
+                    reminder.reservation.version += 1
+                Reservation.objects.bulk_update(batch, ['reminder_stage', 'version'])
+
+            undelivered = [
+                reminder.reservation
+                for reminder, ok in zip(reminders, executor.map(lambda item: deliver(transport, item), reminders))
+                if not ok
+            ]
+            restore_stages(undelivered, previous)
+            sent += len(batch) - len(undelivered)
+            failed += len(undelivered)
+            if len(batch) < batch_size:
+                break
+    return SentReminders(sent, failed)
@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'reservations:day'
+# Unieważnienie dociera tylko do procesów korzystających z tego samego cache - przy
+# LocMemCache pozostałe procesy mogą pokazywać stary grafik do wygaśnięcia wpisu.
+# Zapis rezerwacji i tak sprawdza kolizje w bazie, więc nie powstanie podwójna rezerwacja
+TIMEOUT = 24 * 60 * 60
+
+
+class CacheStats:
+    """Liczniki trafień i chybień cache grafików w bieżącym procesie."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def cache_key(hairdresser_id, day):
+    return f"{KEY_PREFIX}:{hairdresser_id}:{day.isoformat()}"
+
+
+def load_entries(keys):
+    from .availability import add_duration
+    from .models import Reservation, local_datetime
+
+    days = [day for _, day in keys]
+    entries = defaultdict(list)
+    rows = Reservation.objects.filter(
+        hairdresser_id__in={hairdresser_id for hairdresser_id, _ in keys},
+        start_at__gte=local_datetime(min(days), time.min),
+        start_at__lt=local_datetime(max(days) + timedelta(days=1), time.min),
+    ).values_list('hairdresser_id', 'start_date', 'start_time', 'end_time', 'service_id', 'service__duration')
+
+    for hairdresser_id, day, start, end, service_id, duration in rows:
+        if end is None and duration is not None:
+            end = add_duration(start, duration) or time.max
+        if end is None:
+            continue
+        entries[(hairdresser_id, day)].append((start, end, service_id))
+
+    return {key: sorted(entries.get(key, [])) for key in keys}
+
+
+def get_day_schedules(keys):
+    """Zwraca {(hairdresser_id, dzień): [(start, end, service_id), ...]} z cache.
+
+    Brakujące dni wczytywane są z bazy jednym zapytaniem i zapisywane w cache.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    cache_keys = {cache_key(*key): key for key in keys}
+    schedules = {cache_keys[name]: entries for name, entries in cache.get_many(list(cache_keys)).items()}
+
+    missing = [key for key in keys if key not in schedules]
+    stats.record(hits=len(schedules), misses=len(missing))
+    if missing:
+        loaded = load_entries(missing)
+        cache.set_many({cache_key(*key): entries for key, entries in loaded.items()}, TIMEOUT)
+        schedules.update(loaded)
+    return schedules
+
+
+def get_day_schedule(hairdresser_id, day):
+    return get_day_schedules([(hairdresser_id, day)])[(hairdresser_id, day)]
+
+
+def invalidate(keys):
+    names = [cache_key(*key) for key in set(keys)]
+    if not names:
+        return
+    cache.delete_many(names)
+    # Ponowne usunięcie po zatwierdzeniu transakcji - odczyt wykonany przed
+    # zatwierdzeniem mógł zapisać w cache stary stan dnia
+    transaction.on_commit(lambda: cache.delete_many(names))
@@ -0,0 +1,306 @@
+import logging
+import time as time_module
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from . import schedule_cache, tasks, waitlist
+from .instrumentation import traced
+from .availability import time_bits
+from .models import (
+    SLOT_TAKEN_MESSAGE, STALE_RESERVATION_MESSAGE, Hairdresser, Reservation, ScheduleVersion, local_datetime,
+)
+from .specialization_cache import specialization_matrix
+from .working_hours import get_working_days
+
+logger = logging.getLogger(__name__)
+
+MAX_BOOKING_ATTEMPTS = 3
+RETRY_DELAY = 0.05
+
+RecurringBooking = namedtuple('RecurringBooking', ['created', 'clashes'])
+
+# Ograniczenie wykluczające nakładające się rezerwacje fryzjera (PostgreSQL)
+OVERLAP_CONSTRAINT = 'reservation_no_overlap'
+EXCLUSION_VIOLATION = '23P01'
+
+# Pola zmieniane przy zbiorczym przesunięciu lub przepisaniu rezerwacji
+MOVED_FIELDS = ['hairdresser', 'start_date', 'start_time', 'end_time', 'start_at', 'end_at', 'version', 'reminder_stage']
+
+
+def is_overlap_violation(error):
+    # Zajęty termin to tylko naruszenie ograniczenia wykluczającego; pozostałe błędy
+    # integralności (klucze obce, NOT NULL, unikalność) nie dotyczą kolizji
+    cause = error.__cause__
+    # pgcode w psycopg2, sqlstate w psycopg 3
+    if (getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)) != EXCLUSION_VIOLATION:
+        return False
+    constraint = getattr(getattr(cause, 'diag', None), 'constraint_name', None)
+    return constraint in (None, OVERLAP_CONSTRAINT)
+
+
+@traced('booking.book_reservation')
+def book_reservation(reservation, attempts=MAX_BOOKING_ATTEMPTS):
+    """Zapisuje rezerwację, jeżeli termin jest wolny - sprawdzenie i zapis są atomowe.
+
+    Wiersz fryzjera jest blokowany (SELECT ... FOR UPDATE) na czas transakcji,
+    więc równoległe rezerwacje tego samego fryzjera wykonują się po kolei.
+    Błędy serializacji i zakleszczenia są ponawiane najwyżej `attempts` razy.
+    Zmiana istniejącej rezerwacji bez zmiany terminu (np. tylko wersji) jest
+    zapisywana bez blokady i zapytania o kolizje.
+    """
+    reservation.sync_range()
+    if not reservation.schedule_changed():
+        # Zapis z kontrolą wersji (UPDATE ... WHERE version = n) wystarcza
+        reservation.save()
+        return reservation
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                Hairdresser.objects.select_for_update().get(pk=reservation.hairdresser_id)
+                if reservation.get_conflicts().exists():
+                    raise ValidationError(SLOT_TAKEN_MESSAGE, code='slot_taken')
+                adding = reservation._state.adding
+                reservation.save()
+                if adding:
+                    # Potwierdzenia i inne efekty uboczne wykonuje run_worker po zatwierdzeniu
+                    tasks.reservations_booked([reservation])
+            return reservation
+        except IntegrityError as error:
+            if not is_overlap_violation(error):
+                raise
+            # Ograniczenie wykluczające w PostgreSQL odrzuciło nakładający się termin
+            raise ValidationError(SLOT_TAKEN_MESSAGE, code='slot_taken')
+        except OperationalError:
+            if attempt == attempts:
+                raise
+            logger.warning("Ponawianie rezerwacji po błędzie serializacji (próba %s)", attempt)
+            time_module.sleep(RETRY_DELAY * attempt)
+
+
+async def abook_reservation(reservation):
+    """Asynchroniczny odpowiednik book_reservation dla widoków ASGI.
+
+    Walidacja i wstępne sprawdzenie kolizji wykonują się bez blokowania pętli
+    zdarzeń; zapis z blokadą wiersza fryzjera działa w wątku, bo transakcje
+    i SELECT ... FOR UPDATE nie mają asynchronicznego API w ORM.
+    """
+    await reservation.aclean()
+    return await sync_to_async(book_reservation)(reservation)
+
+
+def find_clashes(candidates, busy):
+    """Zwraca kandydatów nachodzących na którykolwiek z zajętych przedziałów.
+
+    Obie listy par (start, end) muszą być posortowane po początku - wystarczy
+    wtedy jedno przejście po scalonych przedziałach zajętości.
+    """
+    merged = []
+    for start, end in busy:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    clashes = []
+    index = 0
+    for candidate in candidates:
+        start, end = candidate
+        while index < len(merged) and merged[index][1] <= start:
+            index += 1
+        if index < len(merged) and merged[index][0] < end:
+            clashes.append(candidate)
+    return clashes
+
+
+@traced('booking.book_recurring')
+def book_recurring(rule):
+    """Zapisuje regułę cykliczną i wszystkie wolne terminy jednym bulk_create.
+
+    Terminy sprawdzane są jednym zapytaniem o rezerwacje fryzjera w zakresie
+    reguły; zajęte terminy są pomijane i zwracane w `clashes`.
+    """
+    rule.clean()
+    occurrences = rule.build_occurrences()
+    with transaction.atomic():
+        Hairdresser.objects.select_for_update().get(pk=rule.hairdresser_id)
+        rule.save()
+        busy = Reservation.objects.filter(
+            hairdresser_id=rule.hairdresser_id,
+            start_date__in=[occurrence.start_date for occurrence in occurrences],
+            start_at__lt=occurrences[-1].end_at,
+            end_at__gt=occurrences[0].start_at,
+        ).order_by('start_at').values_list('start_at', 'end_at')
+
+        taken = set(find_clashes([(item.start_at, item.end_at) for item in occurrences], busy))
+        clashes = [item for item in occurrences if (item.start_at, item.end_at) in taken]
+        accepted = [item for item in occurrences if (item.start_at, item.end_at) not in taken]
+        try:
+            created = Reservation.objects.bulk_create(accepted)
+        except IntegrityError as error:
+            if not is_overlap_violation(error):
+                raise
+            raise ValidationError(SLOT_TAKEN_MESSAGE, code='slot_taken')
+
+        # bulk_create nie wysyła sygnałów - wersje grafików i cache trzeba odświeżyć ręcznie
+        keys = {(rule.hairdresser_id, item.start_date) for item in created}
+        ScheduleVersion.objects.bump(keys)
+        schedule_cache.invalidate(keys)
+        tasks.reservations_booked(created)
+    return RecurringBooking(created, clashes)
+
+
+def describe(reservation):
+    return f"{reservation.start_date.strftime('%d-%m-%Y')} {reservation.start_time.strftime('%H:%M')}"
+
+
+@traced('booking.move_reservations')
+def move_reservations(reservations, shift=timedelta(0), hairdresser=None):
+    """Przesuwa rezerwacje o `shift` i/lub przepisuje je do fryzjera `hairdresser`.
+
+    Specjalizacje sprawdzane są w macierzy w pamięci, kolizje jednym zapytaniem
+    o rezerwacje docelowych fryzjerów, a zapis to jeden bulk_update - liczba
+    zapytań nie zależy od liczby rezerwacji. Nowy termin musi być w przyszłości
+    i w godzinach pracy fryzjera, a rezerwacje niezmienione od odczytu (kontrola
+    wersji). Jeżeli którejkolwiek rezerwacji nie można przenieść, żadna nie jest
+    zmieniana.
+    """
+    reservations = list(reservations)
+    if not reservations:
+        return []
+    keys = set().union(*(reservation.schedule_keys() for reservation in reservations))
+    locked = {hairdresser_id for hairdresser_id, _ in keys}
+
+    errors = []
+    ends = {}
+    now = timezone.now()
+    for reservation in reservations:
+        start = datetime.combine(reservation.start_date, reservation.start_time) + shift
+        end = start + (reservation.end_at - reservation.start_at)
+        if hairdresser is not None:
+            reservation.hairdresser = hairdresser
+        if end.date() != start.date():
+            errors.append(f"{describe(reservation)}: rezerwacja musi zakończyć się tego samego dnia.")
+        elif local_datetime(start.date(), start.time()) < now:
+            errors.append(f"{describe(reservation)}: nie można przenieść rezerwacji na termin w przeszłości.")
+        elif reservation.service_id and not specialization_matrix.can_perform(
+            reservation.hairdresser_id, reservation.service_id,
+        ):
+            errors.append(f"{describe(reservation)}: fryzjer nie ma specjalizacji do realizacji usługi.")
+        reservation.start_date, reservation.start_time = start.date(), start.time()
+        reservation.end_time = end.time() if reservation.end_time else None
+        ends[reservation.pk] = end.time()
+        reservation.start_at = local_datetime(start.date(), start.time())
+        reservation.end_at = local_datetime(end.date(), end.time())
+        if shift:
+            reservation.reminder_stage = Reservation.NOT_REMINDED
+    if errors:
+        raise ValidationError(errors)
+
+    # Godziny pracy docelowych fryzjerów - skompilowane tygodnie z cache
+    working_days = get_working_days(
+        {reservation.hairdresser_id for reservation in reservations},
+        min(reservation.start_date for reservation in reservations),
+        max(reservation.start_date for reservation in reservations),
+    )
+    errors = [
+        f"{describe(reservation)}: termin wykracza poza godziny pracy fryzjera."
+        for reservation in reservations
+        if time_bits(reservation.start_time, ends[reservation.pk])
+        & ~working_days[(reservation.hairdresser_id, reservation.start_date)]
+    ]
+    if errors:
+        raise ValidationError(errors)
+
+    candidates = defaultdict(list)
+    for reservation in sorted(reservations, key=lambda item: item.start_at):
+        candidates[reservation.hairdresser_id].append(reservation)
+
+    postgresql = connection.vendor == 'postgresql'
+    with transaction.atomic():
+        list(Hairdresser.objects.select_for_update().filter(pk__in=locked | set(candidates)).order_by('pk'))
+        busy = defaultdict(list)
+        rows = Reservation.objects.filter(
+            hairdresser_id__in=list(candidates),
+            start_date__in={reservation.start_date for reservation in reservations},
+        ).exclude(
+            pk__in=[reservation.pk for reservation in reservations],
+        ).order_by('start_at').values_list('hairdresser_id', 'start_at', 'end_at')
+        for hairdresser_id, start_at, end_at in rows:
+            busy[hairdresser_id].append((start_at, end_at))
+
+        for hairdresser_id, moved in candidates.items():
+            ranges = [(reservation.start_at, reservation.end_at) for reservation in moved]
+            taken = set(find_clashes(ranges, busy[hairdresser_id]))
+            # Przenoszone rezerwacje nie mogą też nachodzić na siebie nawzajem - długa
+            # rezerwacja może przykrywać kilka kolejnych, stąd najpóźniejszy dotąd koniec
+            latest_end = None
+            for current in ranges:
+                if latest_end is not None and current[0] < latest_end:
+                    taken.add(current)
+                latest_end = current[1] if latest_end is None else max(latest_end, current[1])
+            errors.extend(
+                f"{describe(reservation)}: {SLOT_TAKEN_MESSAGE}"
+                for reservation in moved if (reservation.start_at, reservation.end_at) in taken
+            )
+        if errors:
+            raise ValidationError(errors, code='slot_taken')
+
+        # Kontrola wersji jak przy zapisie pojedynczej rezerwacji - wiersze zmienione
+        # od odczytu (lub usunięte) przerywają całą operację
+        current = dict(
+            Reservation.objects.select_for_update().filter(
+                pk__in=[reservation.pk for reservation in reservations],
+            ).values_list('pk', 'version')
+        )
+        if any(current.get(reservation.pk) != reservation.version for reservation in reservations):
+            raise ValidationError(STALE_RESERVATION_MESSAGE, code='stale')
+        for reservation in reservations:
+            # Otwarte w panelu formularze tych rezerwacji staną się nieaktualne
+            reservation.version += 1
+
+        try:
+            with connection.cursor() as cursor:
+                if postgresql:
+                    # Jeden UPDATE przechodzi przez stany, w których przesuwane terminy nachodzą na siebie
+                    cursor.execute("SET CONSTRAINTS reservation_no_overlap DEFERRED")
+                Reservation.objects.bulk_update(reservations, MOVED_FIELDS)
+                if postgresql:
+                    cursor.execute("SET CONSTRAINTS reservation_no_overlap IMMEDIATE")
+        except IntegrityError as error:
+            for reservation in reservations:
+                reservation.version -= 1
+            if not is_overlap_violation(error):
+                raise
+            raise ValidationError(SLOT_TAKEN_MESSAGE, code='slot_taken')
+
+        # bulk_update nie wysyła sygnałów - wersje grafików i cache trzeba odświeżyć ręcznie
+        keys.update((reservation.hairdresser_id, reservation.start_date) for reservation in reservations)
+        ScheduleVersion.objects.bump(keys)
+        schedule_cache.invalidate(keys)
+    return reservations
+
+
+@traced('booking.cancel_reservations')
+def cancel_reservations(reservations):
+    """Usuwa rezerwacje jednym zapytaniem DELETE i zwraca ich liczbę.
+
+    Jak w book_recurring, wersje grafików, cache i lista oczekujących obsługiwane
+    są zbiorczo - liczba zapytań nie zależy od liczby rezerwacji.
+    """
+    with transaction.atomic():
+        rows = list(reservations.order_by().values_list('pk', 'hairdresser_id', 'start_date', 'start_at', 'end_at'))
+        # QuerySet.delete() wysyła post_delete dla każdego wiersza (wersja grafiku
+        # i zgłoszenie na listę oczekujących osobno) - _raw_delete pomija sygnały.
+        # Rezerwacji nie wskazują klucze obce, więc nie ma czego usuwać kaskadowo.
+        deleted = Reservation.objects.filter(pk__in=[row[0] for row in rows])._raw_delete(reservations.db)
+        keys = {(hairdresser_id, day) for _, hairdresser_id, day, _, _ in rows}
+        ScheduleVersion.objects.bump(keys)
+        schedule_cache.invalidate(keys)
+        waitlist.slots_freed((hairdresser_id, start_at, end_at) for _, hairdresser_id, _, start_at, end_at in rows)
+    return deleted
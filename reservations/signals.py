@@ -0,0 +1,72 @@
+from weakref import WeakKeyDictionary
+
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Absence, Hairdresser, Reservation, ScheduleVersion, Service, SpecializationChoice, WorkingHours
+from . import schedule_cache, waitlist, working_hours
+from .specialization_cache import specialization_matrix
+
+
+@receiver(m2m_changed, sender=Hairdresser.specialization.through)
+@receiver(m2m_changed, sender=Service.specializations.through)
+def invalidate_specialization_matrix_on_m2m_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        specialization_matrix.invalidate()
+
+
+@receiver(post_save, sender=Hairdresser)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=SpecializationChoice)
+@receiver(post_delete, sender=Hairdresser)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=SpecializationChoice)
+def invalidate_specialization_matrix(sender, **kwargs):
+    specialization_matrix.invalidate()
+
+
+# Identyfikatory fryzjerów usuwanych przez QuerySet.delete(), zbierane z pre_delete
+# (wysyłanego przed usunięciem czegokolwiek) - rezerwacje sprawdzane są w pamięci
+# zamiast zapytaniem na każdą z nich
+deleted_hairdressers = WeakKeyDictionary()
+
+
+@receiver(pre_delete, sender=Hairdresser)
+def remember_deleted_hairdresser(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, QuerySet):
+        deleted_hairdressers.setdefault(origin, set()).add(instance.pk)
+
+
+def deleted_with_hairdresser(instance, origin):
+    # Rezerwacja usuwana kaskadowo razem ze swoim fryzjerem
+    if isinstance(origin, Hairdresser):
+        return origin.pk == instance.hairdresser_id
+    if isinstance(origin, QuerySet):
+        return instance.hairdresser_id in deleted_hairdressers.get(origin, ())
+    return False
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_schedule_version(sender, instance, origin=None, **kwargs):
+    keys = instance.schedule_keys()
+    # Wersje grafików usuwanego fryzjera zostały już usunięte kaskadowo - ponowne
+    # utworzenie wskazywałoby na nieistniejącego fryzjera
+    if not deleted_with_hairdresser(instance, origin):
+        ScheduleVersion.objects.bump(keys)
+    schedule_cache.invalidate(keys)
+
+
+@receiver(post_delete, sender=Reservation)
+def offer_freed_slot(sender, instance, origin=None, **kwargs):
+    if not deleted_with_hairdresser(instance, origin):
+        waitlist.slot_freed(instance.hairdresser_id, instance.start_at, instance.end_at)
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_save, sender=Absence)
+@receiver(post_delete, sender=WorkingHours)
+@receiver(post_delete, sender=Absence)
+def invalidate_working_hours(sender, instance, **kwargs):
+    working_hours.invalidate([instance.hairdresser_id])
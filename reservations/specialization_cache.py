@@ -0,0 +1,96 @@
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Znacznik generacji w cache Django - jego zmiana unieważnia kopie macierzy
+# w procesach korzystających z tego samego cache. Przy domyślnym LocMemCache
+# każdy proces ma własny znacznik, więc zmiana z innego procesu jest widoczna
+# dopiero po wygaśnięciu znacznika (TIMEOUT); współdzielony cache ustawia CACHE_BACKEND
+GENERATION_KEY = 'reservations:specialization_matrix:generation'
+TIMEOUT = 5 * 60
+
+
+class SpecializationMatrix:
+    """Przechowywana w pamięci procesu kopia tabel fryzjer/usługa -> specjalizacje.
+
+    Obie tabele M2M wczytywane są w całości dwoma zapytaniami przy pierwszym
+    użyciu; kolejne odczyty nie wykonują zapytań do bazy danych, dopóki sygnały
+    nie unieważnią macierzy lub nie wygaśnie znacznik generacji.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._hairdressers = {}
+        self._services = {}
+
+    def _current_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, uuid.uuid4().hex, TIMEOUT)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+
+    def _ensure_loaded(self):
+        generation = self._current_generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            from .models import Hairdresser, Service
+
+            hairdressers = defaultdict(set)
+            rows = Hairdresser.specialization.through.objects.values_list(
+                'hairdresser_id', 'specializationchoice__specialization',
+            )
+            for hairdresser_id, specialization in rows:
+                hairdressers[hairdresser_id].add(specialization)
+
+            services = defaultdict(set)
+            rows = Service.specializations.through.objects.values_list(
+                'service_id', 'specializationchoice__specialization',
+            )
+            for service_id, specialization in rows:
+                services[service_id].add(specialization)
+
+            self._hairdressers = {key: frozenset(value) for key, value in hairdressers.items()}
+            self._services = {key: frozenset(value) for key, value in services.items()}
+            self._generation = generation
+
+    def hairdresser_specializations(self, hairdresser_id):
+        self._ensure_loaded()
+        return self._hairdressers.get(hairdresser_id, frozenset())
+
+    def service_specializations(self, service_id):
+        self._ensure_loaded()
+        return self._services.get(service_id, frozenset())
+
+    def can_perform(self, hairdresser_id, service_id):
+        self._ensure_loaded()
+        required = self._services.get(service_id, frozenset())
+        return not required.isdisjoint(self._hairdressers.get(hairdresser_id, frozenset()))
+
+    def qualified_hairdresser_ids(self, service_id):
+        self._ensure_loaded()
+        required = self._services.get(service_id, frozenset())
+        return {
+            hairdresser_id
+            for hairdresser_id, specializations in self._hairdressers.items()
+            if not required.isdisjoint(specializations)
+        }
+
+    def invalidate(self):
+        self._reset()
+        # Jak w cache grafików - odczyt sprzed zatwierdzenia mógł wczytać starą macierz pod nową generacją
+        transaction.on_commit(self._reset)
+
+    def _reset(self):
+        cache.delete(GENERATION_KEY)
+        self._generation = None
+
+
+specialization_matrix = SpecializationMatrix()
@@ -0,0 +1,170 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .instrumentation import traced
+from .models import Job, Reservation
+
+logger = logging.getLogger(__name__)
+
+# Opóźnienie ponowienia rośnie dwukrotnie z każdą próbą, do RETRY_BACKOFF_MAX
+RETRY_BACKOFF = timedelta(seconds=30)
+RETRY_BACKOFF_MAX = timedelta(hours=1)
+# Zadanie "w trakcie" dłużej niż ten czas uznawane jest za porzucone przez proces, który przerwano
+JOB_TIMEOUT = timedelta(minutes=15)
+
+# Zadania zlecane po zapisaniu nowej rezerwacji (ustawienie RESERVATION_BOOKED_TASKS)
+DEFAULT_BOOKED_TASKS = ['reservations.log_booking']
+
+registry = {}
+
+
+def task(name):
+    """Rejestruje funkcję jako zadanie w tle o podanej nazwie."""
+    def register(func):
+        registry[name] = func
+        return func
+    return register
+
+
+def enqueue_many(jobs):
+    """Zleca zadania (nazwa, argumenty) po zatwierdzeniu bieżącej transakcji - jednym INSERT."""
+    jobs = [Job(name=name, payload=payload) for name, payload in jobs]
+    if jobs:
+        transaction.on_commit(lambda: Job.objects.bulk_create(jobs))
+
+
+def enqueue(name, **payload):
+    enqueue_many([(name, payload)])
+
+
+def reservations_booked(reservations):
+    # Punkt rozszerzeń po rezerwacji: potwierdzenia, SMS, synchronizacja kalendarza
+    names = getattr(settings, 'RESERVATION_BOOKED_TASKS', DEFAULT_BOOKED_TASKS)
+    enqueue_many((name, {'reservation_id': reservation.pk}) for reservation in reservations for name in names)
+
+
+@task('reservations.log_booking')
+def log_booking(reservation_id):
+    reservation = Reservation.objects.select_related('hairdresser', 'service').filter(pk=reservation_id).first()
+    if reservation is None:
+        return
+    logger.info("Nowa rezerwacja: %s, usługa %s", reservation, reservation.service)
+
+
+def backoff(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+
+
+def claim(batch_size):
+    """Pobiera i oznacza jako "w trakcie" najwyżej `batch_size` zadań gotowych do wykonania.
+
+    W PostgreSQL wiersze są blokowane z SKIP LOCKED, więc kilka procesów
+    run_worker nie pobierze tego samego zadania. Zadania "w trakcie" dłużej niż
+    JOB_TIMEOUT wracają do kolejki, o ile zostały im próby - pozostałe są
+    oznaczane jako nieudane.
+    """
+    now = timezone.now()
+    abandoned = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - JOB_TIMEOUT)
+    abandoned.filter(attempts__lt=F('max_attempts')).update(status=Job.QUEUED)
+    abandoned.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, last_error=f"Przekroczono czas wykonania ({JOB_TIMEOUT}).",
+    )
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at')[:batch_size]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status, job.locked_at = Job.RUNNING, now
+        job.attempts += 1
+    return jobs
+
+
+@traced('tasks.run_job')
+def run_job(job):
+    try:
+        func = registry.get(job.name)
+        if func is None:
+            job.attempts = job.max_attempts
+            raise LookupError(f"Nieznane zadanie: {job.name}")
+        func(**job.payload)
+    except Exception:
+        logger.exception("Zadanie %s (%s) zakończone błędem, próba %s", job.pk, job.name, job.attempts)
+        if job.attempts >= job.max_attempts:
+            changes = {'status': Job.FAILED, 'finished_at': timezone.now()}
+        else:
+            changes = {'status': Job.QUEUED, 'run_at': timezone.now() + backoff(job.attempts)}
+        claimed(job).update(last_error=traceback.format_exc(), **changes)
+    else:
+        claimed(job).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+
+
+def claimed(job):
+    # Wynik zapisuje tylko bieżące pobranie - zadanie, które przekroczyło JOB_TIMEOUT
+    # i zostało w międzyczasie pobrane ponownie, nie nadpisze stanu nowej próby
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_at=job.locked_at)
+
+
+class Worker:
+    """Pobiera zadania partiami i wykonuje je w puli wątków."""
+
+    def __init__(self, threads=4, batch_size=None, poll_interval=1.0):
+        self.threads = threads
+        self.batch_size = batch_size or threads * 5
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+
+    def run_once(self, executor):
+        jobs = claim(self.batch_size)
+        list(executor.map(self.execute, jobs))
+        return len(jobs)
+
+    def execute(self, job):
+        try:
+            run_job(job)
+        except Exception:
+            # Np. utrata połączenia przy zapisie wyniku - zadanie zostaje "w trakcie"
+            # i wróci do kolejki po JOB_TIMEOUT, a pętla workera działa dalej
+            logger.exception("Nie udało się zapisać wyniku zadania %s (%s)", job.pk, job.name)
+        finally:
+            # Wątki puli mają własne połączenia z bazą - obowiązuje CONN_MAX_AGE jak dla żądań
+            close_old_connections()
+
+    def run(self, once=False):
+        processed = 0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='worker') as executor:
+            while not self.stop_event.is_set():
+                count = self.run_once(executor)
+                processed += count
+                if count:
+                    continue
+                if once:
+                    break
+                self.stop_event.wait(self.poll_interval)
+            self.close_connections(executor)
+        return processed
+
+    def close_connections(self, executor):
+        # Każdy wątek puli zamyka własne połączenia - bariera zapewnia jedno wywołanie na wątek
+        barrier = threading.Barrier(self.threads)
+
+        def close(_):
+            barrier.wait()
+            connections.close_all()
+
+        list(executor.map(close, range(self.threads)))
+
+    def stop(self):
+        self.stop_event.set()
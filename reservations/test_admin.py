@@ -0,0 +1,190 @@
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from .paginator import EstimatedCountPaginator, estimated_count
+from datetime import timedelta, date, time
+
+class ChangelistQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'haslo')
+        self.client.force_login(self.user)
+        self.specs = [
+            SpecializationChoice.objects.create(specialization=code)
+            for code in ("M", "F", "S")
+        ]
+
+    def create_rows(self, count):
+        for number in range(count):
+            hairdresser = Hairdresser.objects.create(name=f"Fryzjer {number}")
+            hairdresser.specialization.add(*self.specs[:number % 3 + 1])
+            service = Service.objects.create(name=f"Usługa {number}", duration=timedelta(minutes=30), cost=50)
+            service.specializations.add(*self.specs[:number % 3 + 1])
+            Reservation.objects.create(
+                hairdresser=hairdresser,
+                service=service,
+                start_date=date.today() + timedelta(days=1),
+                start_time=time(9, 0),
+            )
+
+    def count_changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'admin:reservations_{model_name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, model_name):
+        self.create_rows(5)
+        small = self.count_changelist_queries(model_name)
+        self.create_rows(45)
+        large = self.count_changelist_queries(model_name)
+        self.assertEqual(small, large)
+        return large
+
+    def test_hairdresser_changelist(self):
+        self.assert_constant_queries('hairdresser')
+        with self.assertNumQueries(6):
+            self.client.get(reverse('admin:reservations_hairdresser_changelist'))
+
+    def test_service_changelist(self):
+        self.assert_constant_queries('service')
+        with self.assertNumQueries(7):
+            self.client.get(reverse('admin:reservations_service_changelist'))
+
+    def test_reservation_changelist(self):
+        self.assert_constant_queries('reservation')
+        # Lista fryzjerów do filtra i dwa zapytania hierarchii dat; bez drugiego COUNT(*) całej tabeli.
+        # W PostgreSQL liczbę wierszy najpierw szacuje EXPLAIN.
+        with self.assertNumQueries(8 if connection.vendor == 'postgresql' else 7):
+            response = self.client.get(reverse('admin:reservations_reservation_changelist'))
+        self.assertContains(response, (date.today() + timedelta(days=1)).strftime('%d-%m-%Y'))
+        self.assertContains(response, "09:00 - 09:30")
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        hairdresser = Hairdresser.objects.create(name="Anna")
+        service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        for hour in range(9, 17):
+            Reservation.objects.create(
+                hairdresser=hairdresser, service=service, start_date=date(2030, 1, 7), start_time=time(hour, 0),
+            )
+        self.queryset = Reservation.objects.order_by('start_date', 'start_time', 'pk')
+
+    def test_small_result_is_counted_exactly(self):
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 5).count, 8)
+
+    @skipUnless(connection.vendor == 'postgresql', "Oszacowanie liczby wierszy jest dostępne tylko w PostgreSQL")
+    def test_large_result_uses_planner_estimate(self):
+        paginator = EstimatedCountPaginator(self.queryset, 5)
+        paginator.threshold = 0
+        with CaptureQueriesContext(connection) as context:
+            count = paginator.count
+        self.assertEqual(count, estimated_count(self.queryset))
+        self.assertTrue(all(query['sql'].startswith('EXPLAIN') for query in context.captured_queries))
+
+class RecurrenceRuleAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Koloryzacja", duration=timedelta(hours=2), cost=250)
+        self.service.specializations.add(spec)
+        self.day = date.today() + timedelta(days=7)
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day + timedelta(weeks=1), start_time=time(10, 0),
+        )
+
+    def test_adding_rule_books_occurrences_and_reports_clashes(self):
+        response = self.client.post(reverse('admin:reservations_recurrencerule_add'), {
+            'hairdresser': self.hairdresser.pk,
+            'service': self.service.pk,
+            'start_date': self.day.isoformat(),
+            'start_time': '10:00',
+            'interval_weeks': 1,
+            'until': (self.day + timedelta(weeks=3)).isoformat(),
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reservation.objects.filter(recurrence__isnull=False).count(), 3)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn("Utworzono rezerwacji: 3.", messages)
+        self.assertTrue(any(message.startswith("Pominięto zajęte terminy") for message in messages))
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.anna = Hairdresser.objects.create(name="Anna")
+        self.ewa = Hairdresser.objects.create(name="Ewa")
+        for hairdresser in (self.anna, self.ewa):
+            hairdresser.specialization.add(spec)
+        service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        service.specializations.add(spec)
+        self.day = date.today() + timedelta(days=3)
+        self.reservations = [
+            Reservation.objects.create(hairdresser=self.anna, service=service, start_date=self.day, start_time=time(hour, 0))
+            for hour in (9, 10, 11)
+        ]
+        self.url = reverse('admin:reservations_reservation_changelist')
+
+    def post_action(self, action, **data):
+        return self.client.post(self.url, {
+            'action': action,
+            '_selected_action': [reservation.pk for reservation in self.reservations],
+            **data,
+        }, follow=True)
+
+    def test_action_asks_for_parameters(self):
+        response = self.post_action('shift_reservations')
+        self.assertTemplateUsed(response, 'admin/reservations/reservation/bulk_action.html')
+        self.assertEqual(Reservation.objects.filter(start_time=time(9, 0)).count(), 1)
+
+    def test_shift_and_reassign(self):
+        response = self.post_action('shift_reservations', apply='1', days=1, minutes=30)
+        self.assertContains(response, "Zmieniono rezerwacji: 3.")
+        self.assertEqual(
+            list(Reservation.objects.order_by('start_at').values_list('start_date', 'start_time')),
+            [(self.day + timedelta(days=1), time(hour, 30)) for hour in (9, 10, 11)],
+        )
+        self.post_action('reassign_reservations', apply='1', hairdresser=self.ewa.pk)
+        self.assertEqual(Reservation.objects.filter(hairdresser=self.ewa).count(), 3)
+
+    def test_cancel(self):
+        response = self.post_action('cancel_selected_reservations', apply='1')
+        self.assertContains(response, "Odwołano rezerwacji: 3.")
+        self.assertFalse(Reservation.objects.exists())
+
+class ConcurrentEditTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+        spec = SpecializationChoice.objects.create(specialization="F")
+        hairdresser = Hairdresser.objects.create(name="Anna")
+        hairdresser.specialization.add(spec)
+        service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        service.specializations.add(spec)
+        self.reservation = Reservation.objects.create(
+            hairdresser=hairdresser, service=service, start_date=date.today() + timedelta(days=2), start_time=time(9, 0),
+        )
+        self.url = reverse('admin:reservations_reservation_change', args=[self.reservation.pk])
+
+    def post(self, start_time, version):
+        return self.client.post(self.url, {
+            'hairdresser': self.reservation.hairdresser_id,
+            'service': self.reservation.service_id,
+            'start_date': self.reservation.start_date.isoformat(),
+            'start_time': start_time,
+            'end_time': '',
+            'version': version,
+        })
+
+    def test_second_tab_cannot_overwrite_first(self):
+        self.assertContains(self.client.get(self.url), 'name="version" value="0"')
+        self.assertEqual(self.post('10:00', 0).status_code, 302)
+        response = self.post('11:00', 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "zmieniona przez kogoś innego")
+        reservation = Reservation.objects.get()
+        self.assertEqual((reservation.start_time, reservation.version), (time(10, 0), 1))
@@ -0,0 +1,82 @@
+import json
+from io import StringIO
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from . import analytics
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from datetime import timedelta, date, time
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.cut = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=80)
+        self.wash = Service.objects.create(name="Mycie", duration=timedelta(minutes=30), cost=50)
+        for service in (self.cut, self.wash):
+            service.specializations.add(spec)
+        self.monday = date(2030, 1, 7)
+        self.sunday = self.monday + timedelta(days=6)
+        for day, start, service in [
+            (self.monday, time(9, 0), self.cut),
+            (self.monday, time(10, 30), self.wash),
+            (self.monday + timedelta(days=1), time(14, 0), self.wash),
+        ]:
+            Reservation.objects.create(hairdresser=self.hairdresser, service=service, start_date=day, start_time=start)
+
+    def test_daily_occupancy_against_salon_hours(self):
+        rows = analytics.occupancy(self.monday, self.monday, analytics.PERIOD_DAY)
+        self.assertEqual(rows, [{
+            'hairdresser_id': self.hairdresser.pk,
+            'hairdresser': "Anna",
+            'period': self.monday,
+            'busy_minutes': 90,
+            'available_minutes': 540,
+            'utilization': 16.7,
+        }])
+
+    def test_weekly_occupancy(self):
+        [row] = analytics.occupancy(self.monday, self.sunday, analytics.PERIOD_WEEK)
+        self.assertEqual(row['period'], self.monday)
+        self.assertEqual((row['busy_minutes'], row['available_minutes']), (120, 7 * 540))
+
+    def test_revenue_by_service(self):
+        rows = analytics.revenue_by_service(self.monday, self.sunday)
+        self.assertEqual(
+            [(row['service__name'], row['reservations'], row['revenue']) for row in rows],
+            [("Mycie", 2, 100), ("Strzyżenie", 1, 80)],
+        )
+
+    def test_peak_heatmap(self):
+        heatmap = analytics.peak_heatmap(self.monday, self.sunday)
+        self.assertEqual(heatmap.shape, (7, 24))
+        self.assertEqual((heatmap[0, 9], heatmap[0, 10], heatmap[1, 14]), (60, 30, 30))
+        self.assertEqual(heatmap.sum(), 120)
+
+    def test_command_json(self):
+        out = StringIO()
+        call_command('analytics_report', '--date-from', '2030-01-07', '--date-to', '2030-01-13', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['occupancy'][0]['busy_minutes'], 120)
+        self.assertEqual(report['heatmap'][0][9], 60)
+
+    def test_admin_report(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+        url = reverse('admin:reservations_reservation_report')
+        response = self.client.get(url, {'date_from': '2030-01-07', 'date_to': '2030-01-13', 'period': 'day'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Strzyżenie")
+        self.assertEqual(response.context['heatmap']['hours'], [9, 10, 14])
+        self.assertEqual(self.client.get(url, {'date_from': 'wczoraj'}).status_code, 400)
+
+    def test_admin_report_requires_view_permission(self):
+        staff = User.objects.create_user('recepcja', password='haslo', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('admin:reservations_reservation_report')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff.user_permissions.add(Permission.objects.get(codename='view_reservation'))
+        self.assertEqual(self.client.get(url).status_code, 200)
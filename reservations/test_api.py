@@ -0,0 +1,269 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import Hairdresser, Service, SpecializationChoice, Reservation, ScheduleVersion, WorkingHours
+from datetime import timedelta, date, time
+
+class ScheduleVersionTests(TestCase):
+    def setUp(self):
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.day = date(2024, 3, 4)
+
+    def version(self, day):
+        stamp = ScheduleVersion.objects.filter(hairdresser=self.hairdresser, date=day).first()
+        return stamp.version if stamp else 0
+
+    def test_save_and_delete_bump_version(self):
+        reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(10, 0),
+        )
+        self.assertEqual(self.version(self.day), 1)
+        reservation.delete()
+        self.assertEqual(self.version(self.day), 2)
+
+    def test_moving_reservation_bumps_both_days(self):
+        reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(10, 0),
+        )
+        reservation = Reservation.objects.get(pk=reservation.pk)
+        reservation.start_date = self.day + timedelta(days=1)
+        reservation.save()
+        self.assertEqual(self.version(self.day), 2)
+        self.assertEqual(self.version(self.day + timedelta(days=1)), 1)
+
+    def test_deleting_hairdresser_with_reservations(self):
+        other = Hairdresser.objects.create(name="Ewa")
+        for hairdresser in (self.hairdresser, other):
+            Reservation.objects.create(
+                hairdresser=hairdresser, service=self.service, start_date=self.day, start_time=time(10, 0),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdresser.delete()
+            Hairdresser.objects.filter(pk=other.pk).delete()
+        # Klucze obce sprawdzane przy zatwierdzeniu - nie zostały wersje wskazujące na usuniętych fryzjerów
+        connection.check_constraints()
+        self.assertFalse(ScheduleVersion.objects.exists())
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_deleting_hairdressers_checks_reservations_in_memory(self):
+        def delete_queries(count):
+            hairdresser = Hairdresser.objects.create(name="Ewa")
+            for hour in range(count):
+                Reservation.objects.create(
+                    hairdresser=hairdresser, service=self.service, start_date=self.day, start_time=time(8 + hour, 0),
+                )
+            with CaptureQueriesContext(connection) as queries:
+                Hairdresser.objects.filter(pk=hairdresser.pk).delete()
+            self.assertFalse(Reservation.objects.exists())
+            return len(queries)
+
+        # Liczba zapytań nie zależy od liczby usuwanych rezerwacji
+        self.assertEqual(delete_queries(2), delete_queries(8))
+
+    def test_bump_many_keys(self):
+        days = [self.day + timedelta(days=offset) for offset in range(3)]
+        ScheduleVersion.objects.bump([(self.hairdresser.pk, day) for day in days])
+        ScheduleVersion.objects.bump([(self.hairdresser.pk, days[0])])
+        self.assertEqual([self.version(day) for day in days], [2, 1, 1])
+
+class AvailabilityApiTests(TestCase):
+    def setUp(self):
+        # Cache grafików nie jest czyszczony przy wycofaniu transakcji testu
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Koloryzacja", duration=timedelta(hours=2), cost=250)
+        self.service.specializations.add(spec)
+        self.day = date(2024, 3, 4)
+        self.url = reverse('reservations:api_availability')
+        self.params = {'service': self.service.pk, 'date_from': '2024-03-04', 'date_to': '2024-03-05'}
+
+    def test_availability_response(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['duration'], 120)
+        self.assertEqual(data['hairdressers'][0]['id'], self.hairdresser.pk)
+        self.assertEqual(data['hairdressers'][0]['days'][0]['date'], '2024-03-04')
+        self.assertEqual(data['hairdressers'][0]['days'][0]['slots'][0], '09:00')
+        self.assertIn('max-age=30', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_unchanged_calendar_returns_not_modified(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=30', response['Cache-Control'])
+
+    def test_new_reservation_changes_etag(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(9, 0),
+        )
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['hairdressers'][0]['days'][0]['slots'][0], '11:00')
+
+    def test_working_hours_change_etag(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(14, 0), end_time=time(18, 0))
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['hairdressers'][0]['days'][0]['slots'][0], '14:00')
+
+    def test_working_hours_change_is_not_hidden_by_if_modified_since(self):
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(9, 0),
+        )
+        response = self.client.get(self.url, self.params)
+        self.assertFalse(response.has_header('Last-Modified'))
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(14, 0), end_time=time(18, 0))
+        response = self.client.get(self.url, self.params, HTTP_IF_MODIFIED_SINCE='Wed, 01 Jan 2200 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['hairdressers'][0]['days'][0]['slots'][0], '14:00')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'service': self.service.pk}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {**self.params, 'date_to': '2024-06-01'}).status_code, 400)
+
+class ReservationsApiTests(TestCase):
+    def setUp(self):
+        # Cache grafików nie jest czyszczony przy wycofaniu transakcji testu
+        cache.clear()
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=date(2024, 3, 4), start_time=time(10, 0),
+        )
+        self.url = reverse('reservations:api_reservations')
+        self.params = {'hairdresser': self.hairdresser.pk, 'date_from': '2024-03-04'}
+
+    def test_last_modified_allows_conditional_get(self):
+        last_modified = self.client.get(self.url, self.params)['Last-Modified']
+        response = self.client.get(self.url, self.params, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_reservations_response(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.json()['reservations'], [{
+            'hairdresser': self.hairdresser.pk,
+            'service': self.service.pk,
+            'date': '2024-03-04',
+            'start': '10:00',
+            'end': '11:00',
+        }])
+
+    def test_deleted_reservation_changes_etag(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        self.assertEqual(self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.reservation.delete()
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reservations'], [])
+
+@override_settings(RESERVATION_WIDGET_TOKENS=['klucz-widzetu'])
+class BookApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="M")
+        self.hairdresser = Hairdresser.objects.create(name="Jan")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.service.specializations.add(spec)
+        self.url = reverse('reservations:api_book')
+        self.data = {
+            'hairdresser': self.hairdresser.pk,
+            'service': self.service.pk,
+            'start_date': '2030-03-04',
+            'start_time': '10:00',
+            'client_contact': '500 600 700',
+        }
+        self.headers = {'Authorization': 'Bearer klucz-widzetu'}
+
+    def post(self, data, **kwargs):
+        return self.async_client.post(self.url, data, headers=kwargs.pop('headers', self.headers), **kwargs)
+
+    async def test_booking_is_created(self):
+        response = await self.post(self.data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['end'], '10:30')
+        reservation = await Reservation.objects.aget(pk=response.json()['id'])
+        self.assertEqual(reservation.client_contact, '500 600 700')
+
+    async def test_widget_posts_without_csrf_token(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        response = await client.post(self.url, self.data, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+    async def test_missing_or_wrong_token_is_rejected(self):
+        for headers in ({}, {'Authorization': 'Bearer inny'}, {'Authorization': 'klucz-widzetu'}):
+            response = await self.post(self.data, headers=headers)
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(await Reservation.objects.aexists())
+
+    async def test_taken_slot_returns_conflict(self):
+        await self.post(self.data)
+        response = await self.post({**self.data, 'start_time': '10:15'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(await Reservation.objects.acount(), 1)
+
+    async def test_invalid_parameters(self):
+        response = await self.post({**self.data, 'start_time': 'rano'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.post({**self.data, 'client_contact': ' '})
+        self.assertEqual(response.status_code, 400)
+        response = await self.post({**self.data, 'start_date': '2020-03-04'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Reservation.objects.aexists())
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_booking_changes_availability_etag(self):
+        availability_url = reverse('reservations:api_availability')
+        params = {'service': self.service.pk, 'date_from': '2030-03-04'}
+        etag = (await self.async_client.get(availability_url, params))['ETag']
+        await self.post(self.data)
+        response = await self.async_client.get(availability_url, params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('10:00', response.json()['hairdressers'][0]['days'][0]['slots'])
+
+class SlotSearchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Modelowanie", duration=timedelta(hours=1), cost=80)
+        self.service.specializations.add(spec)
+        self.url = reverse('reservations:api_slots')
+        self.params = {'service': self.service.pk, 'date_from': '2030-01-07', 'limit': 2, 'time_from': '14:00'}
+
+    def test_options_response(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['options'], [
+            {'hairdresser': self.hairdresser.pk, 'name': 'Anna', 'date': '2030-01-07', 'start': '14:00', 'end': '15:00'},
+            {'hairdresser': self.hairdresser.pk, 'name': 'Anna', 'date': '2030-01-07', 'start': '14:15', 'end': '15:15'},
+        ])
+
+    def test_ranking_is_part_of_etag(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        response = self.client.get(self.url, {**self.params, 'rank': 'balance'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_parameters(self):
+        for params in ({**self.params, 'rank': 'cheapest'}, {**self.params, 'limit': 0}, {**self.params, 'time_to': 'x'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_evening_shift_outside_salon_hours(self):
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(16, 0), end_time=time(20, 0))
+        response = self.client.get(self.url, {**self.params, 'time_from': '18:30'})
+        self.assertEqual([(option['start'], option['end']) for option in response.json()['options']], [
+            ('18:30', '19:30'), ('18:45', '19:45'),
+        ])
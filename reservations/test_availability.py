@@ -0,0 +1,188 @@
+from django.core.cache import cache
+from django.test import TestCase
+from .availability import DaySchedule, best_slots, find_free_slots, load_day_schedules
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from .specialization_cache import specialization_matrix
+from datetime import timedelta, date, datetime, time
+from django.utils import timezone
+
+class DayScheduleTests(TestCase):
+    def test_intervals_are_sorted_and_merged(self):
+        schedule = DaySchedule([
+            (time(12, 0), time(13, 0)),
+            (time(9, 0), time(10, 0)),
+            (time(9, 30), time(11, 0)),
+        ])
+        self.assertEqual(schedule.intervals, [
+            (time(9, 0), time(11, 0)),
+            (time(12, 0), time(13, 0)),
+        ])
+
+    def test_is_free(self):
+        schedule = DaySchedule([(time(10, 0), time(11, 0)), (time(14, 0), time(15, 0))])
+        self.assertTrue(schedule.is_free(time(9, 0), time(10, 0)))
+        self.assertTrue(schedule.is_free(time(11, 0), time(14, 0)))
+        self.assertFalse(schedule.is_free(time(10, 30), time(11, 30)))
+        self.assertFalse(schedule.is_free(time(13, 0), time(16, 0)))
+
+    def test_add(self):
+        schedule = DaySchedule()
+        schedule.add(time(10, 0), time(11, 0))
+        self.assertFalse(schedule.is_free(time(10, 15), time(10, 45)))
+
+    def test_free_slots_skip_busy_intervals(self):
+        schedule = DaySchedule([(time(10, 10), time(11, 0))])
+        slots = schedule.free_slots(
+            timedelta(hours=1),
+            opening=time(9, 0),
+            closing=time(13, 0),
+            step=timedelta(minutes=30),
+        )
+        self.assertEqual(slots, [time(9, 0), time(11, 0), time(11, 30), time(12, 0)])
+
+    def test_free_slots_align_to_step_after_busy_interval(self):
+        schedule = DaySchedule([(time(9, 0), time(9, 50))])
+        slots = schedule.free_slots(
+            timedelta(minutes=30),
+            opening=time(9, 0),
+            closing=time(11, 0),
+            step=timedelta(minutes=30),
+        )
+        self.assertEqual(slots, [time(10, 0), time(10, 30)])
+
+    def test_free_gaps_within_opening_hours(self):
+        schedule = DaySchedule([(time(8, 0), time(9, 30)), (time(12, 0), time(13, 0)), (time(17, 30), time(19, 0))])
+        self.assertEqual(schedule.free_gaps(), [
+            (timedelta(hours=9, minutes=30), timedelta(hours=12)),
+            (timedelta(hours=13), timedelta(hours=17, minutes=30)),
+        ])
+        self.assertEqual(schedule.busy_time(), timedelta(hours=4))
+
+class FindFreeSlotsTests(TestCase):
+    def setUp(self):
+        # Cache grafików nie jest czyszczony przy wycofaniu transakcji testu
+        cache.clear()
+        self.spec_f = SpecializationChoice.objects.create(specialization="F")
+        self.spec_m = SpecializationChoice.objects.create(specialization="M")
+        self.anna = Hairdresser.objects.create(name="Anna")
+        self.anna.specialization.add(self.spec_f)
+        self.ewa = Hairdresser.objects.create(name="Ewa")
+        self.ewa.specialization.add(self.spec_f)
+        self.jan = Hairdresser.objects.create(name="Jan")
+        self.jan.specialization.add(self.spec_m)
+        self.colour = Service.objects.create(name="Koloryzacja", duration=timedelta(hours=2), cost=250)
+        self.colour.specializations.add(self.spec_f)
+        self.day = date(2024, 3, 4)
+
+    def test_only_qualified_hairdressers_are_returned(self):
+        result = find_free_slots(self.colour, self.day, self.day)
+        self.assertEqual(list(result), [self.anna, self.ewa])
+
+    def test_reservations_block_slots(self):
+        Reservation.objects.create(
+            hairdresser=self.anna,
+            service=self.colour,
+            start_date=self.day,
+            start_time=time(9, 0),
+        )
+        result = find_free_slots(self.colour, self.day, self.day)
+        self.assertEqual(result[self.anna][self.day][0], time(11, 0))
+        self.assertEqual(result[self.ewa][self.day][0], time(9, 0))
+
+    def test_every_day_in_range_is_reported(self):
+        result = find_free_slots(self.colour, self.day, self.day + timedelta(days=6))
+        self.assertEqual(len(result[self.anna]), 7)
+
+    def test_reservations_are_loaded_in_one_query(self):
+        for offset in range(5):
+            Reservation.objects.create(
+                hairdresser=self.anna,
+                service=self.colour,
+                start_date=self.day + timedelta(days=offset),
+                start_time=time(12, 0),
+            )
+        # Fryzjerzy, rezerwacje oraz godziny pracy i nieobecności do skompilowania tygodnia
+        with self.assertNumQueries(4):
+            find_free_slots(self.colour, self.day, self.day + timedelta(days=6))
+
+    def test_load_day_schedules_groups_by_hairdresser_and_day(self):
+        Reservation.objects.create(
+            hairdresser=self.anna,
+            service=self.colour,
+            start_date=self.day,
+            start_time=time(10, 0),
+        )
+        schedules = load_day_schedules([self.anna.pk, self.ewa.pk], self.day, self.day)
+        self.assertEqual(schedules[(self.anna.pk, self.day)].intervals, [(time(10, 0), time(12, 0))])
+        self.assertEqual(len(schedules[(self.ewa.pk, self.day)]), 0)
+
+class BestSlotsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.anna = Hairdresser.objects.create(name="Anna")
+        self.ewa = Hairdresser.objects.create(name="Ewa")
+        for hairdresser in (self.anna, self.ewa):
+            hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Modelowanie", duration=timedelta(hours=1), cost=80)
+        self.service.specializations.add(spec)
+        self.day = date(2030, 1, 7)
+
+    def book(self, hairdresser, start, day=None):
+        Reservation.objects.create(
+            hairdresser=hairdresser, service=self.service, start_date=day or self.day, start_time=start,
+        )
+
+    def test_earliest_merges_hairdressers_by_start(self):
+        self.book(self.anna, time(9, 0))
+        options = best_slots(self.service, self.day, self.day, limit=3)
+        self.assertEqual([(option.hairdresser_id, option.start) for option in options], [
+            (self.ewa.pk, time(9, 0)),
+            (self.ewa.pk, time(9, 15)),
+            (self.ewa.pk, time(9, 30)),
+        ])
+        self.assertEqual(options[0].end, time(10, 0))
+
+    def test_fragmentation_prefers_slots_filling_gaps(self):
+        # Anna ma między rezerwacjami dokładnie godzinę wolnego
+        self.book(self.anna, time(10, 0))
+        self.book(self.anna, time(12, 0))
+        options = best_slots(self.service, self.day, self.day, limit=2, rank='fragmentation')
+        self.assertEqual([(option.hairdresser_id, option.start) for option in options], [
+            (self.anna.pk, time(9, 0)),
+            (self.anna.pk, time(11, 0)),
+        ])
+
+    def test_balance_prefers_less_loaded_hairdresser(self):
+        self.book(self.anna, time(15, 0))
+        options = best_slots(self.service, self.day, self.day, limit=1, rank='balance')
+        self.assertEqual(options[0].hairdresser_id, self.ewa.pk)
+
+    def test_not_before_skips_past_slots(self):
+        not_before = timezone.make_aware(datetime.combine(self.day, time(16, 40)))
+        options = best_slots(
+            self.service, self.day - timedelta(days=1), self.day + timedelta(days=1), limit=5, not_before=not_before,
+        )
+        self.assertEqual([(option.day, option.start) for option in options], [
+            (self.day, time(16, 45)),
+            (self.day, time(16, 45)),
+            (self.day, time(17, 0)),
+            (self.day, time(17, 0)),
+            (self.day + timedelta(days=1), time(9, 0)),
+        ])
+
+    def test_off_grid_opening_matches_free_slots(self):
+        opening = time(9, 10)
+        options = best_slots(self.service, self.day, self.day, hairdresser_ids=[self.anna.pk], limit=3, opening=opening)
+        free = DaySchedule().free_slots(self.service.duration, opening=opening)
+        self.assertEqual([option.start for option in options], [time(9, 10), time(9, 25), time(9, 40)])
+        self.assertEqual([option.start for option in options], free[:3])
+
+    def test_search_queries_do_not_depend_on_range(self):
+        # Macierz specjalizacji wczytywana jest raz na proces
+        specialization_matrix.qualified_hairdresser_ids(self.service.pk)
+        # Rezerwacje, godziny pracy i nieobecności - po jednym zapytaniu dla całego zakresu
+        with self.assertNumQueries(3):
+            best_slots(self.service, self.day, self.day + timedelta(days=13), limit=5, rank='fragmentation')
+        with self.assertNumQueries(0):
+            best_slots(self.service, self.day, self.day + timedelta(days=13), limit=5, rank='fragmentation')
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from . import benchmarks
+from .models import Reservation
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 0.50), 50)
+        self.assertEqual(benchmarks.percentile(values, 0.95), 95)
+        self.assertEqual(benchmarks.percentile([7], 0.95), 7)
+
+    def test_seeded_schedules_do_not_overlap(self):
+        benchmarks.seed(hairdresser_count=2, service_count=3, day_count=2)
+        for reservation in Reservation.objects.all():
+            self.assertFalse(reservation.get_conflicts().exists())
+
+    def test_run_reports_every_operation(self):
+        report = benchmarks.run(hairdresser_count=2, service_count=3, day_count=2, iterations=2)
+        self.assertEqual(report['meta']['hairdressers'], 2)
+        for name in (
+            'reservation_form_is_valid_save',
+            'reservation_clean',
+            'admin_save_model_conflict_check',
+            'admin_changelist',
+            'availability_week_cold',
+        ):
+            self.assertEqual(set(report['operations'][name]), {'iterations', 'p50_ms', 'p95_ms', 'mean_ms', 'queries_per_op'})
+        self.assertEqual(report['operations']['reservation_clean']['queries_per_op'], 0)
+
+    def test_write_report(self):
+        report = {'meta': {'vendor': 'sqlite'}, 'operations': {}}
+        stdout = StringIO()
+        benchmarks.write_report(report, stdout=stdout)
+        self.assertEqual(json.loads(stdout.getvalue()), report)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wynik.json')
+            benchmarks.write_report(report, path)
+            with open(path, encoding='utf-8') as stream:
+                self.assertEqual(json.load(stream), report)
+
+class StartupBenchmarkTests(TestCase):
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     django.utils.version\n"
+            "import time:       300 |        420 |   django\n"
+            "import time:        50 |        470 | hair_salon.wsgi\n"
+        )
+        self.assertEqual(benchmarks.parse_importtime(output), [
+            ('django.utils.version', 120, 120, 2),
+            ('django', 300, 420, 1),
+            ('hair_salon.wsgi', 50, 470, 0),
+        ])
+
+    def test_prod_profile_does_not_import_debug_toolbar(self):
+        report = benchmarks.run_startup(
+            runs=1, top=100, command='import django; django.setup()', profiles=['prod'],
+        )
+        self.assertNotIn('debug_toolbar', report['profiles']['prod']['top_packages_ms'])
+
+class ConnectionBenchmarkTests(TransactionTestCase):
+    # Pomiar zamyka połączenie między trybami, więc nie może działać w transakcji testu
+    def setUp(self):
+        cache.clear()
+
+    def test_persistent_connections_are_reused(self):
+        report = benchmarks.run_connections(iterations=3, hairdresser_count=2, day_count=2)
+        operations = report['operations']
+        self.assertEqual(set(operations), set(benchmarks.CONNECTION_MODES))
+        self.assertEqual(operations['persistent']['connections_opened'], 0)
+        self.assertEqual(operations['persistent_health_checks']['connections_opened'], 0)
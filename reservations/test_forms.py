@@ -89,7 +89,8 @@ class ReservationFormTests(TestCase):
             'service': self.service.id,
             'start_date': '2023-01-02',
             'start_time': '11:00',
-            'end_time': "12:00"
+            'end_time': "12:00",
+            'version': reservation.version,
         })
         if form.is_valid():
             updated_reservation = form.save()
@@ -99,6 +100,25 @@ class ReservationFormTests(TestCase):
         else:
             self.fail("Formularz powinien być poprawny")
     
+    def test_update_without_version_is_rejected(self):
+        reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=date(2023, 1, 1), start_time=time(10, 0),
+        )
+        for version in ('', None):
+            data = {
+                'hairdresser': self.hairdresser.id,
+                'service': self.service.id,
+                'start_date': '2023-01-02',
+                'start_time': '11:00',
+            }
+            if version is not None:
+                data['version'] = version
+            form = ReservationForm(instance=reservation, data=data)
+            self.assertFalse(form.is_valid())
+            self.assertTrue(form.has_error('__all__', 'stale'))
+        reservation.refresh_from_db()
+        self.assertEqual((reservation.start_date, reservation.version), (date(2023, 1, 1), 0))
+
     def test_save_with_auto_end_time(self):
         form = ReservationForm(data={
             'hairdresser': self.hairdresser.id,
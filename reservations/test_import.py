@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.test import TestCase
+from .management.commands.import_reservations import read_json
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from datetime import timedelta, date, time
+
+class ImportReservationsCommandTests(TestCase):
+    def setUp(self):
+        # Cache grafików nie jest czyszczony przy wycofaniu transakcji testu
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="M")
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.hairdresser.specialization.add(spec)
+        self.unqualified = Hairdresser.objects.create(name="Fryzjer bez specjalizacji")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.service.specializations.add(spec)
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_reservations', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_import_computes_end_time(self):
+        path = self.write_file('.csv', (
+            "hairdresser,service,start_date,start_time\n"
+            f"{self.hairdresser.pk},{self.service.pk},2024-03-04,10:00\n"
+            f"{self.hairdresser.pk},{self.service.pk},2024-03-04,11:00\n"
+        ))
+        stdout, stderr = self.run_import(path)
+        self.assertIn("Zaimportowano rezerwacji: 2, odrzuconych: 0.", stdout)
+        self.assertEqual(
+            list(Reservation.objects.order_by('start_time').values_list('end_time', flat=True)),
+            [time(11, 0), time(12, 0)],
+        )
+
+    def test_overlaps_within_batch_and_with_existing_rows_are_rejected(self):
+        Reservation.objects.create(
+            hairdresser=self.hairdresser,
+            service=self.service,
+            start_date=date(2024, 3, 4),
+            start_time=time(9, 0),
+        )
+        records = [
+            {'hairdresser': self.hairdresser.pk, 'service': self.service.pk, 'start_date': '2024-03-04', 'start_time': '09:30'},
+            {'hairdresser': self.hairdresser.pk, 'service': self.service.pk, 'start_date': '2024-03-04', 'start_time': '12:00'},
+            {'hairdresser': self.hairdresser.pk, 'service': self.service.pk, 'start_date': '2024-03-04', 'start_time': '12:30'},
+        ]
+        path = self.write_file('.json', json.dumps(records))
+        stdout, stderr = self.run_import(path)
+        self.assertIn("Zaimportowano rezerwacji: 1, odrzuconych: 2.", stdout)
+        self.assertIn("Wiersz 1: termin koliduje z istniejącą rezerwacją", stderr)
+        self.assertIn("Wiersz 3: termin koliduje z wierszem 2", stderr)
+
+    def test_overlaps_across_batches_are_rejected(self):
+        lines = [
+            json.dumps({'hairdresser': self.hairdresser.pk, 'service': self.service.pk, 'start_date': '2024-03-04', 'start_time': start})
+            for start in ('10:00', '10:30', '11:00')
+        ]
+        path = self.write_file('.jsonl', "\n".join(lines))
+        stdout, stderr = self.run_import(path, '--batch-size', '1')
+        self.assertIn("Zaimportowano rezerwacji: 2, odrzuconych: 1.", stdout)
+        self.assertIn("Wiersz 2: termin koliduje z istniejącą rezerwacją", stderr)
+
+    def test_invalid_rows_are_reported(self):
+        path = self.write_file('.csv', (
+            "hairdresser,service,start_date,start_time\n"
+            f"999,{self.service.pk},2024-03-04,10:00\n"
+            f"{self.unqualified.pk},{self.service.pk},2024-03-04,10:00\n"
+            f"{self.hairdresser.pk},{self.service.pk},2024-03-04,23:30\n"
+            f"{self.hairdresser.pk},{self.service.pk},04.03.2024,10:00\n"
+        ))
+        stdout, stderr = self.run_import(path)
+        self.assertIn("odrzuconych: 4.", stdout)
+        self.assertIn("Wiersz 2: nieznany fryzjer", stderr)
+        self.assertIn("Wiersz 3: fryzjer nie ma specjalizacji", stderr)
+        self.assertIn("Wiersz 4: rezerwacja musi zakończyć się tego samego dnia", stderr)
+        self.assertIn("Wiersz 5: niepoprawna wartość", stderr)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_dry_run_does_not_write(self):
+        path = self.write_file('.csv', (
+            "hairdresser,service,start_date,start_time\n"
+            f"{self.hairdresser.pk},{self.service.pk},2024-03-04,10:00\n"
+        ))
+        stdout, stderr = self.run_import(path, '--dry-run')
+        self.assertIn("Poprawnych rezerwacji: 1", stdout)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_dry_run_reports_overlaps_across_batches(self):
+        lines = [
+            json.dumps({'hairdresser': self.hairdresser.pk, 'service': self.service.pk, 'start_date': '2024-03-04', 'start_time': start})
+            for start in ('10:00', '10:30', '11:00')
+        ]
+        path = self.write_file('.jsonl', "\n".join(lines))
+        stdout, stderr = self.run_import(path, '--batch-size', '1', '--dry-run')
+        # Ten sam wynik co przy zapisie, choć pierwszy wiersz nie trafił do bazy
+        self.assertIn("Poprawnych rezerwacji: 2, odrzuconych: 1.", stdout)
+        self.assertIn("Wiersz 2: termin koliduje z wierszem 1", stderr)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_json_array_is_read_incrementally(self):
+        records = [{'start_time': f"{hour:02}:00", 'note': "a, ]" * hour, 'number': hour * 1000} for hour in range(20)]
+        rows = list(read_json(StringIO(json.dumps(records, indent=1)), chunk_size=7))
+        self.assertEqual(rows, list(enumerate(records, start=1)))
+        self.assertEqual(list(read_json(StringIO(" [ ] "))), [])
+        for invalid in ('{"a": 1}', '[{"a": 1} {"b": 2}]', '[{"a": 1},', '[1, 2'):
+            with self.assertRaises(ValueError):
+                list(read_json(StringIO(invalid), chunk_size=3))
+
+    def test_unknown_format_raises_error(self):
+        path = self.write_file('.txt', "")
+        with self.assertRaises(CommandError):
+            self.run_import(path)
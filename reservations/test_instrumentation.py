@@ -0,0 +1,88 @@
+import json
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .instrumentation import registry, span
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from datetime import timedelta, date
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.url = reverse('reservations:reservation_list')
+        self.client.force_login(User.objects.create_user('recepcja', is_staff=True))
+
+    def request_log(self):
+        with self.assertLogs('reservations.metrics', level='INFO') as logs:
+            self.client.get(self.url, {'date_from': '2024-03-01'})
+        return json.loads(logs.records[-1].getMessage())
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_request_is_logged(self):
+        record = self.request_log()
+        self.assertEqual(record['view'], 'reservations:reservation_list')
+        self.assertEqual(record['status'], 200)
+        # Sesja, użytkownik i strona rezerwacji
+        self.assertEqual(record['queries'], 3)
+        self.assertIn('reservations_reservation', record['slowest_sql'])
+        self.assertGreaterEqual(record['wall_ms'], record['db_ms'])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    async def test_async_view_queries_are_counted(self):
+        with self.assertLogs('reservations.metrics', level='INFO') as logs:
+            response = await self.async_client.get(
+                reverse('reservations:api_reservations'),
+                {'hairdresser': 1, 'date_from': '2024-03-04'},
+            )
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'reservations:api_reservations')
+        # Wersje grafików i rezerwacje z dnia
+        self.assertEqual(record['queries'], 2)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_request_is_not_logged(self):
+        with self.assertNoLogs('reservations.metrics', level='INFO'):
+            self.client.get(self.url)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    def test_admin_save_records_spans(self):
+        spec = SpecializationChoice.objects.create(specialization="M")
+        hairdresser = Hairdresser.objects.create(name="Anna")
+        hairdresser.specialization.add(spec)
+        service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        service.specializations.add(spec)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+
+        with self.assertLogs('reservations.metrics', level='INFO') as logs:
+            self.client.post(reverse('admin:reservations_reservation_add'), {
+                'hairdresser': hairdresser.pk,
+                'service': service.pk,
+                'start_date': date.today().isoformat(),
+                'start_time': '10:00',
+            })
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(Reservation.objects.count(), 1)
+        for name in ('reservation.clean', 'reservation.save', 'reservation_admin.save_model', 'booking.book_reservation'):
+            self.assertIn(name, record['spans_ms'])
+
+    def test_span_outside_sampled_request_is_noop(self):
+        with span('test'):
+            pass
+        self.assertNotIn('test', registry.spans)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    def test_prometheus_endpoint(self):
+        self.client.get(self.url)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('hair_salon_requests_total{view="reservations:reservation_list"} 1', body)
+        self.assertIn('# TYPE hair_salon_schedule_cache_hits_total counter', body)
+
+    def test_prometheus_endpoint_is_not_public(self):
+        self.client.logout()
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
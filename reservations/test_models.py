@@ -1,9 +1,13 @@
+from importlib import import_module
+from unittest import skipUnless
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_save
 from django.test import TestCase
 from django.utils import timezone
-from .models import Hairdresser, SpecializationChoice, Service, Reservation
+from .models import Hairdresser, SpecializationChoice, Service, Reservation, ScheduleVersion
 from datetime import timedelta
 from django.core.exceptions import ValidationError
-from datetime import datetime
+from datetime import datetime, date, time
 
 class HairdresserSpecializationTestCase(TestCase):
     def setUp(self):
@@ -208,3 +212,151 @@ class ReservationModelTests(TestCase):
         reservation = self.create_reservation(hairdresser=None)
         with self.assertRaises(ValidationError):
             reservation.full_clean()
+
+    def test_save_sets_start_at_and_end_at(self):
+        reservation = self.create_reservation(start_date=date(2030, 1, 7), start_time=time(10, 0))
+        reservation.save()
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.start_at, timezone.make_aware(datetime(2030, 1, 7, 10, 0)))
+        self.assertEqual(reservation.end_at, timezone.make_aware(datetime(2030, 1, 7, 11, 0)))
+
+    def test_moving_reservation_updates_range(self):
+        reservation = self.create_reservation(start_date=date(2030, 1, 7), start_time=time(10, 0))
+        reservation.save()
+        reservation.start_time = time(14, 0)
+        reservation.end_time = None
+        reservation.save()
+
+        day = date(2030, 1, 7)
+        moved = Reservation.objects.filter(start_at__gte=timezone.make_aware(datetime.combine(day, time(14, 0))))
+        self.assertQuerySetEqual(moved, [reservation])
+
+    def test_get_conflicts_uses_half_open_ranges(self):
+        self.create_reservation(start_date=date(2030, 1, 7), start_time=time(10, 0)).save()
+        adjacent = self.create_reservation(start_date=date(2030, 1, 7), start_time=time(11, 0))
+        adjacent.sync_range()
+        self.assertFalse(adjacent.get_conflicts().exists())
+        overlapping = self.create_reservation(start_date=date(2030, 1, 7), start_time=time(10, 30))
+        overlapping.sync_range()
+        self.assertTrue(overlapping.get_conflicts().exists())
+
+class ReservationVersionTests(TestCase):
+    def setUp(self):
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=date(2030, 1, 7), start_time=time(9, 0),
+        )
+
+    def test_version_is_incremented_on_every_save(self):
+        self.assertEqual(self.reservation.version, 0)
+        self.reservation.save()
+        self.reservation.save()
+        self.assertEqual(Reservation.objects.get().version, 2)
+
+    def test_concurrent_edit_is_rejected(self):
+        first, second = Reservation.objects.get(), Reservation.objects.get()
+        first.start_time, first.end_time = time(10, 0), None
+        first.save()
+        second.start_time, second.end_time = time(11, 0), None
+        with self.assertRaises(ValidationError) as context:
+            second.save()
+        self.assertEqual(context.exception.code, 'stale')
+        self.assertEqual(second.version, 0)
+        self.assertEqual(Reservation.objects.get().start_time, time(10, 0))
+
+    def test_stale_save_sends_no_signals(self):
+        first, second = Reservation.objects.get(), Reservation.objects.get()
+        first.save()
+        version = ScheduleVersion.objects.get().version
+        saved = []
+        post_save.connect(
+            lambda instance, **kwargs: saved.append(instance), sender=Reservation, weak=False,
+            dispatch_uid='test_stale_save',
+        )
+        self.addCleanup(post_save.disconnect, sender=Reservation, dispatch_uid='test_stale_save')
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.assertEqual(saved, [])
+        self.assertEqual(ScheduleVersion.objects.get().version, version)
+
+    def test_save_without_version_is_rejected(self):
+        self.reservation.version = None
+        with self.assertRaises(ValidationError) as context:
+            self.reservation.save()
+        self.assertEqual(context.exception.code, 'stale')
+        self.assertEqual(Reservation.objects.get().version, 0)
+
+    def test_schedule_changes_are_tracked(self):
+        reservation = Reservation.objects.get()
+        self.assertFalse(reservation.schedule_changed())
+        reservation.start_time = time(9, 15)
+        self.assertTrue(reservation.schedule_changed())
+        self.assertTrue(Reservation(hairdresser=self.hairdresser, start_date=date(2030, 1, 7)).schedule_changed())
+
+@skipUnless(connection.vendor == 'postgresql', "Ograniczenie wykluczające istnieje tylko w PostgreSQL")
+class ReservationOverlapConstraintTests(TestCase):
+    def setUp(self):
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.other_hairdresser = Hairdresser.objects.create(name="Inny fryzjer")
+        self.service = Service.objects.create(name="Test service", duration=timedelta(hours=1), cost=100)
+        self.day = date(2024, 3, 4)
+        self.reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser,
+            service=self.service,
+            start_date=self.day,
+            start_time=time(10, 0),
+        )
+
+    def test_overlapping_reservation_is_rejected_by_database(self):
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Reservation.objects.create(
+                    hairdresser=self.hairdresser,
+                    service=self.service,
+                    start_date=self.day,
+                    start_time=time(10, 30),
+                )
+
+    def test_adjacent_reservation_is_accepted(self):
+        reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser,
+            service=self.service,
+            start_date=self.day,
+            start_time=time(11, 0),
+        )
+        self.assertIsNotNone(reservation.pk)
+
+    def test_other_hairdresser_can_take_the_same_slot(self):
+        reservation = Reservation.objects.create(
+            hairdresser=self.other_hairdresser,
+            service=self.service,
+            start_date=self.day,
+            start_time=time(10, 0),
+        )
+        self.assertIsNotNone(reservation.pk)
+
+    def test_migrations_report_existing_overlaps(self):
+        # Dane sprzed ograniczenia mogą zawierać kolizje - migracje przerywają się z ich listą
+        overlap_idx = import_module('reservations.migrations.0009_reservation_overlap_idx')
+        range_constraints = import_module('reservations.migrations.0012_reservation_range_constraints')
+        overlap_idx.check_overlaps(connection)
+        range_constraints.check_overlaps(connection)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS reservation_no_overlap DEFERRED")
+        clash = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(10, 30),
+        )
+        later = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(11, 0),
+        )
+        self.assertEqual(
+            {tuple(row[:2]) for row in range_constraints.find_overlaps(connection)},
+            {(self.reservation.pk, clash.pk), (clash.pk, later.pk)},
+        )
+        for migration in (overlap_idx, range_constraints):
+            with self.assertRaisesMessage(IntegrityError, f"i {clash.pk} (fryzjer {self.hairdresser.pk}"):
+                migration.check_overlaps(connection)
+        # Odroczone ograniczenie jest sprawdzane przy zamykaniu testu
+        Reservation.objects.filter(pk__in=[clash.pk, later.pk]).delete()
@@ -0,0 +1,191 @@
+import threading
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, connection, transaction
+from .models import Hairdresser, Service, SpecializationChoice, Reservation, local_datetime
+from .reminders import MemoryTransport, get_transport, send_reminders
+from datetime import timedelta, date, time
+
+NOW = local_datetime(date(2030, 1, 7), time(8, 0))
+
+
+class FailingTransport:
+    def send(self, reminder):
+        raise ConnectionError("bramka SMS niedostępna")
+
+
+class PartlyFailingTransport(MemoryTransport):
+    def send(self, reminder):
+        if reminder.contact == "nieosiągalny":
+            raise ConnectionError("bramka SMS niedostępna")
+        super().send(reminder)
+
+
+class ReminderFixture:
+    def create_data(self):
+        cache.clear()
+        self.transport = MemoryTransport()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.service.specializations.add(spec)
+
+    def reserve(self, day, start, contact="500 600 700"):
+        return Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=day, start_time=start, client_contact=contact,
+        )
+
+    def send(self, now=NOW, **kwargs):
+        kwargs.setdefault('transport', self.transport)
+        return send_reminders(now=now, **kwargs)
+
+
+class ReminderTests(ReminderFixture, TestCase):
+    def setUp(self):
+        self.create_data()
+
+    def test_nothing_due_costs_single_query(self):
+        self.reserve(date(2030, 1, 9), time(10, 0))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.send(), (0, 0))
+        # Savepoint, pobranie należnych rezerwacji i zwolnienie savepointu
+        self.assertEqual(len(queries), 3)
+
+    def test_day_before_and_hours_before_reminders(self):
+        soon = self.reserve(date(2030, 1, 7), time(9, 0))
+        tomorrow = self.reserve(date(2030, 1, 8), time(7, 0))
+        self.reserve(date(2030, 1, 9), time(10, 0))
+
+        self.assertEqual(self.send(), (2, 0))
+        soon.refresh_from_db()
+        tomorrow.refresh_from_db()
+        self.assertEqual((soon.reminder_stage, tomorrow.reminder_stage), (Reservation.REMINDED, Reservation.REMINDED_DAY_BEFORE))
+        self.assertEqual(
+            [reminder.message for reminder in self.transport.outbox],
+            ["Przypomnienie: Strzyżenie u Anna 07-01-2030 o godz. 09:00.",
+             "Przypomnienie: Strzyżenie u Anna 08-01-2030 o godz. 07:00."],
+        )
+
+        # Kolejne uruchomienie nie powtarza przypomnień; 2 h przed wizytą wysyłane jest drugie
+        self.assertEqual(self.send(now=NOW + timedelta(minutes=1)), (0, 0))
+        self.assertEqual(self.send(now=NOW + timedelta(hours=21, minutes=30)), (1, 0))
+        tomorrow.refresh_from_db()
+        self.assertEqual(tomorrow.reminder_stage, Reservation.REMINDED)
+
+    def test_keyset_batches(self):
+        for hour in range(9, 16):
+            self.reserve(date(2030, 1, 7), time(hour, 0))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.send(batch_size=3, senders=2), (7, 0))
+        # Trzy partie: savepoint, pobranie, bulk_update i zwolnienie savepointu dla każdej
+        self.assertEqual(len(queries), 12)
+        self.assertEqual(len(self.transport.outbox), 7)
+        self.assertFalse(Reservation.objects.filter(reminder_stage=Reservation.NOT_REMINDED).exists())
+
+    def test_failed_delivery_is_retried(self):
+        reservation = self.reserve(date(2030, 1, 7), time(12, 0))
+        self.assertEqual(self.send(transport=FailingTransport()), (0, 1))
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.reminder_stage, Reservation.NOT_REMINDED)
+        self.assertEqual(self.send(), (1, 0))
+
+    def test_only_failed_deliveries_are_restored(self):
+        reached = self.reserve(date(2030, 1, 7), time(12, 0))
+        unreachable = self.reserve(date(2030, 1, 7), time(13, 0), contact="nieosiągalny")
+        version = unreachable.version
+        self.assertEqual(self.send(transport=PartlyFailingTransport()), (1, 1))
+        reached.refresh_from_db()
+        unreachable.refresh_from_db()
+        self.assertEqual(reached.reminder_stage, Reservation.REMINDED_DAY_BEFORE)
+        self.assertEqual(unreachable.reminder_stage, Reservation.NOT_REMINDED)
+        # Przywrócenie etapu też zmienia wersję, więc nie jest nadpisywane starym formularzem
+        self.assertEqual(unreachable.version, version + 2)
+
+    def test_reservation_without_contact_is_only_marked(self):
+        self.reserve(date(2030, 1, 7), time(12, 0), contact="")
+        self.assertEqual(self.send(), (1, 0))
+        self.assertEqual(self.transport.outbox, [])
+
+    def test_sent_reminder_makes_open_edit_stale(self):
+        reservation = self.reserve(date(2030, 1, 7), time(12, 0))
+        self.send()
+        reservation.client_contact = "600 700 800"
+        with self.assertRaises(ValidationError) as context:
+            reservation.save()
+        self.assertEqual(context.exception.code, 'stale')
+        self.assertEqual(Reservation.objects.get().reminder_stage, Reservation.REMINDED_DAY_BEFORE)
+
+    def test_moved_reservation_is_reminded_again(self):
+        reservation = self.reserve(date(2030, 1, 7), time(12, 0))
+        self.send()
+        reservation.refresh_from_db()
+        reservation.start_date = date(2030, 1, 8)
+        reservation.save()
+        self.assertEqual(reservation.reminder_stage, Reservation.NOT_REMINDED)
+
+    @override_settings(RESERVATION_REMINDER_TRANSPORT='reservations.reminders.MemoryTransport')
+    def test_command_uses_configured_transport(self):
+        self.reserve(date(2030, 1, 7), time(12, 0))
+        out = StringIO()
+        with patch('reservations.reminders.timezone.now', return_value=NOW):
+            call_command('send_reminders', stdout=out)
+        self.assertIn("Wysłano przypomnień: 1, nieudanych: 0", out.getvalue())
+        self.assertIsInstance(get_transport(), MemoryTransport)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class OverlappingRunsTests(ReminderFixture, TransactionTestCase):
+    def setUp(self):
+        self.create_data()
+
+    def test_reservation_locked_by_other_run_is_skipped(self):
+        locked = self.reserve(date(2030, 1, 7), time(12, 0))
+        free = self.reserve(date(2030, 1, 7), time(13, 0))
+        acquired, release = threading.Event(), threading.Event()
+
+        def other_run():
+            # Inne uruchomienie trzyma blokadę na pierwszej rezerwacji
+            try:
+                with transaction.atomic():
+                    Reservation.objects.select_for_update().get(pk=locked.pk)
+                    acquired.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_run)
+        thread.start()
+        try:
+            acquired.wait(5)
+            self.assertEqual(self.send(), (1, 0))
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual([reminder.reservation.pk for reminder in self.transport.outbox], [free.pk])
+        self.assertEqual(self.send(), (1, 0))
+
+    def test_batch_is_not_locked_while_sending(self):
+        reservation = self.reserve(date(2030, 1, 7), time(12, 0))
+        locked_during_send = []
+
+        class CheckingTransport(MemoryTransport):
+            def send(transport, reminder):
+                # Wysyłka działa w wątku puli, czyli na osobnym połączeniu
+                try:
+                    with transaction.atomic():
+                        Reservation.objects.select_for_update(nowait=True).get(pk=reservation.pk)
+                    locked_during_send.append(False)
+                except DatabaseError:
+                    locked_during_send.append(True)
+                finally:
+                    connection.close()
+                super().send(reminder)
+
+        self.assertEqual(self.send(transport=CheckingTransport()), (1, 0))
+        self.assertEqual(locked_during_send, [False])
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import TestCase
+from . import schedule_cache
+from .models import Hairdresser, Service, Reservation
+from datetime import timedelta, date, time
+
+class ScheduleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        schedule_cache.stats.reset()
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.day = date(2024, 3, 4)
+        self.reservation = Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(10, 0),
+        )
+
+    def test_day_is_stored_as_sorted_tuples(self):
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(8, 0),
+        )
+        self.assertEqual(schedule_cache.get_day_schedule(self.hairdresser.pk, self.day), [
+            (time(8, 0), time(9, 0), self.service.pk),
+            (time(10, 0), time(11, 0), self.service.pk),
+        ])
+
+    def test_warm_read_needs_no_queries(self):
+        schedule_cache.get_day_schedule(self.hairdresser.pk, self.day)
+        with self.assertNumQueries(0):
+            schedule_cache.get_day_schedule(self.hairdresser.pk, self.day)
+        self.assertEqual(schedule_cache.stats.snapshot(), {'hits': 1, 'misses': 1})
+
+    def test_missing_days_are_loaded_in_one_query(self):
+        keys = [(self.hairdresser.pk, self.day + timedelta(days=offset)) for offset in range(7)]
+        with self.assertNumQueries(1):
+            schedules = schedule_cache.get_day_schedules(keys)
+        self.assertEqual(len(schedules), 7)
+        self.assertEqual(schedules[keys[1]], [])
+
+    def test_save_invalidates_day(self):
+        schedule_cache.get_day_schedule(self.hairdresser.pk, self.day)
+        self.reservation.start_time = time(12, 0)
+        self.reservation.end_time = None
+        self.reservation.save()
+        self.assertEqual(
+            schedule_cache.get_day_schedule(self.hairdresser.pk, self.day),
+            [(time(12, 0), time(13, 0), self.service.pk)],
+        )
+
+    def test_moving_to_another_day_invalidates_both_days(self):
+        next_day = self.day + timedelta(days=1)
+        schedule_cache.get_day_schedules([(self.hairdresser.pk, self.day), (self.hairdresser.pk, next_day)])
+        reservation = Reservation.objects.get(pk=self.reservation.pk)
+        reservation.start_date = next_day
+        reservation.save()
+        self.assertEqual(schedule_cache.get_day_schedule(self.hairdresser.pk, self.day), [])
+        self.assertEqual(len(schedule_cache.get_day_schedule(self.hairdresser.pk, next_day)), 1)
+
+    def test_delete_invalidates_day(self):
+        schedule_cache.get_day_schedule(self.hairdresser.pk, self.day)
+        self.reservation.delete()
+        self.assertEqual(schedule_cache.get_day_schedule(self.hairdresser.pk, self.day), [])
@@ -0,0 +1,363 @@
+import threading
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from . import waitlist
+from .models import SLOT_TAKEN_MESSAGE, Hairdresser, Service, SpecializationChoice, Reservation, RecurrenceRule, ScheduleVersion, WorkingHours
+from .services import (
+    abook_reservation, book_recurring, book_reservation, cancel_reservations, find_clashes, move_reservations,
+)
+from datetime import timedelta, date, time
+
+class BookReservationTests(TestCase):
+    def setUp(self):
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.day = date(2024, 3, 4)
+
+    def create_reservation(self, **kwargs):
+        defaults = {
+            'hairdresser': self.hairdresser,
+            'service': self.service,
+            'start_date': self.day,
+            'start_time': time(10, 0),
+        }
+        defaults.update(kwargs)
+        return Reservation(**defaults)
+
+    def test_free_slot_is_booked(self):
+        reservation = book_reservation(self.create_reservation())
+        self.assertIsNotNone(reservation.pk)
+        self.assertEqual(reservation.end_time, time(11, 0))
+
+    def test_taken_slot_is_rejected(self):
+        book_reservation(self.create_reservation())
+        with self.assertRaises(ValidationError):
+            book_reservation(self.create_reservation(start_time=time(10, 30)))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_reservation_can_be_moved_within_its_own_slot(self):
+        reservation = book_reservation(self.create_reservation())
+        reservation.start_time = time(10, 30)
+        reservation.end_time = None
+        book_reservation(reservation)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.end_time, time(11, 30))
+
+    def test_unchanged_schedule_skips_lock_and_overlap_query(self):
+        book_reservation(self.create_reservation())
+        reservation = Reservation.objects.get()
+        with CaptureQueriesContext(connection) as context:
+            book_reservation(reservation)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertFalse(any('FOR UPDATE' in sql or sql.startswith('SELECT') and 'reservations_reservation' in sql
+                             for sql in statements))
+        self.assertEqual(Reservation.objects.get().version, 1)
+
+    @skipUnless(connection.vendor == 'postgresql', "Ograniczenie wykluczające istnieje tylko w PostgreSQL")
+    def test_overlap_rejected_by_database_is_slot_taken(self):
+        book_reservation(self.create_reservation())
+        # Kolizja wykryta dopiero przez ograniczenie, np. przy wyścigu z innym zapisem
+        with patch.object(Reservation, 'get_conflicts', return_value=Reservation.objects.none()):
+            with self.assertRaises(ValidationError) as context:
+                book_reservation(self.create_reservation(start_time=time(10, 30)))
+        self.assertEqual(context.exception.code, 'slot_taken')
+
+    def test_other_integrity_errors_are_not_slot_taken(self):
+        with patch.object(Reservation, 'save', side_effect=IntegrityError("NOT NULL constraint failed")):
+            with self.assertRaisesMessage(IntegrityError, "NOT NULL constraint failed"):
+                book_reservation(self.create_reservation())
+
+class AsyncBookReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="M")
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.service.specializations.add(spec)
+        self.day = date(2024, 3, 4)
+
+    def create_reservation(self, **kwargs):
+        defaults = {
+            'hairdresser_id': self.hairdresser.pk,
+            'service_id': self.service.pk,
+            'start_date': self.day,
+            'start_time': time(10, 0),
+        }
+        defaults.update(kwargs)
+        return Reservation(**defaults)
+
+    async def test_free_slot_is_booked(self):
+        reservation = await abook_reservation(self.create_reservation())
+        self.assertIsNotNone(reservation.pk)
+        self.assertEqual(reservation.end_time, time(11, 0))
+
+    async def test_conflict_is_detected_before_locking(self):
+        await abook_reservation(self.create_reservation())
+        with self.assertRaises(ValidationError) as context:
+            await self.create_reservation(start_time=time(10, 30)).aclean()
+        self.assertEqual(context.exception.error_list[0].code, 'slot_taken')
+        self.assertEqual(await Reservation.objects.acount(), 1)
+
+    async def test_adjacent_slot_is_accepted(self):
+        await abook_reservation(self.create_reservation())
+        await abook_reservation(self.create_reservation(start_time=time(11, 0)))
+        self.assertEqual(await Reservation.objects.acount(), 2)
+
+    async def test_missing_specialization_is_rejected(self):
+        other = await Hairdresser.objects.acreate(name="Bez specjalizacji")
+        with self.assertRaises(ValidationError):
+            await self.create_reservation(hairdresser_id=other.pk).aclean()
+
+    async def test_unknown_service_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            await self.create_reservation(service_id=self.service.pk + 100).aclean()
+
+class RecurringBookingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Koloryzacja", duration=timedelta(hours=2), cost=250)
+        self.service.specializations.add(spec)
+        self.first_day = date(2030, 1, 4)
+
+    def create_rule(self, **kwargs):
+        defaults = {
+            'hairdresser': self.hairdresser,
+            'service': self.service,
+            'start_date': self.first_day,
+            'start_time': time(10, 0),
+            'interval_weeks': 4,
+            'until': date(2030, 12, 31),
+        }
+        defaults.update(kwargs)
+        return RecurrenceRule(**defaults)
+
+    def test_every_occurrence_is_created(self):
+        result = book_recurring(self.create_rule())
+        self.assertEqual(len(result.created), 13)
+        self.assertEqual(result.clashes, [])
+        reservations = Reservation.objects.filter(recurrence__isnull=False).order_by('start_at')
+        self.assertEqual(reservations.count(), 13)
+        self.assertEqual(reservations.last().start_date, date(2030, 12, 6))
+        self.assertEqual(reservations.first().end_time, time(12, 0))
+
+    def test_taken_occurrences_are_reported_and_skipped(self):
+        clash_day = self.first_day + timedelta(weeks=8)
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=clash_day, start_time=time(11, 30),
+        )
+        result = book_recurring(self.create_rule())
+        self.assertEqual([item.start_date for item in result.clashes], [clash_day])
+        self.assertEqual(len(result.created), 12)
+        self.assertEqual(Reservation.objects.count(), 13)
+
+    def test_query_count_does_not_depend_on_occurrences(self):
+        book_recurring(self.create_rule(until=self.first_day))
+        # Savepoint, blokada fryzjera, zapis reguły, zapytanie o zajęte terminy,
+        # bulk_create, dwa zapytania wersji grafików i zwolnienie savepointu
+        with self.assertNumQueries(8):
+            book_recurring(self.create_rule(start_date=date(2031, 1, 3), until=date(2031, 12, 31)))
+
+    def test_schedule_versions_are_bumped(self):
+        result = book_recurring(self.create_rule(until=self.first_day + timedelta(weeks=4)))
+        self.assertEqual(len(result.created), 2)
+        self.assertEqual(ScheduleVersion.objects.filter(hairdresser=self.hairdresser).count(), 2)
+
+    def test_invalid_rule_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            book_recurring(self.create_rule(until=self.first_day - timedelta(days=1)))
+        with self.assertRaises(ValidationError):
+            book_recurring(self.create_rule(start_date=date(2020, 1, 3), interval_weeks=1))
+        self.assertFalse(RecurrenceRule.objects.exists())
+
+    def test_find_clashes(self):
+        candidates = [(time(9, 0), time(10, 0)), (time(11, 0), time(12, 0)), (time(14, 0), time(15, 0))]
+        busy = [(time(8, 0), time(9, 30)), (time(9, 15), time(10, 45)), (time(12, 0), time(14, 30))]
+        self.assertEqual(find_clashes(candidates, busy), [candidates[0], candidates[2]])
+
+class BulkChangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.anna = Hairdresser.objects.create(name="Anna")
+        self.ewa = Hairdresser.objects.create(name="Ewa")
+        self.piotr = Hairdresser.objects.create(name="Piotr")
+        self.anna.specialization.add(spec)
+        self.ewa.specialization.add(spec)
+        self.service = Service.objects.create(name="Mycie", duration=timedelta(minutes=15), cost=30)
+        self.service.specializations.add(spec)
+        self.day = date(2030, 1, 7)
+        for hairdresser in (self.anna, self.ewa, self.piotr):
+            self.add_working_hours(hairdresser)
+
+    def add_working_hours(self, hairdresser, start=time(7, 0), end=time(20, 0)):
+        WorkingHours.objects.bulk_create(
+            WorkingHours(hairdresser=hairdresser, weekday=weekday, start_time=start, end_time=end) for weekday in range(7)
+        )
+
+    def book_day(self, hairdresser, count, day=None):
+        # Rezerwacje jedna po drugiej od 8:00
+        for number in range(count):
+            Reservation.objects.create(
+                hairdresser=hairdresser, service=self.service, start_date=day or self.day,
+                start_time=time(8 + number // 4, number % 4 * 15),
+            )
+        return Reservation.objects.filter(hairdresser=hairdresser, start_date=day or self.day).select_related('service')
+
+    def test_back_to_back_reservations_are_shifted(self):
+        moved = move_reservations(self.book_day(self.anna, 40), shift=timedelta(minutes=15))
+        self.assertEqual(len(moved), 40)
+        starts = sorted(Reservation.objects.values_list('start_time', flat=True))
+        self.assertEqual((starts[0], starts[-1]), (time(8, 15), time(18, 0)))
+        self.assertEqual(Reservation.objects.get(start_time=time(18, 0)).end_time, time(18, 15))
+
+    def test_query_count_does_not_depend_on_selection(self):
+        warmup = move_reservations(self.book_day(self.anna, 5), hairdresser=self.ewa)
+        self.assertEqual(len(warmup), 5)
+        small = self.book_day(self.anna, 5, day=self.day + timedelta(days=1))
+        large = self.book_day(self.anna, 40, day=self.day + timedelta(days=2))
+        # Pobranie rezerwacji, savepoint, blokada fryzjerów, zapytanie o kolizje, kontrola
+        # wersji, bulk_update, dwa zapytania wersji grafików i zwolnienie savepointu
+        # (w PostgreSQL dodatkowo odroczenie i przywrócenie ograniczenia)
+        expected = 11 if connection.vendor == 'postgresql' else 9
+        with self.assertNumQueries(expected):
+            move_reservations(small, hairdresser=self.ewa)
+        with self.assertNumQueries(expected):
+            move_reservations(large, hairdresser=self.ewa)
+
+    def test_moved_reservations_keep_integer_versions(self):
+        moved = move_reservations(self.book_day(self.anna, 2), shift=timedelta(hours=1))
+        self.assertEqual([reservation.version for reservation in moved], [1, 1])
+        # Zwrócone obiekty można dalej zapisywać z kontrolą wersji
+        moved[0].client_contact = "500 600 700"
+        moved[0].save()
+        self.assertEqual(Reservation.objects.get(pk=moved[0].pk).version, 2)
+
+    def test_reservation_changed_since_read_is_not_moved(self):
+        reservations = list(self.book_day(self.anna, 2))
+        Reservation.objects.get(pk=reservations[1].pk).save()
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(reservations, shift=timedelta(hours=1))
+        self.assertEqual(context.exception.code, 'stale')
+        self.assertEqual([reservation.version for reservation in reservations], [0, 0])
+        self.assertEqual(sorted(Reservation.objects.values_list('start_time', flat=True)), [time(8, 0), time(8, 15)])
+
+    def test_target_in_past_or_outside_working_hours_is_rejected(self):
+        reservations = self.book_day(self.anna, 2)
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(reservations, shift=-timedelta(days=365 * 10))
+        self.assertEqual(len(context.exception.messages), 2)
+        self.assertIn("w przeszłości", context.exception.messages[0])
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(Reservation.objects.select_related('service'), shift=-timedelta(minutes=75))
+        self.assertEqual(context.exception.messages, [
+            "07-01-2030 06:45: termin wykracza poza godziny pracy fryzjera.",
+        ])
+        self.assertEqual(sorted(Reservation.objects.values_list('start_time', flat=True)), [time(8, 0), time(8, 15)])
+
+    def test_reassign_checks_specializations_and_clashes(self):
+        Reservation.objects.create(hairdresser=self.ewa, service=self.service, start_date=self.day, start_time=time(8, 30))
+        reservations = self.book_day(self.anna, 4)
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(reservations, hairdresser=self.piotr)
+        self.assertEqual(len(context.exception.messages), 4)
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(reservations, hairdresser=self.ewa)
+        self.assertEqual(context.exception.messages, [f"07-01-2030 08:30: {SLOT_TAKEN_MESSAGE}"])
+        self.assertEqual(Reservation.objects.filter(hairdresser=self.anna).count(), 4)
+
+    def test_moved_reservations_cannot_overlap_each_other(self):
+        self.book_day(self.anna, 2)
+        Reservation.objects.create(hairdresser=self.ewa, service=self.service, start_date=self.day, start_time=time(8, 0))
+        with self.assertRaises(ValidationError):
+            move_reservations(Reservation.objects.select_related('service'), hairdresser=self.ewa)
+
+    def test_cancel_query_count_does_not_depend_on_selection(self):
+        small = self.book_day(self.anna, 5)
+        large = self.book_day(self.ewa, 40)
+        # Savepoint, pobranie kluczy, DELETE, dwa zapytania wersji grafików i zwolnienie savepointu
+        with self.assertNumQueries(6):
+            self.assertEqual(cancel_reservations(small), 5)
+        with self.assertNumQueries(6):
+            self.assertEqual(cancel_reservations(large), 40)
+
+    def test_moved_reservation_covered_by_long_one_is_rejected(self):
+        # A 8:00-12:00 przykrywa B 9:00-10:00 i C 11:00-11:30, choć B i C nie nachodzą na siebie
+        for hairdresser, start, end in ((self.anna, time(8, 0), time(12, 0)),
+                                        (self.ewa, time(9, 0), time(10, 0)),
+                                        (self.ewa, time(11, 0), time(11, 30))):
+            Reservation.objects.create(
+                hairdresser=hairdresser, service=self.service, start_date=self.day, start_time=start, end_time=end,
+            )
+        ola = Hairdresser.objects.create(name="Ola")
+        self.add_working_hours(ola)
+        ola.specialization.set(self.anna.specialization.all())
+        with self.assertRaises(ValidationError) as context:
+            move_reservations(Reservation.objects.select_related('service'), hairdresser=ola)
+        self.assertEqual(
+            context.exception.messages,
+            [f"07-01-2030 09:00: {SLOT_TAKEN_MESSAGE}", f"07-01-2030 11:00: {SLOT_TAKEN_MESSAGE}"],
+        )
+
+    def test_cancel_bumps_schedule_versions(self):
+        self.book_day(self.anna, 3)
+        self.book_day(self.ewa, 3, day=self.day + timedelta(days=1))
+        versions = dict(ScheduleVersion.objects.values_list('date', 'version'))
+        with patch.object(waitlist.freed_slots, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(cancel_reservations(Reservation.objects.all()), 6)
+        self.assertEqual(submit.call_count, 6)
+        self.assertFalse(Reservation.objects.exists())
+        for day, version in ScheduleVersion.objects.values_list('date', 'version'):
+            self.assertGreater(version, versions[day])
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        spec = SpecializationChoice.objects.create(specialization="M")
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+
+    def test_only_one_parallel_booking_wins(self):
+        barrier = threading.Barrier(self.workers)
+        results = []
+
+        def book(start_time):
+            try:
+                barrier.wait()
+                book_reservation(Reservation(
+                    hairdresser=self.hairdresser,
+                    service=self.service,
+                    start_date=date(2024, 3, 4),
+                    start_time=start_time,
+                ))
+                results.append('booked')
+            except ValidationError:
+                results.append('rejected')
+            finally:
+                connection.close()
+
+        # Wszystkie próby dotyczą nakładających się terminów tego samego fryzjera
+        threads = [
+            threading.Thread(target=book, args=(time(10, minute),))
+            for minute in range(0, 5 * self.workers, 5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('booked'), 1)
+        self.assertEqual(results.count('rejected'), self.workers - 1)
+        self.assertEqual(Reservation.objects.count(), 1)
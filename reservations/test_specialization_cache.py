@@ -0,0 +1,53 @@
+from django.test import TestCase
+from .models import Hairdresser, Service, SpecializationChoice, Reservation
+from .specialization_cache import specialization_matrix
+from datetime import timedelta, date, time
+
+class SpecializationMatrixTests(TestCase):
+    def setUp(self):
+        self.spec_m = SpecializationChoice.objects.create(specialization="M")
+        self.spec_f = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Testowy fryzjer")
+        self.hairdresser.specialization.add(self.spec_m)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(hours=1), cost=100)
+        self.service.specializations.add(self.spec_m)
+
+    def test_matrix_reflects_m2m_tables(self):
+        self.assertEqual(specialization_matrix.hairdresser_specializations(self.hairdresser.pk), {"M"})
+        self.assertEqual(specialization_matrix.service_specializations(self.service.pk), {"M"})
+        self.assertTrue(specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk))
+        self.assertEqual(specialization_matrix.qualified_hairdresser_ids(self.service.pk), {self.hairdresser.pk})
+
+    def test_warm_matrix_needs_no_queries(self):
+        specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk)
+        with self.assertNumQueries(0):
+            specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk)
+
+    def test_hairdresser_m2m_change_invalidates_matrix(self):
+        self.assertTrue(specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk))
+        self.hairdresser.specialization.set([self.spec_f])
+        self.assertFalse(specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk))
+
+    def test_service_m2m_change_invalidates_matrix(self):
+        self.assertTrue(specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk))
+        self.service.specializations.clear()
+        self.assertFalse(specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk))
+
+    def test_invalidation_is_repeated_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdresser.specialization.set([self.spec_f])
+            # Odczyt przed zatwierdzeniem (np. w innym wątku) zapisuje macierz pod nową generacją
+            specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk)
+        with self.assertNumQueries(2):
+            specialization_matrix.can_perform(self.hairdresser.pk, self.service.pk)
+
+    def test_reservation_clean_needs_no_queries_on_warm_matrix(self):
+        reservation = Reservation(
+            hairdresser=self.hairdresser,
+            service=self.service,
+            start_date=date(2024, 3, 4),
+            start_time=time(10, 0),
+        )
+        reservation.clean()
+        with self.assertNumQueries(0):
+            reservation.clean()
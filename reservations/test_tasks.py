@@ -0,0 +1,172 @@
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from . import tasks
+from .models import Hairdresser, Job, RecurrenceRule, Service, SpecializationChoice, Reservation
+from .services import book_recurring, book_reservation
+from .tasks import Worker, backoff, claim, enqueue_many, run_job
+from datetime import timedelta, date, time
+
+calls = []
+
+
+@tasks.task('test.record')
+def record(value):
+    calls.append(value)
+
+
+@tasks.task('test.fail')
+def fail():
+    raise RuntimeError("błąd")
+
+
+class EnqueueTests(TestCase):
+    def test_jobs_are_inserted_on_commit_with_single_query(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue_many([('test.record', {'value': 1}), ('test.record', {'value': 2})])
+        self.assertFalse(Job.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            sorted(Job.objects.values_list('payload', flat=True), key=lambda payload: payload['value']),
+            [{'value': 1}, {'value': 2}],
+        )
+
+    def test_backoff_grows_up_to_limit(self):
+        self.assertEqual([backoff(n) for n in (1, 2, 3)], [timedelta(seconds=30), timedelta(minutes=1), timedelta(minutes=2)])
+        self.assertEqual(backoff(20), tasks.RETRY_BACKOFF_MAX)
+
+
+class BookingTasksTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.service.specializations.add(spec)
+
+    def test_new_reservation_enqueues_tasks(self):
+        reservation = Reservation(
+            hairdresser=self.hairdresser, service=self.service, start_date=date(2030, 1, 7), start_time=time(10, 0),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            book_reservation(reservation)
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('reservations.log_booking', {'reservation_id': reservation.pk}))
+
+        # Zmiana istniejącej rezerwacji nie zleca zadań ponownie
+        reservation.start_time = time(12, 0)
+        reservation.end_time = None
+        with self.captureOnCommitCallbacks(execute=True):
+            book_reservation(reservation)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(RESERVATION_BOOKED_TASKS=['test.record'])
+    def test_recurring_booking_enqueues_task_per_reservation(self):
+        rule = RecurrenceRule(
+            hairdresser=self.hairdresser, service=self.service, start_date=date(2030, 1, 7), start_time=time(10, 0),
+            until=date(2030, 1, 21),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = book_recurring(rule)
+        self.assertEqual(
+            sorted(Job.objects.filter(name='test.record').values_list('payload__reservation_id', flat=True)),
+            sorted(item.pk for item in result.created),
+        )
+
+
+class RunJobTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def claim_one(self, name, **payload):
+        Job.objects.create(name=name, payload=payload)
+        [job] = claim(10)
+        return job
+
+    def test_success(self):
+        run_job(self.claim_one('test.record', value=7))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, [7])
+
+    def test_failure_is_retried_with_backoff(self):
+        before = timezone.now()
+        run_job(self.claim_one('test.fail'))
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreaterEqual(job.run_at, before + backoff(1))
+        self.assertIn("RuntimeError", job.last_error)
+        # Zadanie czeka na ponowienie
+        self.assertEqual(claim(10), [])
+
+    def test_last_attempt_fails_job(self):
+        Job.objects.create(name='test.fail', attempts=4)
+        [job] = claim(10)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 5))
+
+    def test_unknown_task_fails_without_retry(self):
+        run_job(self.claim_one('test.unknown'))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_abandoned_running_job_is_claimed_again(self):
+        Job.objects.create(name='test.record', payload={'value': 1}, status=Job.RUNNING,
+                           locked_at=timezone.now() - tasks.JOB_TIMEOUT - timedelta(minutes=1), attempts=1)
+        [job] = claim(10)
+        self.assertEqual(job.attempts, 2)
+
+    def test_abandoned_job_without_attempts_left_fails(self):
+        Job.objects.create(name='test.record', payload={'value': 1}, status=Job.RUNNING,
+                           locked_at=timezone.now() - tasks.JOB_TIMEOUT - timedelta(minutes=1), attempts=5)
+        self.assertEqual(claim(10), [])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 5))
+        self.assertIn("Przekroczono czas", job.last_error)
+
+    def test_late_result_does_not_overwrite_new_attempt(self):
+        job = self.claim_one('test.record', value=1)
+        # Zadanie przekroczyło czas i zostało pobrane ponownie przez inny proces
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() + timedelta(seconds=1))
+        run_job(job)
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+
+    def test_worker_survives_failed_status_update(self):
+        job = self.claim_one('test.record', value=1)
+        # close_old_connections zamknęłoby połączenie transakcji testu
+        with patch('reservations.tasks.run_job', side_effect=DatabaseError("połączenie zerwane")), \
+                patch('reservations.tasks.close_old_connections'):
+            Worker().execute(job)
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+
+
+class WorkerTests(TransactionTestCase):
+    # Zadania wykonują się w wątkach puli z własnymi połączeniami
+    def setUp(self):
+        calls.clear()
+
+    def test_run_once_processes_ready_jobs(self):
+        Job.objects.bulk_create([Job(name='test.record', payload={'value': value}) for value in range(10)])
+        Job.objects.create(name='test.record', payload={'value': 99}, run_at=timezone.now() + timedelta(hours=1))
+        processed = Worker(threads=3, batch_size=4).run(once=True)
+        self.assertEqual(processed, 10)
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 10)
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+    def test_command(self):
+        Job.objects.create(name='test.record', payload={'value': 1})
+        out = StringIO()
+        with patch('signal.signal'):
+            call_command('run_worker', '--once', '--threads', '2', stdout=out)
+        self.assertIn("Wykonano zadań: 1", out.getvalue())
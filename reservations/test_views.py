@@ -0,0 +1,78 @@
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from . import views
+from .models import Hairdresser, Service, Reservation
+from datetime import timedelta, date, time
+
+class ReservationListViewTests(TestCase):
+    def setUp(self):
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.day = date(2024, 3, 4)
+        for offset in range(3):
+            for hour in (9, 10, 11):
+                Reservation.objects.create(
+                    hairdresser=self.hairdresser,
+                    service=self.service,
+                    start_date=self.day + timedelta(days=offset),
+                    start_time=time(hour, 0),
+                )
+        self.url = reverse('reservations:reservation_list')
+        self.client.force_login(User.objects.create_user('recepcja', is_staff=True))
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        self.client.logout()
+        for params in ({}, {'format': 'csv'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(reverse('admin:login'), response['Location'])
+
+    def test_date_range_filtering(self):
+        response = self.client.get(self.url, {'date_from': '2024-03-05', 'date_to': '2024-03-05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r.start_date for r in response.context['reservations']],
+            [date(2024, 3, 5)] * 3,
+        )
+
+    def test_keyset_pagination_walks_all_rows_in_order(self):
+        seen = []
+        url = f"{self.url}?date_from=2024-03-01"
+        with patch.object(views, 'PAGE_SIZE', 4):
+            while url:
+                response = self.client.get(url)
+                seen.extend(response.context['reservations'])
+                url = f"{self.url}?{response.context['next_query']}" if response.context['next_query'] else None
+
+        self.assertEqual(seen, list(Reservation.objects.order_by('start_at', 'id')))
+
+    def test_page_query_count_does_not_depend_on_rows(self):
+        # Sesja i użytkownik oraz jedno zapytanie o stronę rezerwacji razem z fryzjerem i usługą
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'date_from': '2024-03-01'})
+
+    def test_invalid_cursor_returns_bad_request(self):
+        response = self.client.get(self.url, {'after': 'niepoprawny'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_csv_export_is_streamed(self):
+        response = self.client.get(self.url, {'date_from': '2024-03-04', 'date_to': '2024-03-04', 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(content[0], 'data,godzina rozpoczęcia,godzina zakończenia,fryzjer,usługa')
+        self.assertEqual(content[1], '2024-03-04,09:00:00,09:30:00,Anna,Strzyżenie')
+        self.assertEqual(len(content), 4)
+
+    async def test_csv_export_is_streamed_asynchronously_under_asgi(self):
+        user = await User.objects.aget(username='recepcja')
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get(
+            self.url, {'date_from': '2024-03-04', 'date_to': '2024-03-04', 'format': 'csv'},
+        )
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8').splitlines()
+        self.assertEqual(content[1], '2024-03-04,09:00:00,09:30:00,Anna,Strzyżenie')
+        self.assertEqual(len(content), 4)
@@ -0,0 +1,113 @@
+from unittest.mock import call, patch
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from .models import Hairdresser, Service, SpecializationChoice, Reservation, WaitlistEntry, local_datetime
+from .services import cancel_reservations
+from .specialization_cache import specialization_matrix
+from .waitlist import free_gaps, freed_slots, match_freed_slot
+from datetime import timedelta, date, time
+
+DAY = date(2030, 1, 7)
+
+
+def at(hour, minute=0):
+    return local_datetime(DAY, time(hour, minute))
+
+
+class WaitlistFixture:
+    def create_data(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.anna = Hairdresser.objects.create(name="Anna")
+        self.ewa = Hairdresser.objects.create(name="Ewa")
+        for hairdresser in (self.anna, self.ewa):
+            hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Strzyżenie", duration=timedelta(minutes=30), cost=50)
+        self.service.specializations.add(spec)
+        self.reservation = Reservation.objects.create(
+            hairdresser=self.anna, service=self.service, start_date=DAY, start_time=time(10, 0), end_time=time(11, 0),
+        )
+
+    def wait(self, name, start, end, hairdressers=()):
+        entry = WaitlistEntry.objects.create(
+            client_name=name, client_contact="500 600 700", service=self.service, window_start=start, window_end=end,
+        )
+        entry.hairdressers.set(hairdressers)
+        return entry
+
+class FreeGapsTests(TestCase):
+    def test_busy_parts_are_removed(self):
+        busy = [(at(9), at(10, 15)), (at(10, 30), at(10, 45))]
+        self.assertEqual(free_gaps(at(10), at(11), busy), [(at(10, 15), at(10, 30)), (at(10, 45), at(11))])
+        self.assertEqual(free_gaps(at(10), at(11), [(at(9), at(12))]), [])
+
+class MatchFreedSlotTests(WaitlistFixture, TestCase):
+    def setUp(self):
+        self.create_data()
+
+    def test_first_fitting_entry_gets_offer(self):
+        self.wait("Poza oknem", at(12), at(14))
+        self.wait("Tylko Ewa", at(10), at(11), hairdressers=[self.ewa])
+        matching = self.wait("Kasia", at(10, 15), at(13))
+        later = self.wait("Ola", at(10), at(11))
+        self.reservation.delete()
+
+        offered = match_freed_slot(self.anna.pk, at(10), at(11))
+        self.assertEqual(offered, matching)
+        self.assertEqual(offered.status, WaitlistEntry.OFFERED)
+        self.assertEqual((offered.offered_hairdresser, offered.offered_start_at), (self.anna, at(10, 15)))
+        later.refresh_from_db()
+        self.assertEqual(later.status, WaitlistEntry.WAITING)
+
+    def test_reoccupied_slot_is_not_offered(self):
+        self.wait("Kasia", at(10), at(11))
+        self.assertIsNone(match_freed_slot(self.anna.pk, at(10), at(11)))
+
+    def test_only_future_part_of_slot_is_offered(self):
+        self.wait("Minione okno", at(9), at(10, 15))
+        matching = self.wait("Kasia", at(10), at(13))
+        self.reservation.delete()
+        with patch('reservations.waitlist.timezone.now', return_value=at(10, 20)):
+            offered = match_freed_slot(self.anna.pk, at(10), at(11))
+            self.assertEqual((offered, offered.offered_start_at), (matching, at(10, 20)))
+            self.assertIsNone(match_freed_slot(self.anna.pk, at(9), at(10)))
+
+    def test_query_count_does_not_depend_on_other_entries(self):
+        self.reservation.delete()
+        for number in range(30):
+            self.wait(f"Klient {number}", at(15), at(17))
+        self.wait("Kasia", at(10), at(11))
+        specialization_matrix.can_perform(self.anna.pk, self.service.pk)
+        # Wolne części przedziału, oczekujące wpisy, ich fryzjerzy i UPDATE
+        with self.assertNumQueries(4):
+            self.assertIsNotNone(match_freed_slot(self.anna.pk, at(10), at(11)))
+
+    def test_delete_queues_slot_after_commit(self):
+        other = Reservation.objects.create(
+            hairdresser=self.ewa, service=self.service, start_date=DAY, start_time=time(12, 0),
+        )
+        with patch.object(freed_slots, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.reservation.delete()
+                submit.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                cancel_reservations(Reservation.objects.all())
+        self.assertEqual(submit.call_args_list, [
+            call(self.anna.pk, at(10), at(11)),
+            call(self.ewa.pk, other.start_at, other.end_at),
+        ])
+
+class SlotQueueTests(WaitlistFixture, TransactionTestCase):
+    def setUp(self):
+        self.create_data()
+
+    def test_cancellation_is_matched_in_background(self):
+        entry = self.wait("Kasia", at(10), at(12))
+        started = timezone.now()
+        self.reservation.delete()
+        freed_slots.join()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.OFFERED)
+        self.assertEqual(entry.offered_start_at, at(10))
+        self.assertLess(entry.offered_at - started, timedelta(seconds=1))
@@ -0,0 +1,97 @@
+from unittest.mock import ANY, patch
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from .availability import best_slots, bit_runs, find_free_slots, interval_bits
+from .models import Hairdresser, Service, SpecializationChoice, Reservation, WorkingHours, Absence
+from .working_hours import TIMEOUT, get_working_days, tokens
+from datetime import timedelta, date, datetime, time
+
+class BitmapTests(TestCase):
+    def test_interval_bits_cover_and_contain(self):
+        start, end = timedelta(minutes=12), timedelta(minutes=28)
+        # Pola 10-15, 15-20, 20-25, 25-30
+        self.assertEqual(interval_bits(start, end), 0b1111 << 2)
+        # Pola 15-20, 20-25
+        self.assertEqual(interval_bits(start, end, cover=False), 0b11 << 3)
+
+    def test_bit_runs(self):
+        bits = interval_bits(timedelta(hours=9), timedelta(hours=12)) | interval_bits(timedelta(hours=13), timedelta(hours=17))
+        self.assertEqual(bit_runs(bits), [
+            (timedelta(hours=9), timedelta(hours=12)),
+            (timedelta(hours=13), timedelta(hours=17)),
+        ])
+        self.assertEqual(bit_runs(interval_bits(timedelta(0), timedelta(days=1))), [(timedelta(0), timedelta(days=1))])
+
+class WorkingDaysTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.monday = date(2030, 1, 7)
+
+    def runs(self, day):
+        bits = get_working_days([self.hairdresser.pk], day, day)[(self.hairdresser.pk, day)]
+        return [(str(start), str(end)) for start, end in bit_runs(bits)]
+
+    def test_salon_hours_without_working_hours(self):
+        self.assertEqual(self.runs(self.monday + timedelta(days=6)), [('9:00:00', '18:00:00')])
+
+    def test_shift_with_break_and_day_off(self):
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(8, 0), end_time=time(12, 0))
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(13, 0), end_time=time(16, 0))
+        self.assertEqual(self.runs(self.monday), [('8:00:00', '12:00:00'), ('13:00:00', '16:00:00')])
+        # Wtorek bez wpisów jest dniem wolnym
+        self.assertEqual(self.runs(self.monday + timedelta(days=1)), [])
+
+    def test_absence_is_removed(self):
+        Absence.objects.create(
+            hairdresser=self.hairdresser,
+            start_at=timezone.make_aware(datetime(2030, 1, 7, 11, 0)),
+            end_at=timezone.make_aware(datetime(2030, 1, 9, 10, 0)),
+        )
+        self.assertEqual(self.runs(self.monday), [('9:00:00', '11:00:00')])
+        self.assertEqual(self.runs(self.monday + timedelta(days=1)), [])
+        self.assertEqual(self.runs(self.monday + timedelta(days=2)), [('10:00:00', '18:00:00')])
+
+    def test_compiled_weeks_are_cached_until_shift_changes(self):
+        get_working_days([self.hairdresser.pk], self.monday, self.monday + timedelta(days=13))
+        with self.assertNumQueries(0):
+            get_working_days([self.hairdresser.pk], self.monday, self.monday + timedelta(days=13))
+
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(12, 0), end_time=time(20, 0))
+        with self.assertNumQueries(2):
+            self.assertEqual(self.runs(self.monday), [('12:00:00', '20:00:00')])
+
+    def test_tokens_expire(self):
+        with patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            tokens([self.hairdresser.pk])
+        set_many.assert_called_once_with(ANY, TIMEOUT)
+
+class AvailabilityWithWorkingHoursTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spec = SpecializationChoice.objects.create(specialization="F")
+        self.hairdresser = Hairdresser.objects.create(name="Anna")
+        self.hairdresser.specialization.add(spec)
+        self.service = Service.objects.create(name="Modelowanie", duration=timedelta(hours=1), cost=80)
+        self.service.specializations.add(spec)
+        self.day = date(2030, 1, 7)
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(9, 0), end_time=time(11, 0))
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=0, start_time=time(12, 0), end_time=time(13, 30))
+
+    def test_slots_respect_shifts_breaks_and_reservations(self):
+        Reservation.objects.create(
+            hairdresser=self.hairdresser, service=self.service, start_date=self.day, start_time=time(9, 30),
+        )
+        slots = find_free_slots(self.service, self.day, self.day)[self.hairdresser][self.day]
+        self.assertEqual(slots, [time(12, 0), time(12, 15), time(12, 30)])
+
+    def test_shift_outside_salon_hours_is_bookable(self):
+        # Okno dnia wyznaczają zmiany, nie godziny otwarcia salonu; siatka liczona od 7:10
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=1, start_time=time(7, 10), end_time=time(8, 40))
+        WorkingHours.objects.create(hairdresser=self.hairdresser, weekday=1, start_time=time(18, 0), end_time=time(19, 30))
+        tuesday = self.day + timedelta(days=1)
+        expected = [time(7, 10), time(7, 25), time(7, 40), time(18, 10), time(18, 25)]
+        self.assertEqual(find_free_slots(self.service, tuesday, tuesday)[self.hairdresser][tuesday], expected)
+        options = best_slots(self.service, tuesday, tuesday, limit=10)
+        self.assertEqual([option.start for option in options], expected)
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api, views
+
+app_name = 'reservations'
+
+urlpatterns = [
+    path('', views.reservation_list, name='reservation_list'),
+    path('api/availability/', api.availability, name='api_availability'),
+    path('api/slots/', api.slots, name='api_slots'),
+    path('api/reservations/', api.reservations, name='api_reservations'),
+    path('api/reservations/book/', api.book, name='api_book'),
+]
@@ -1,8 +1,94 @@
-from django.shortcuts import render, redirect
-from django.contrib import messages
-from .models import Hairdresser, Service, Reservation
-from .forms import ReservationForm
+import csv
+from datetime import date, datetime, time, timedelta
+from itertools import chain, islice
 
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render
+from django.db.models import Q
+from django.utils import timezone
+from .models import Reservation, local_datetime
+
+PAGE_SIZE = 50
+CSV_CHUNK_SIZE = 2000
+CSV_HEADER = ['data', 'godzina rozpoczęcia', 'godzina zakończenia', 'fryzjer', 'usługa']
+
+class Echo:
+    # Obiekt plikopodobny zwracający zapisywaną wartość - dla csv.writer w odpowiedzi strumieniowej
+    def write(self, value):
+        return value
+
+def parse_cursor(value):
+    start_at, pk = value.rsplit('_', 1)
+    start_at = datetime.fromisoformat(start_at)
+    if timezone.is_naive(start_at):
+        raise ValueError("cursor without time zone")
+    return start_at, int(pk)
+
+def make_cursor(reservation):
+    return f"{reservation.start_at.isoformat()}_{reservation.pk}"
+
+# Lista i eksport CSV zawierają dane klientów - tylko dla personelu salonu
+@staff_member_required
 def reservation_list(request):
-    reservations = Reservation.objects.all()
-    return render(request, 'reservation_list.html', {'reservations': reservations})
+    try:
+        date_from = date.fromisoformat(request.GET['date_from']) if request.GET.get('date_from') else timezone.localdate()
+        date_to = date.fromisoformat(request.GET['date_to']) if request.GET.get('date_to') else None
+        cursor = parse_cursor(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        return HttpResponseBadRequest("Niepoprawny zakres dat lub kursor strony.")
+
+    reservations = Reservation.objects.filter(start_at__gte=local_datetime(date_from, time.min))
+    if date_to:
+        reservations = reservations.filter(start_at__lt=local_datetime(date_to + timedelta(days=1), time.min))
+    reservations = reservations.order_by('start_at', 'id')
+
+    if request.GET.get('format') == 'csv':
+        return reservation_csv(request, reservations)
+
+    # Stronicowanie po kluczu (start_at, id) zamiast OFFSET
+    if cursor:
+        start_at, pk = cursor
+        reservations = reservations.filter(Q(start_at__gt=start_at) | Q(start_at=start_at, id__gt=pk))
+    page = list(reservations.select_related('hairdresser', 'service')[:PAGE_SIZE + 1])
+    next_query = None
+    if len(page) > PAGE_SIZE:
+        page = page[:PAGE_SIZE]
+        query = request.GET.copy()
+        query['after'] = make_cursor(page[-1])
+        next_query = query.urlencode()
+
+    return render(request, 'reservation_list.html', {
+        'reservations': page,
+        'date_from': date_from,
+        'date_to': date_to,
+        'next_query': next_query,
+    })
+
+def reservation_csv(request, reservations):
+    rows = reservations.values_list('start_date', 'start_time', 'end_time', 'hairdresser__name', 'service__name')
+    writer = csv.writer(Echo())
+    if isinstance(request, ASGIRequest):
+        # Pod ASGI synchroniczny iterator byłby wczytany w całości (sync_to_async(list)) -
+        # asynchroniczny odczyt partiami zachowuje stałe zużycie pamięci
+        content = acsv_rows(writer, rows)
+    else:
+        content = (writer.writerow(row) for row in chain([CSV_HEADER], rows.iterator(chunk_size=CSV_CHUNK_SIZE)))
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="rezerwacje.csv"'
+    return response
+
+async def acsv_rows(writer, rows):
+    # QuerySet.aiterator() w Django 4.2 wykonuje zapytanie values_list() w wątku pętli
+    # zdarzeń (SynchronousOnlyOperation) - partie pobierane są więc w wątku ORM
+    yield writer.writerow(CSV_HEADER)
+    iterator = rows.iterator(chunk_size=CSV_CHUNK_SIZE)
+    next_chunk = sync_to_async(lambda: list(islice(iterator, CSV_CHUNK_SIZE)))
+    while True:
+        chunk = await next_chunk()
+        for row in chunk:
+            yield writer.writerow(row)
+        if len(chunk) < CSV_CHUNK_SIZE:
+            break
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .instrumentation import traced
+
+logger = logging.getLogger(__name__)
+
+
+def free_gaps(start_at, end_at, busy):
+    # Części przedziału [start_at, end_at) niezajęte przez posortowane przedziały `busy`
+    gaps = []
+    current = start_at
+    for busy_start, busy_end in busy:
+        if busy_start > current:
+            gaps.append((current, min(busy_start, end_at)))
+        current = max(current, busy_end)
+        if current >= end_at:
+            break
+    if current < end_at:
+        gaps.append((current, end_at))
+    return gaps
+
+
+@traced('waitlist.match_freed_slot')
+def match_freed_slot(hairdresser_id, start_at, end_at):
+    """Proponuje zwolniony przedział fryzjera pierwszemu pasującemu wpisowi z listy oczekujących.
+
+    Proponowana jest tylko przyszła część przedziału, więc wpisy z minionym
+    oknem są pomijane. W PostgreSQL wpisy, których okno zachodzi na przedział,
+    wybiera indeks GiST waitlist_window_gist_idx, w innych bazach indeks końca
+    okna waitlist_window_end_idx. Kolejność jak zgłoszeń. Zwraca wpis, któremu
+    zaproponowano termin, lub None.
+    """
+    from .models import Reservation, WaitlistEntry
+    from .specialization_cache import specialization_matrix
+
+    start_at = max(start_at, timezone.now())
+    if start_at >= end_at:
+        return None
+
+    # Przedział mógł zostać w międzyczasie ponownie zajęty - liczą się tylko wolne części
+    busy = Reservation.objects.filter(
+        hairdresser_id=hairdresser_id,
+        start_at__lt=end_at,
+        end_at__gt=start_at,
+    ).order_by('start_at').values_list('start_at', 'end_at')
+    gaps = free_gaps(start_at, end_at, busy)
+    if not gaps:
+        return None
+
+    entries = WaitlistEntry.objects.filter(
+        status=WaitlistEntry.WAITING,
+        window_start__lt=end_at,
+        window_end__gt=start_at,
+    )
+    if connection.vendor == 'postgresql':
+        # Ten sam zakres co w indeksie GiST - zwykłe porównania końców go nie używają
+        entries = entries.filter(RawSQL(
+            "tstzrange(reservations_waitlistentry.window_start, reservations_waitlistentry.window_end, '[)')"
+            " && tstzrange(%s, %s, '[)')",
+            (start_at, end_at),
+            output_field=BooleanField(),
+        ))
+    entries = entries.select_related('service').prefetch_related('hairdressers')
+    for entry in entries:
+        accepted = {hairdresser.pk for hairdresser in entry.hairdressers.all()}
+        if accepted and hairdresser_id not in accepted:
+            continue
+        if not specialization_matrix.can_perform(hairdresser_id, entry.service_id):
+            continue
+        for gap_start, gap_end in gaps:
+            offer_start = max(gap_start, entry.window_start)
+            if offer_start + entry.service.duration > min(gap_end, entry.window_end):
+                continue
+            # Warunek na status chroni przed podwójną propozycją z innego procesu
+            offer = {
+                'status': WaitlistEntry.OFFERED,
+                'offered_hairdresser_id': hairdresser_id,
+                'offered_start_at': offer_start,
+                'offered_at': timezone.now(),
+            }
+            if WaitlistEntry.objects.filter(pk=entry.pk, status=WaitlistEntry.WAITING).update(**offer):
+                logger.info(
+                    "Zaproponowano termin %s (fryzjer %s) oczekującemu: %s",
+                    offer_start, hairdresser_id, entry.client_name,
+                )
+                for name, value in offer.items():
+                    setattr(entry, name, value)
+                return entry
+            break
+    return None
+
+
+class SlotQueue:
+    """Kolejka zwolnionych terminów przetwarzana przez wątek w tle.
+
+    Wątek uruchamiany jest przy pierwszym zgłoszeniu; żądanie, które usunęło
+    rezerwację, nie czeka na dopasowanie listy oczekujących.
+    """
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, *args):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='waitlist', daemon=True)
+                self._thread.start()
+        self._queue.put(args)
+
+    def join(self):
+        # Czeka na przetworzenie wszystkich zgłoszeń (testy, zamykanie procesu)
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            args = self._queue.get()
+            try:
+                self._handler(*args)
+            except Exception:
+                logger.exception("Błąd dopasowania listy oczekujących dla %s", args)
+            finally:
+                # Wątek ma własne połączenie z bazą - obowiązują te same zasady co dla żądań
+                close_old_connections()
+                self._queue.task_done()
+
+
+freed_slots = SlotQueue(match_freed_slot)
+
+
+def slot_freed(hairdresser_id, start_at, end_at):
+    slots_freed([(hairdresser_id, start_at, end_at)])
+
+
+def slots_freed(slots):
+    # Zgłoszenia trafiają do kolejki dopiero po zatwierdzeniu usunięcia
+    slots = list(slots)
+    if slots:
+        transaction.on_commit(lambda: [freed_slots.submit(*slot) for slot in slots])
@@ -0,0 +1,134 @@
+import uuid
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+KEY_PREFIX = 'reservations:hours'
+TIMEOUT = 24 * 60 * 60
+
+
+def token_key(hairdresser_id):
+    return f"{KEY_PREFIX}:token:{hairdresser_id}"
+
+
+def week_key(hairdresser_id, token, monday):
+    return f"{KEY_PREFIX}:{hairdresser_id}:{token}:{monday.isoformat()}"
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def tokens(hairdresser_ids):
+    """Zwraca {hairdresser_id: znacznik} - zmiana znacznika unieważnia skompilowane tygodnie fryzjera."""
+    names = {token_key(hairdresser_id): hairdresser_id for hairdresser_id in hairdresser_ids}
+    found = cache.get_many(list(names))
+    missing = {name: uuid.uuid4().hex for name in names if name not in found}
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+        found.update(missing)
+    return {names[name]: token for name, token in found.items()}
+
+
+def invalidate(hairdresser_ids):
+    names = [token_key(hairdresser_id) for hairdresser_id in set(hairdresser_ids)]
+    if not names:
+        return
+    cache.delete_many(names)
+    # Jak w cache grafików - odczyt sprzed zatwierdzenia mógł zapisać stary tydzień
+    transaction.on_commit(lambda: cache.delete_many(names))
+
+
+def absence_bits(day, start_at, end_at):
+    # Część nieobecności przypadająca na dany dzień, w czasie lokalnym salonu
+    from .availability import interval_bits, time_to_delta
+    from .models import local_datetime
+
+    day_start = local_datetime(day, time.min)
+    day_end = local_datetime(day + timedelta(days=1), time.min)
+    start_at, end_at = max(start_at, day_start), min(end_at, day_end)
+    if end_at <= start_at:
+        return 0
+    start = time_to_delta(timezone.localtime(start_at).time())
+    end = timedelta(days=1) if end_at == day_end else time_to_delta(timezone.localtime(end_at).time())
+    return interval_bits(start, end)
+
+
+def compile_weeks(keys):
+    """Kompiluje bitmapy dostępności dla par (hairdresser_id, poniedziałek).
+
+    Wynik to krotka siedmiu bitmap (od poniedziałku) - godziny pracy
+    pomniejszone o nieobecności. Wszystkie tygodnie wymagają dwóch zapytań.
+    """
+    from .availability import CLOSING_TIME, OPENING_TIME, interval_bits, time_to_delta
+    from .models import Absence, WorkingHours, local_datetime
+
+    hairdresser_ids = {hairdresser_id for hairdresser_id, _ in keys}
+    mondays = [monday for _, monday in keys]
+
+    hours = defaultdict(lambda: defaultdict(int))
+    rows = WorkingHours.objects.filter(hairdresser_id__in=hairdresser_ids).order_by().values_list(
+        'hairdresser_id', 'weekday', 'start_time', 'end_time',
+    )
+    for hairdresser_id, weekday, start, end in rows:
+        hours[hairdresser_id][weekday] |= interval_bits(time_to_delta(start), time_to_delta(end), cover=False)
+
+    absences = defaultdict(list)
+    rows = Absence.objects.filter(
+        hairdresser_id__in=hairdresser_ids,
+        start_at__lt=local_datetime(max(mondays) + timedelta(days=7), time.min),
+        end_at__gt=local_datetime(min(mondays), time.min),
+    ).values_list('hairdresser_id', 'start_at', 'end_at')
+    for hairdresser_id, start_at, end_at in rows:
+        absences[hairdresser_id].append((start_at, end_at))
+
+    salon_hours = interval_bits(time_to_delta(OPENING_TIME), time_to_delta(CLOSING_TIME), cover=False)
+    weeks = {}
+    for hairdresser_id, monday in keys:
+        week = []
+        for offset in range(7):
+            day = monday + timedelta(days=offset)
+            bits = hours[hairdresser_id][offset] if hairdresser_id in hours else salon_hours
+            for start_at, end_at in absences[hairdresser_id]:
+                bits &= ~absence_bits(day, start_at, end_at)
+            week.append(bits)
+        weeks[(hairdresser_id, monday)] = tuple(week)
+    return weeks
+
+
+def get_working_days(hairdresser_ids, date_from, date_to):
+    """Zwraca {(hairdresser_id, dzień): bitmapa godzin pracy} dla zakresu dat.
+
+    Skompilowane tygodnie przechowywane są w cache Django; brakujące są
+    kompilowane razem, niezależnie od liczby fryzjerów i tygodni.
+    """
+    days = [date_from + timedelta(days=n) for n in range((date_to - date_from).days + 1)]
+    if not hairdresser_ids or not days:
+        return {}
+    mondays = {week_start(day) for day in days}
+    current = tokens(hairdresser_ids)
+    names = {
+        week_key(hairdresser_id, current[hairdresser_id], monday): (hairdresser_id, monday)
+        for hairdresser_id in current
+        for monday in mondays
+    }
+    weeks = {names[name]: week for name, week in cache.get_many(list(names)).items()}
+
+    missing = [key for key in names.values() if key not in weeks]
+    if missing:
+        compiled = compile_weeks(missing)
+        cache.set_many(
+            {week_key(hairdresser_id, current[hairdresser_id], monday): week
+             for (hairdresser_id, monday), week in compiled.items()},
+            TIMEOUT,
+        )
+        weeks.update(compiled)
+
+    return {
+        (hairdresser_id, day): weeks[(hairdresser_id, week_start(day))][day.weekday()]
+        for hairdresser_id in current
+        for day in days
+    }